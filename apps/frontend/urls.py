@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('evaluate/', views.evaluate_report, name='evaluate_report'),
+    path('evaluate/stream/', views.evaluate_report_stream, name='evaluate_report_stream'),
     path('feedback/', views.submit_feedback, name='submit_feedback'),
 ]
 
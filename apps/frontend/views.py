@@ -1,5 +1,5 @@
 from django.shortcuts import render
-from django.http import JsonResponse, HttpRequest
+from django.http import JsonResponse, HttpRequest, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from pathlib import Path
 import time
@@ -9,7 +9,7 @@ import json
 from parser import MedicalReportParser
 from openai_client import MedicalReportAssistantClient
 from models import MedicalReport
-from typing import Optional
+from typing import Any, Dict, Optional
 
 try:
     from supabase import create_client, Client as SupabaseClient
@@ -34,11 +34,8 @@ def index(request: HttpRequest):
     return render(request, 'index.html')
 
 
-@csrf_exempt
-def evaluate_report(request: HttpRequest):
-    if request.method != 'POST':
-        return JsonResponse({'error': 'Only POST allowed'}, status=405)
-
+def _read_report_text(request: HttpRequest):
+    """Form alanından ya da yüklenen dosyadan rapor metnini al; (metin, hata response'u)"""
     text = request.POST.get('report_text', '')
     if not text:
         upload = request.FILES.get('report_file')
@@ -46,10 +43,56 @@ def evaluate_report(request: HttpRequest):
             try:
                 text = upload.read().decode('utf-8', errors='ignore')
             except Exception:
-                return JsonResponse({'error': 'Dosya okunamadı. UTF-8 metin bekleniyor.'}, status=400)
+                return None, JsonResponse({'error': 'Dosya okunamadı. UTF-8 metin bekleniyor.'}, status=400)
 
     if not text.strip():
-        return JsonResponse({'error': 'Rapor metni boş. Metin yapıştırın veya bir dosya yükleyin.'}, status=400)
+        return None, JsonResponse({'error': 'Rapor metni boş. Metin yapıştırın veya bir dosya yükleyin.'}, status=400)
+    return text, None
+
+
+def _log_request(request: HttpRequest, text: str, start_ts: float, parse_ok: bool,
+                 assistant_status: Optional[str], thread_id: Optional[str], error_msg: Optional[str]) -> None:
+    """Supabase'e istek günlüğü (request log) kaydı"""
+    try:
+        sb = _get_supabase_client()
+        if sb:
+            # IP & UA
+            client_ip = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')[0].strip() or request.META.get('REMOTE_ADDR')
+            user_agent = request.META.get('HTTP_USER_AGENT')
+            # Input hash & len
+            input_bytes = text.encode('utf-8', errors='ignore')
+            input_len = len(input_bytes)
+            input_hash = hashlib.sha256(input_bytes).hexdigest()
+            latency_ms = int((time.time() - start_ts) * 1000)
+            sb.table('request_log').insert({
+                'client_ip': client_ip,
+                'user_agent': user_agent,
+                'input_len': input_len,
+                'input_sha256': input_hash,
+                'parse_ok': parse_ok,
+                'assistant_status': assistant_status,
+                'thread_id': thread_id,
+                'latency_ms': latency_ms,
+                'error': error_msg,
+            }).execute()
+    except Exception:
+        # Sessiz geç; logging başarısızlığı kullanıcıya yansıtma
+        pass
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Tek bir Server-Sent Events mesajı"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@csrf_exempt
+def evaluate_report(request: HttpRequest):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST allowed'}, status=405)
+
+    text, error_response = _read_report_text(request)
+    if error_response:
+        return error_response
 
     parser = MedicalReportParser()
     start_ts = time.time()
@@ -85,36 +128,73 @@ def evaluate_report(request: HttpRequest):
         result['assistant'] = {'status': 'error', 'message': error_msg}
         assistant_status = 'error'
 
-    # Supabase'e istek günlüğü (request log) kaydı
-    try:
-        sb = _get_supabase_client()
-        if sb:
-            # IP & UA
-            client_ip = request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')[0].strip() or request.META.get('REMOTE_ADDR')
-            user_agent = request.META.get('HTTP_USER_AGENT')
-            # Input hash & len
-            input_bytes = text.encode('utf-8', errors='ignore')
-            input_len = len(input_bytes)
-            input_hash = hashlib.sha256(input_bytes).hexdigest()
-            latency_ms = int((time.time() - start_ts) * 1000)
-            sb.table('request_log').insert({
-                'client_ip': client_ip,
-                'user_agent': user_agent,
-                'input_len': input_len,
-                'input_sha256': input_hash,
-                'parse_ok': parse_ok,
-                'assistant_status': assistant_status,
-                'thread_id': thread_id,
-                'latency_ms': latency_ms,
-                'error': error_msg,
-            }).execute()
-    except Exception:
-        # Sessiz geç; logging başarısızlığı kullanıcıya yansıtma
-        pass
+    _log_request(request, text, start_ts, parse_ok, assistant_status, thread_id, error_msg)
 
     return JsonResponse(result)
 
 
+@csrf_exempt
+def evaluate_report_stream(request: HttpRequest):
+    """
+    evaluate_report'un Server-Sent Events sürümü
+
+    Parse edilen yapılandırılmış rapor hemen ``structured`` event'i olarak
+    gönderilir; assistant cevabı geldikçe ``token`` event'leri, sonunda
+    evaluate_report'taki ``assistant`` nesnesi ve ``done`` (süreler) gelir.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Only POST allowed'}, status=405)
+
+    text, error_response = _read_report_text(request)
+    if error_response:
+        return error_response
+
+    start_ts = time.time()
+    try:
+        report = MedicalReportParser().parse(text)
+    except Exception as e:
+        return JsonResponse({'error': f'Parse hatası: {str(e)}'}, status=500)
+
+    def elapsed_ms() -> int:
+        return int((time.time() - start_ts) * 1000)
+
+    def events():
+        yield _sse('structured', {'structured': report.to_dict(), 'elapsed_ms': elapsed_ms()})
+
+        first_token_ms = None
+        error_msg = None
+        api_key = os.getenv('OPENAI_API_KEY')
+        assistant_id = os.getenv('OPENAI_ASSISTANT_ID')
+        try:
+            if api_key and assistant_id:
+                evaluation = {'status': 'error', 'message': 'Assistant yanıtı alınamadı.'}
+                for item in MedicalReportAssistantClient().stream_evaluation(report):
+                    if item['type'] == 'delta':
+                        if first_token_ms is None:
+                            first_token_ms = elapsed_ms()
+                        yield _sse('token', {'text': item['text']})
+                    else:
+                        evaluation = item['result']
+            else:
+                evaluation = {'status': 'skipped', 'message': 'API credentials missing'}
+        except Exception as e:
+            error_msg = str(e)
+            evaluation = {'status': 'error', 'message': error_msg}
+
+        yield _sse('assistant', evaluation)
+        timings = {'first_token_ms': first_token_ms, 'total_ms': elapsed_ms()}
+        yield _sse('done', timings)
+        print(f"evaluate/stream first_token_ms={first_token_ms} total_ms={timings['total_ms']} status={evaluation.get('status')}")
+
+        _log_request(request, text, start_ts, True, evaluation.get('status'), evaluation.get('thread_id'), error_msg)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Reverse proxy'lerin (nginx) cevabı tamponlamasını engelle
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @csrf_exempt
 def submit_feedback(request: HttpRequest):
     if request.method != 'POST':
@@ -0,0 +1,175 @@
+"""
+Inference Executors - Bloklayan OCR/LLM işlerini event loop dışında çalıştırır
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List, Optional
+
+from api.image_io import BytesLike
+from api.ocr_base import BaseOCRService, get_ocr_service
+from api.result_cache import get_result_cache
+
+
+class ExecutorBusyError(RuntimeError):
+    """Executor kuyruğu dolu (backpressure)"""
+
+
+class BoundedExecutor:
+    """
+    Bekleyen iş sayısı sınırlı executor sarmalayıcısı.
+
+    Sayaçlar yalnızca event loop thread'inden güncellenir, bu yüzden kilit
+    gerekmez. Kuyruk dolduğunda yeni işler ExecutorBusyError ile reddedilir.
+    """
+
+    def __init__(self, name: str, executor: Executor, max_workers: int, max_pending: int):
+        self.name = name
+        self.executor = executor
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._busy_seconds = 0.0
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.in_flight >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorBusyError(f"{self.name} executor busy ({self.in_flight} pending)")
+
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        self.submitted += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        start = time.perf_counter()
+        future = loop.run_in_executor(self.executor, fn, *args)
+        # Bekleyen coroutine iptal edilse de (ör. wait_for deadline'ı) iş pool'da sürer;
+        # sayaçlar iş gerçekten bittiğinde, yine event loop thread'inde güncellenir
+        future.add_done_callback(lambda f: self._job_done(f, start))
+        return await asyncio.shield(future)
+
+    def _job_done(self, future: "asyncio.Future[Any]", start: float) -> None:
+        self.in_flight -= 1
+        self._busy_seconds += time.perf_counter() - start
+        # exception() sonucu alınmış sayar; iptal edilen awaiter'ın hatası loglara düşmez
+        if future.cancelled() or future.exception() is not None:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        done = self.completed + self.failed
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            # Worker'lardan fazlası executor kuyruğunda bekliyor
+            "queue_depth": max(0, self.in_flight - self.max_workers),
+            "peak_in_flight": self.peak_in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_latency_ms": round(1000 * self._busy_seconds / done, 1) if done else None,
+        }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _init_ocr_worker() -> None:
+    """OCR worker süreci başlangıcı; spawn ile temiz başlayan süreç modeli kendisi yükler"""
+    # Worker aynı anda tek iş çalıştırır; fazladan model kopyası yalnızca bellek harcar
+    get_ocr_service(num_contexts=1)
+
+
+def ocr_predict_lines_bytes(image_data: bytes) -> List[Dict[str, Any]]:
+    """Worker içinde decode + satır segmentasyonu + tek batch CRNN inference (cache ana süreçte)"""
+    return get_ocr_service().predict_lines_from_bytes(image_data, use_cache=False)
+
+
+def ocr_warmup() -> Dict[str, Any]:
+    """Worker sürecini başlat ve modeli ısıt; ana sürecin ihtiyaç duyduğu worker durumunu döndürür"""
+    service = get_ocr_service()
+    if not service.warmed_up:
+        service.warmup()
+    return {
+        "pid": os.getpid(),
+        "available": service.is_available(),
+        "cache_variant": service.cache_variant,
+        "warmed_up": service.warmed_up,
+        "warmup_seconds": service.warmup_seconds,
+    }
+
+
+class ProcessOCRService(BaseOCRService):
+    """
+    'process' modunda ana sürecin OCR servisi.
+
+    Model yalnızca worker süreçlerinde yüklenir; ana süreç sonuç cache'ini ve
+    metin birleştirmeyi tutar. Cache anahtarı ve hazır olma durumu worker
+    warm-up'ından (``ocr_warmup``) gelir.
+    """
+
+    def __init__(self, executor: BoundedExecutor):
+        self.executor = executor
+        self.cache = get_result_cache("ocr")
+        self.cache_variant = ""
+        self.available = False
+        self.warmed_up = False
+        self.warmup_seconds = None
+        self.worker_pids: List[int] = []
+
+    def is_available(self) -> bool:
+        return self.available
+
+    async def warmup_workers(self) -> List[int]:
+        """Her worker'ı başlatıp ısıt; worker pid'lerini döndürür"""
+        infos = await asyncio.gather(*[self.executor.run(ocr_warmup) for _ in range(self.executor.max_workers)])
+        self.cache_variant = infos[0]["cache_variant"]
+        self.available = all(info["available"] for info in infos)
+        self.warmed_up = all(info["warmed_up"] for info in infos)
+        self.warmup_seconds = max((info["warmup_seconds"] or 0.0) for info in infos)
+        self.worker_pids = sorted({info["pid"] for info in infos})
+        return self.worker_pids
+
+    def _lines_from_bytes(self, image_data: BytesLike) -> List[Dict[str, Any]]:
+        # Senkron çağıranlar için; API yolu executor.run ile bekler
+        return self.executor.executor.submit(ocr_predict_lines_bytes, bytes(image_data)).result()
+
+
+def create_ocr_executor(mode: Optional[str] = None, workers: Optional[int] = None) -> BoundedExecutor:
+    """
+    CRNN inference için executor.
+
+    Varsayılan 'process' modu decode/preprocess işini GIL dışında yapar;
+    'thread' modu tek süreçte, modeli paylaşarak çalışır. OCR sidecar
+    kullanılıyorsa işler yalnızca socket'te beklediği için varsayılan 'thread'dir.
+    Worker'lar fork yerine spawn ile başlatılır: başlatılmış Paddle runtime'ı
+    fork-safe değildir ve fork ana sürecin model kopyalarını da devralırdı.
+    """
+    default_mode = "thread" if os.getenv("OCR_SIDECAR_ADDRESS") else "process"
+    mode = mode or os.getenv("OCR_EXECUTOR", default_mode)
+    workers = workers or int(os.getenv("OCR_WORKERS", "2"))
+    max_pending = int(os.getenv("OCR_MAX_PENDING", str(workers * 4)))
+    if mode == "thread":
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocr")
+    else:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=get_context("spawn"), initializer=_init_ocr_worker
+        )
+    return BoundedExecutor(f"ocr-{mode}", executor, workers, max_pending)
+
+
+def create_llm_executor(workers: Optional[int] = None) -> BoundedExecutor:
+    """Senkron OpenAI SDK çağrıları (I/O-bound) için thread pool"""
+    workers = workers or int(os.getenv("LLM_WORKERS", "8"))
+    max_pending = int(os.getenv("LLM_MAX_PENDING", str(workers * 4)))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm")
+    return BoundedExecutor("llm", executor, workers, max_pending)
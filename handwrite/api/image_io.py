@@ -0,0 +1,203 @@
+"""
+Image IO - Yüklenen görselleri tek seferde decode eden yardımcılar
+"""
+import base64
+import hashlib
+import io
+import math
+import os
+from functools import cached_property
+from typing import Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+# OCR için uzun kenar sınırı; satırlar zaten 48 px yüksekliğe indirilir
+OCR_MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "2048"))
+# OpenAI vision (detail=high) görseli sunucuda 2048x2048 içine sığdırıp kısa
+# kenarı 768'e indirir; aynı boyutta göndermek modelin gördüğünü değiştirmez
+LLM_MAX_SIDE = int(os.getenv("LLM_IMAGE_MAX_SIDE", "2048"))
+LLM_SHORT_SIDE = int(os.getenv("LLM_IMAGE_SHORT_SIDE", "768"))
+LLM_JPEG_QUALITY = int(os.getenv("LLM_JPEG_QUALITY", "85"))
+LLM_GRAYSCALE = os.getenv("LLM_IMAGE_GRAYSCALE", "0") == "1"
+# CRNN normalize edilmemiş görsellerle eğitildiği için varsayılan kapalı
+NORMALIZE_CONTRAST = os.getenv("IMAGE_NORMALIZE_CONTRAST", "0") == "1"
+
+_REDUCED_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+
+def image_size(data: BytesLike) -> Optional[Tuple[int, int]]:
+    """Yalnızca başlıktan (w, h); piksel decode edilmez"""
+    try:
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as im:
+            return im.size
+    except Exception:
+        return None
+
+
+def fit_max_side(image: np.ndarray, max_side: int) -> np.ndarray:
+    """Uzun kenar max_side'ı aşıyorsa INTER_AREA ile küçült"""
+    h, w = image.shape[:2]
+    scale = max_side / float(max(h, w))
+    if scale >= 1.0:
+        return image
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+def decode_image_bytes(data: BytesLike, max_side: Optional[int] = None, min_fraction: float = 1.0) -> np.ndarray:
+    """
+    Sıkıştırılmış görsel byte'larını kopyalamadan BGR ndarray'e decode et
+    
+    EXIF yönü (telefon fotoğrafları) decode sırasında uygulanır. ``max_side``
+    verilirse JPEG'ler libjpeg'in 1/2, 1/4, 1/8 ölçekli decode'u ile açılır ve
+    sonuç INTER_AREA ile sınıra indirilir; 12 MP fotoğraf tam boyutta belleğe
+    hiç açılmaz. ``min_fraction`` < 1 ise ölçekli decode sınırın bu oranına
+    kadar altına inebilir (ayrı resize adımı gerekmez).
+    """
+    buf = np.frombuffer(memoryview(data), dtype=np.uint8)
+    flag = cv2.IMREAD_COLOR
+    if max_side:
+        size = image_size(data)
+        if size:
+            for factor in (8, 4, 2):
+                if max(size) / factor >= max_side * min_fraction:
+                    flag = _REDUCED_FLAGS[factor]
+                    break
+    image = cv2.imdecode(buf, flag)
+    if image is None:
+        raise ValueError("Görsel decode edilemedi")
+    return fit_max_side(image, max_side) if max_side else image
+
+
+def normalize_contrast(image: np.ndarray) -> np.ndarray:
+    """Parlaklık kanalında CLAHE (eşit olmayan aydınlatma, soluk mürekkep)"""
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    if image.ndim == 2:
+        return clahe.apply(image)
+    lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
+    lab[:, :, 0] = clahe.apply(lab[:, :, 0])
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+
+def load_ocr_image(data: BytesLike) -> np.ndarray:
+    """OCR girişi: EXIF yönü düzeltilmiş, OCR_MAX_SIDE'a küçültülmüş BGR görsel"""
+    # Satır yüksekliği için OCR_MAX_SIDE'ın %75'i de yeterli; resize adımı atlanır
+    image = decode_image_bytes(data, max_side=OCR_MAX_SIDE, min_fraction=0.75)
+    return normalize_contrast(image) if NORMALIZE_CONTRAST else image
+
+
+def llm_target_size(width: int, height: int, max_side: int = LLM_MAX_SIDE, short_side: int = LLM_SHORT_SIDE) -> Tuple[int, int]:
+    """OpenAI'nin detail=high ölçeklemesi: max_side kare içine sığdır, sonra kısa kenar en fazla short_side"""
+    scale = min(1.0, max_side / float(max(width, height)))
+    short = min(width, height) * scale
+    if short > short_side:
+        scale *= short_side / short
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def vision_tokens(width: int, height: int) -> int:
+    """detail=high için tahmini görsel token maliyeti (85 + 170 x 512 px karo)"""
+    w, h = llm_target_size(width, height, 2048, 768)
+    return 85 + 170 * math.ceil(w / 512) * math.ceil(h / 512)
+
+
+def encode_for_llm(data: BytesLike) -> Tuple[bytes, Tuple[int, int]]:
+    """
+    Vision çağrısı için JPEG: EXIF yönü uygulanmış, modelin göreceği boyuta
+    küçültülmüş, LLM_JPEG_QUALITY kalitesinde; (jpeg, (w, h)) döndürür
+    """
+    size = image_size(data)
+    target_long = max(llm_target_size(*size)) if size else LLM_MAX_SIDE
+    image = decode_image_bytes(data, max_side=target_long)
+    if LLM_GRAYSCALE:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if NORMALIZE_CONTRAST:
+        image = normalize_contrast(image)
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, LLM_JPEG_QUALITY])
+    if not ok:
+        raise ValueError("Görsel JPEG'e encode edilemedi")
+    return encoded.tobytes(), (image.shape[1], image.shape[0])
+
+
+def content_hash(data: BytesLike) -> str:
+    """Görsel byte'larının birebir (exact) hash'i"""
+    return hashlib.sha256(memoryview(data)).hexdigest()
+
+
+def perceptual_hash(data: BytesLike) -> Optional[int]:
+    """
+    64-bit difference hash (dHash).
+
+    Aynı fotoğrafın yeniden sıkıştırılmış/boyutlandırılmış kopyaları birkaç
+    bit farkla aynı hash'i verir. Hız için 1/8 ölçekte gri decode edilir.
+    """
+    buf = np.frombuffer(memoryview(data), dtype=np.uint8)
+    gray = cv2.imdecode(buf, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        return None
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+class ImagePayload:
+    """
+    Yüklenen görselin tek kaynağı.
+
+    Ham byte'lar bir kez tutulur; ndarray ve base64 karşılıkları yalnızca
+    ilk erişildiklerinde üretilir ve önbelleğe alınır.
+    """
+
+    def __init__(self, data: BytesLike):
+        self.data = data
+
+    @classmethod
+    def from_base64(cls, image_base64: str) -> "ImagePayload":
+        payload = cls(base64.b64decode(image_base64))
+        payload.__dict__["base64"] = image_base64
+        return payload
+
+    @cached_property
+    def array(self) -> np.ndarray:
+        """BGR görsel (OCR için, normalize edilmiş)"""
+        return load_ocr_image(self.data)
+
+    @cached_property
+    def sha256(self) -> str:
+        """Birebir içerik hash'i (cache anahtarı)"""
+        return content_hash(self.data)
+
+    @cached_property
+    def phash(self) -> Optional[int]:
+        """Algısal hash (yakın kopya eşleşmesi için)"""
+        return perceptual_hash(self.data)
+
+    @cached_property
+    def base64(self) -> str:
+        """Orijinal byte'ların base64 metni"""
+        return base64.b64encode(self.data).decode("ascii")
+
+    @cached_property
+    def _llm_image(self) -> Tuple[bytes, Tuple[int, int]]:
+        return encode_for_llm(self.data)
+
+    @property
+    def llm_jpeg(self) -> bytes:
+        """OpenAI vision çağrısı için küçültülmüş JPEG"""
+        return self._llm_image[0]
+
+    @cached_property
+    def llm_base64(self) -> str:
+        """OpenAI vision çağrısı için base64 metni"""
+        return base64.b64encode(self.llm_jpeg).decode("ascii")
+
+    @property
+    def llm_size(self) -> Tuple[int, int]:
+        return self._llm_image[1]
+
+    def __len__(self) -> int:
+        return len(self.data)
@@ -0,0 +1,98 @@
+"""
+Inference Pool - Thread'ler arasında paylaşılmayan model kopyaları havuzu
+"""
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Generic, Iterator, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class PoolTimeoutError(RuntimeError):
+    """Süre içinde boş inference context'i bulunamadı"""
+
+
+def default_pool_size() -> int:
+    """OCR_INFER_CONTEXTS ya da çekirdek sayısı (en fazla 4)"""
+    env = os.getenv("OCR_INFER_CONTEXTS")
+    if env:
+        return max(1, int(env))
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+class InferencePool(Generic[T]):
+    """
+    Sabit sayıda inference context'i (model kopyası) için checkout/return havuzu.
+
+    Dinamik graf katmanlarının re-entrant olduğu garanti edilmediğinden bir
+    context aynı anda yalnızca bir thread tarafından kullanılır. Boş context
+    yoksa ``checkout`` bekler; ``timeout`` aşılırsa PoolTimeoutError verir.
+    """
+
+    def __init__(self, contexts: List[T]):
+        if not contexts:
+            raise ValueError("InferencePool needs at least one context")
+        self._contexts = list(contexts)
+        self._free: "queue.LifoQueue[T]" = queue.LifoQueue()
+        for ctx in self._contexts:
+            self._free.put(ctx)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self._contexts)
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None) -> Iterator[T]:
+        start = time.perf_counter()
+        try:
+            ctx = self._free.get_nowait()
+            waited = False
+        except queue.Empty:
+            waited = True
+            try:
+                ctx = self._free.get(timeout=timeout)
+            except queue.Empty:
+                raise PoolTimeoutError(f"No free inference context after {timeout}s ({self.size} in use)")
+        with self._lock:
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+                self._wait_seconds += time.perf_counter() - start
+        try:
+            yield ctx
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._free.put(ctx)
+
+    @contextmanager
+    def checkout_all(self) -> Iterator[List[T]]:
+        """Tüm context'leri al (warm-up gibi her kopyaya dokunan işler için)"""
+        taken = [self._free.get() for _ in range(self.size)]
+        try:
+            yield taken
+        finally:
+            for ctx in taken:
+                self._free.put(ctx)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "contexts": self.size,
+                "in_use": self._in_use,
+                "peak_in_use": self._peak_in_use,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "avg_wait_ms": round(1000 * self._wait_seconds / self._waits, 1) if self._waits else None,
+            }
@@ -1,20 +1,31 @@
 """
 FastAPI Ana Uygulama - Reçete Analiz API
 """
-import base64
+import asyncio
 import io
+import json
 import os
-from typing import Optional
+import time
+from typing import Any, Awaitable, Dict, List, Optional
 
 import uvicorn
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
-from api.ocr_service import get_ocr_service
+from api.executors import (
+    ExecutorBusyError,
+    ProcessOCRService,
+    create_llm_executor,
+    create_ocr_executor,
+    ocr_predict_lines_bytes,
+)
+from api.image_io import ImagePayload
+from api.ocr_base import get_ocr_service
 from api.openai_service import get_openai_service, PrescriptionAnalysis
+from api.result_cache import all_cache_stats
 
 
 # FastAPI app
@@ -53,27 +64,109 @@ class PrescriptionResponse(BaseModel):
     processing_time: Optional[float] = None
 
 
+class ReadinessResponse(BaseModel):
+    """Readiness (load balancer) response"""
+    ready: bool
+    ocr_warmed_up: bool
+    warmup_seconds: Optional[float] = None
+
+
 class HealthResponse(BaseModel):
     """Health check response"""
     status: str
     ocr_model_loaded: bool
     openai_configured: bool
+    executors: Dict[str, Dict[str, Any]] = {}
+    caches: Dict[str, Dict[str, Any]] = {}
+    inference_pool: Optional[Dict[str, Any]] = None
+    openai_coalescing: Optional[Dict[str, Dict[str, Any]]] = None
 
 
 # Global services
 ocr_service = None
 openai_service = None
 
+# Inference executors (startup'ta oluşturulur)
+ocr_executor = None
+llm_executor = None
+
+# Startup (model yükleme + warm-up) tamamlandı mı
+app_ready = False
+
+# Paralel dal ayarları (saniye)
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT_SECONDS", "15"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+
+
+async def _run_branch(name: str, awaitable: Awaitable[Any], timeout: float) -> Any:
+    """Bir analiz dalını deadline ile çalıştır; hata/timeout durumunda None döndür"""
+    try:
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+    except asyncio.TimeoutError:
+        print(f"{name} timed out after {timeout:.0f}s")
+    except Exception as e:
+        print(f"{name} failed: {e}")
+    return None
+
+
+async def _ocr_lines(image: ImagePayload) -> List[Dict[str, Any]]:
+    """OCR satırlarını cache'ten al ya da (decode dahil) OCR executor'ında hesapla"""
+    cache = ocr_service.cache
+    if cache is not None:
+        lines = cache.get(image.sha256, ocr_service.cache_variant, lambda: image.phash)
+        if lines is not None:
+            return lines
+    lines = await ocr_executor.run(ocr_predict_lines_bytes, image.data)
+    # Model yokken dönen boş sonuç cache'lenirse model geri geldiğinde de TTL boyunca boş döner
+    if cache is not None and lines and ocr_service.is_available():
+        cache.set(image.sha256, lines, ocr_service.cache_variant, lambda: image.phash)
+    return lines
+
+
+def _image_llm_base64(image: ImagePayload) -> str:
+    return image.llm_base64
+
+
+async def _llm_base64(image: ImagePayload) -> str:
+    """OpenAI'ye gidecek görseli (decode + resize + JPEG) event loop dışında hazırla"""
+    return await llm_executor.run(_image_llm_base64, image)
+
+
+async def _analyze_openai(image: ImagePayload, user_question: str) -> Any:
+    return await openai_service.analyze_prescription_async(
+        image_base64=await _llm_base64(image),
+        user_question=user_question
+    )
+
+
+async def _run_ocr(image: ImagePayload) -> str:
+    return ocr_service.lines_to_text(await _ocr_lines(image))
+
+
+def _sse(event: str, data: Any) -> str:
+    """Tek bir Server-Sent Events mesajı"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _busy_exception(e: ExecutorBusyError) -> HTTPException:
+    return HTTPException(status_code=503, detail=f"Sunucu meşgul: {e}", headers={"Retry-After": "1"})
+
 
 @app.on_event("startup")
 async def startup_event():
-    """Uygulama başlangıcında servisleri yükle"""
-    global ocr_service, openai_service
+    """Uygulama başlangıcında servisleri yükle ve OCR modelini ısıt"""
+    global ocr_service, openai_service, ocr_executor, llm_executor, app_ready
     
     try:
-        # OCR servisini yükle
-        ocr_service = get_ocr_service()
-        print("✅ OCR service loaded successfully")
+        # Process worker'ları spawn ile başlar ve modeli kendileri yükler; ana süreç
+        # yalnızca cache'i tutar, model kopyası yüklemez. Sidecar modunda da model
+        # ana süreçte değil sidecar'dadır (get_ocr_service istemci döndürür).
+        ocr_executor = create_ocr_executor()
+        if ocr_executor.name == "ocr-process":
+            ocr_service = ProcessOCRService(ocr_executor)
+        else:
+            ocr_service = get_ocr_service()
+        print(f"✅ OCR service loaded successfully ({ocr_executor.name}, {ocr_executor.max_workers} workers)")
     except Exception as e:
         print(f"❌ OCR service loading failed: {e}")
         ocr_service = None
@@ -85,6 +178,30 @@ async def startup_event():
     except Exception as e:
         print(f"❌ OpenAI service loading failed: {e}")
         openai_service = None
+    
+    llm_executor = create_llm_executor()
+    
+    if ocr_service:
+        try:
+            if isinstance(ocr_service, ProcessOCRService):
+                # Worker'ları şimdi başlat ve ısıt ki ilk istek model yüklemesini beklemesin
+                pids = await ocr_service.warmup_workers()
+                print(f"✅ OCR workers warmed up: {pids}")
+            else:
+                # Thread modunda inference bu süreçteki kopyalarla yapılır; sidecar modunda sidecar beklenir
+                await asyncio.get_running_loop().run_in_executor(None, ocr_service.warmup)
+        except Exception as e:
+            print(f"❌ OCR warm-up failed: {e}")
+    
+    app_ready = openai_service is not None or (ocr_service is not None and ocr_service.warmed_up)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Executor'ları kapat"""
+    for executor in (ocr_executor, llm_executor):
+        if executor:
+            executor.shutdown()
 
 
 @app.get("/health", response_model=HealthResponse)
@@ -93,10 +210,25 @@ async def health_check():
     return HealthResponse(
         status="healthy" if (ocr_service and openai_service) else "degraded",
         ocr_model_loaded=ocr_service is not None,
-        openai_configured=openai_service is not None
+        openai_configured=openai_service is not None,
+        executors={e.name: e.stats() for e in (ocr_executor, llm_executor) if e},
+        caches=all_cache_stats(),
+        inference_pool=ocr_service.pool.stats() if getattr(ocr_service, "pool", None) else None,
+        openai_coalescing=openai_service.coalescing_stats() if openai_service else None
     )
 
 
+@app.get("/ready", response_model=ReadinessResponse)
+async def readiness_check():
+    """Load balancer readiness kontrolü: warm-up bitene kadar 503"""
+    body = ReadinessResponse(
+        ready=app_ready,
+        ocr_warmed_up=bool(ocr_service and ocr_service.warmed_up),
+        warmup_seconds=ocr_service.warmup_seconds if ocr_service else None
+    )
+    return JSONResponse(content=body.model_dump(), status_code=200 if app_ready else 503)
+
+
 @app.post("/analyze-prescription", response_model=PrescriptionResponse)
 async def analyze_prescription(
     file: UploadFile = File(...),
@@ -122,34 +254,27 @@ async def analyze_prescription(
         if file.content_type and not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="Sadece görsel dosyaları kabul edilir")
         
-        # Dosyayı oku
-        file_content = await file.read()
-        
-        # Base64'e çevir
-        image_base64 = base64.b64encode(file_content).decode('utf-8')
-        
-        # OpenAI ile analiz et
-        analysis = None
-        ocr_text = None
+        # Dosyayı oku (base64 yalnızca OpenAI çağrısında üretilir)
+        image = ImagePayload(await file.read())
         
+        # OpenAI ve OCR dallarını eş zamanlı başlat
+        branches = {}
         if openai_service:
-            try:
-                analysis = openai_service.analyze_prescription(
-                    image_base64=image_base64,
-                    user_question=user_question
-                )
-            except Exception as e:
-                print(f"OpenAI analysis failed: {e}")
-                analysis = None
+            branches["openai"] = _run_branch(
+                "OpenAI analysis", _analyze_openai(image, user_question), OPENAI_TIMEOUT
+            )
+        if use_ocr_fallback and ocr_service:
+            branches["ocr"] = _run_branch("OCR", _run_ocr(image), OCR_TIMEOUT)
         
-        # OCR fallback
-        if (not analysis or use_ocr_fallback) and ocr_service:
-            try:
-                ocr_text = ocr_service.predict_from_base64(image_base64)
-                print(f"OCR result: {ocr_text}")
-            except Exception as e:
-                print(f"OCR failed: {e}")
-                ocr_text = None
+        results = dict(zip(branches, await asyncio.gather(*branches.values())))
+        analysis = results.get("openai")
+        ocr_text = results.get("ocr")
+        
+        # OCR fallback (paralel çalıştırılmadıysa)
+        if not analysis and "ocr" not in results and ocr_service:
+            ocr_text = await _run_branch("OCR", _run_ocr(image), OCR_TIMEOUT)
+        if ocr_text:
+            print(f"OCR result: {ocr_text}")
         
         # Eğer hiçbir servis çalışmıyorsa
         if not analysis and not ocr_text:
@@ -178,6 +303,107 @@ async def analyze_prescription(
         )
 
 
+@app.post("/analyze-prescription/stream")
+async def analyze_prescription_stream(
+    file: UploadFile = File(...),
+    user_question: str = Form("Bu reçeteyi analiz et"),
+    use_ocr_fallback: bool = Form(True)
+):
+    """
+    /analyze-prescription'ın Server-Sent Events sürümü
+    
+    OCR ve OpenAI dalları eş zamanlı çalışır; sonuçlar hazır oldukça gönderilir:
+    ``ocr`` (metin + satırlar), OpenAI çıktısı geldikçe ``token``, tamamlanan
+    analiz alanları için ``fields``, sonunda
+    ``analysis`` (yapılandırılmış rapor), dal hatalarında ``error`` ve en son
+    ``done`` (ocr_ms, first_token_ms, total_ms).
+    """
+    start_time = time.perf_counter()
+    
+    if file.content_type and not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="Sadece görsel dosyaları kabul edilir")
+    if not openai_service and not (use_ocr_fallback and ocr_service):
+        raise HTTPException(status_code=503, detail="Hem OpenAI hem de OCR servisleri kullanılamıyor")
+    
+    image = ImagePayload(await file.read())
+    
+    def elapsed_ms() -> int:
+        return int((time.perf_counter() - start_time) * 1000)
+    
+    async def events():
+        queue: asyncio.Queue = asyncio.Queue()
+        timings: Dict[str, Optional[int]] = {"ocr_ms": None, "first_token_ms": None}
+        
+        async def ocr_branch():
+            lines = await _run_branch("OCR", _ocr_lines(image), OCR_TIMEOUT)
+            if lines is None:
+                await queue.put(("error", {"branch": "ocr", "message": "OCR başarısız ya da zaman aşımı"}))
+            else:
+                timings["ocr_ms"] = elapsed_ms()
+                await queue.put(("ocr", {"text": ocr_service.lines_to_text(lines), "lines": lines, "elapsed_ms": timings["ocr_ms"]}))
+        
+        async def openai_branch():
+            async def pump():
+                image_base64 = await _llm_base64(image)
+                async for kind, value in openai_service.stream_prescription_analysis(
+                    image_base64=image_base64,
+                    user_question=user_question
+                ):
+                    if kind == "token":
+                        if timings["first_token_ms"] is None:
+                            timings["first_token_ms"] = elapsed_ms()
+                        await queue.put(("token", {"text": value}))
+                    elif kind == "fields":
+                        await queue.put(("fields", value))
+                    else:
+                        await queue.put(("analysis", {**value.model_dump(), "elapsed_ms": elapsed_ms()}))
+            try:
+                await asyncio.wait_for(pump(), timeout=OPENAI_TIMEOUT)
+            except asyncio.TimeoutError:
+                await queue.put(("error", {"branch": "openai", "message": f"OpenAI {OPENAI_TIMEOUT:.0f}s içinde tamamlanmadı"}))
+            except ExecutorBusyError as e:
+                await queue.put(("error", {"branch": "openai", "message": f"Sunucu meşgul: {e}"}))
+            except Exception as e:
+                # Decode edilemeyen görsel, OpenAI istemci hatası vb.; istemci done'dan önce görmeli
+                print(f"OpenAI stream failed: {e}")
+                await queue.put(("error", {"branch": "openai", "message": str(e)}))
+
+        async def run(branch):
+            try:
+                await branch()
+            finally:
+                await queue.put(None)
+        
+        tasks = []
+        if use_ocr_fallback and ocr_service:
+            tasks.append(asyncio.create_task(run(ocr_branch)))
+        if openai_service:
+            tasks.append(asyncio.create_task(run(openai_branch)))
+        
+        try:
+            remaining = len(tasks)
+            while remaining:
+                item = await queue.get()
+                if item is None:
+                    remaining -= 1
+                    continue
+                yield _sse(*item)
+            
+            timings["total_ms"] = elapsed_ms()
+            print(f"analyze-prescription/stream {timings}")
+            yield _sse("done", timings)
+        finally:
+            # İstemci bağlantıyı kestiyse dalları iptal et
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.post("/extract-text", response_model=dict)
 async def extract_text_only(
     file: UploadFile = File(...),
@@ -199,24 +425,30 @@ async def extract_text_only(
             raise HTTPException(status_code=400, detail="Sadece görsel dosyaları kabul edilir")
         
         # Dosyayı oku
-        file_content = await file.read()
-        image_base64 = base64.b64encode(file_content).decode('utf-8')
+        image = ImagePayload(await file.read())
         
         text = ""
         method = ""
+        lines = []
         
         if use_ocr and ocr_service:
             try:
-                text = ocr_service.predict_from_base64(image_base64)
+                lines = await _ocr_lines(image)
+                text = ocr_service.lines_to_text(lines)
                 method = "OCR"
+            except ExecutorBusyError:
+                raise
             except Exception as e:
                 print(f"OCR failed: {e}")
                 text = ""
         
         if not text and openai_service:
             try:
-                text = openai_service.extract_text_only(image_base64)
+                # Görsel hazırlığı da OpenAI çağrısıyla birlikte executor'da çalışır
+                text = await llm_executor.run(lambda: openai_service.extract_text_only(image.llm_base64))
                 method = "OpenAI"
+            except ExecutorBusyError:
+                raise
             except Exception as e:
                 print(f"OpenAI text extraction failed: {e}")
                 text = ""
@@ -230,9 +462,12 @@ async def extract_text_only(
         return {
             "success": True,
             "text": text,
-            "method": method
+            "method": method,
+            "lines": lines
         }
         
+    except ExecutorBusyError as e:
+        raise _busy_exception(e)
     except HTTPException:
         raise
     except Exception as e:
@@ -0,0 +1,115 @@
+"""
+OCR Base - Model gerektirmeyen ortak OCR yardımcıları ve servis seçimi
+
+Bu modül paddle import etmez. OCR_SIDECAR_ADDRESS ayarlı worker'lar yalnızca
+bunu ve api.ocr_client'ı yükler; model runtime'ı host başına tek kopya olarak
+sidecar sürecinde kalır.
+"""
+import base64
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from api.image_io import BytesLike, ImagePayload
+from scripts.line_segmentation import LineBox, segment_lines
+
+
+class BaseOCRService:
+    """
+    Yerel model (OCRService) ve sidecar istemcisi (RemoteOCRService) için ortak kısım.
+
+    Alt sınıflar ``cache``, ``cache_variant``, ``warmed_up`` ve ``warmup_seconds``
+    alanlarını kurar; cache'siz satır tanıma ``_lines_from_bytes`` ile yapılır.
+    """
+
+    cache = None
+    cache_variant = ""
+    warmed_up = False
+    warmup_seconds: Optional[float] = None
+
+    def is_available(self) -> bool:
+        raise NotImplementedError
+
+    def warmup(self, *args: Any, **kwargs: Any) -> float:
+        raise NotImplementedError
+
+    def predict_lines(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def _lines_from_bytes(self, image_data: BytesLike) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @staticmethod
+    def lines_to_text(lines: List[Dict[str, Any]]) -> str:
+        """Satır sonuçlarını tek metne birleştir"""
+        return "\n".join(line["text"] for line in lines if line["text"])
+
+    @staticmethod
+    def segment(image: np.ndarray) -> List[LineBox]:
+        """Satır segmentasyonu; tek satırlı görsel olduğu gibi kullanılır"""
+        boxes = segment_lines(image)
+        if len(boxes) <= 1:
+            h, w = image.shape[:2]
+            boxes = [LineBox(0, 0, w, h)]
+        return boxes
+
+    def predict_from_base64(self, base64_image: str) -> str:
+        """Base64 encoded görüntüden metin çıkar"""
+        return self.predict_from_bytes(base64.b64decode(base64_image))
+
+    def predict_from_bytes(self, image_data: BytesLike, use_cache: bool = True) -> str:
+        """Sıkıştırılmış görsel byte'larından metin çıkar (tek decode, PIL yok)"""
+        if not self.is_available():
+            return "OCR not available (PaddlePaddle not installed)"
+
+        try:
+            return self.lines_to_text(self.predict_lines_from_bytes(image_data, use_cache))
+        except Exception as e:
+            return f"OCR error: {str(e)}"
+
+    def predict_lines_from_bytes(self, image_data: BytesLike, use_cache: bool = True) -> List[Dict[str, Any]]:
+        """
+        Sıkıştırılmış görsel byte'larından satır satır metin çıkar
+
+        Aynı (veya algısal olarak çok benzer) görsel için sonuç cache'ten döner;
+        decode ve inference tekrarlanmaz.
+        """
+        if not use_cache or self.cache is None or not self.is_available():
+            return self._lines_from_bytes(image_data)
+
+        # phash yalnızca birebir eşleşme yoksa hesaplanır
+        image = ImagePayload(image_data)
+        lines = self.cache.get(image.sha256, self.cache_variant, lambda: image.phash)
+        if lines is None:
+            lines = self._lines_from_bytes(image.data)
+            if lines:
+                self.cache.set(image.sha256, lines, self.cache_variant, lambda: image.phash)
+        return lines
+
+
+# Global OCR service instance
+ocr_service: Optional[BaseOCRService] = None
+_ocr_service_lock = threading.Lock()
+
+
+def get_ocr_service(num_contexts: Optional[int] = None) -> BaseOCRService:
+    """
+    Singleton OCR service instance
+
+    OCR_SIDECAR_ADDRESS ayarlıysa model (ve paddle) bu süreçte yüklenmez;
+    istekler host başına tek model tutan OCR sidecar sürecine gönderilir.
+    ``num_contexts`` yalnızca ilk çağrıda, servis oluşturulurken kullanılır.
+    """
+    global ocr_service
+    if ocr_service is None:
+        with _ocr_service_lock:
+            if ocr_service is None:
+                if os.getenv("OCR_SIDECAR_ADDRESS"):
+                    from api.ocr_client import RemoteOCRService
+                    ocr_service = RemoteOCRService(os.environ["OCR_SIDECAR_ADDRESS"])
+                else:
+                    from api.ocr_service import OCRService
+                    ocr_service = OCRService(num_contexts=num_contexts)
+    return ocr_service
@@ -0,0 +1,178 @@
+"""
+OCR Client - OCR sidecar'ına bağlanan hafif istemci
+
+Bu modül paddle import etmez; OCR_SIDECAR_ADDRESS ayarlı worker'lar modeli ve
+Paddle runtime'ını hiç yüklemez (bkz. api.ocr_sidecar).
+"""
+import ipaddress
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Connection
+from typing import Any, Dict, List, Tuple, Union
+
+import cv2
+import numpy as np
+
+from api.executors import ExecutorBusyError
+from api.image_io import BytesLike
+from api.ocr_base import BaseOCRService
+from api.result_cache import get_result_cache
+
+Address = Union[str, Tuple[str, int]]
+# Yalnızca Unix socket / loopback adreslerinde geçerli (bkz. sidecar_authkey)
+DEFAULT_AUTHKEY = "handwrite-ocr"
+
+
+class SidecarBusyError(ExecutorBusyError):
+    """Sidecar kuyruğu dolu (backpressure); API'de 503 + Retry-After olur"""
+
+
+class SidecarUnavailableError(RuntimeError):
+    """Sidecar'a bağlanılamadı"""
+
+
+def parse_address(address: str) -> Address:
+    """'/path/to.sock' -> Unix socket, 'host:port' -> TCP"""
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        return host, int(port)
+    return address
+
+
+def is_local_address(address: Address) -> bool:
+    """Unix socket ya da loopback TCP adresi mi"""
+    if isinstance(address, str):
+        return True
+    host = address[0]
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def sidecar_authkey(address: Address) -> bytes:
+    """
+    Bağlantı anahtarı; yerel olmayan TCP adresi yalnızca açık anahtarla kabul edilir
+
+    multiprocessing.connection gelen mesajı unpickle eder: anahtarı bilen ve
+    porta erişebilen herkes sidecar'da kod çalıştırabilir. Varsayılan anahtar
+    herkese açık olduğundan yalnızca Unix socket ve loopback'te kullanılır.
+    """
+    key = os.getenv("OCR_SIDECAR_AUTHKEY")
+    if key:
+        return key.encode("utf-8")
+    if not is_local_address(address):
+        raise ValueError(
+            f"OCR sidecar address {address} is not a Unix socket or loopback; "
+            "set OCR_SIDECAR_AUTHKEY to a secret shared by the sidecar and the workers"
+        )
+    return DEFAULT_AUTHKEY.encode("utf-8")
+
+
+class RemoteOCRService(BaseOCRService):
+    """
+    Sidecar'a bağlanan OCR servisi.
+
+    Model yüklenmez; sonuç cache'i ve metin birleştirme yerel kalır, yalnızca
+    cache'siz satır tanıma sidecar'a gider. Thread başına bir bağlantı tutulur
+    ve kopan bağlantı bir kez yeniden kurulur.
+    """
+
+    def __init__(self, address: str, timeout: float = 30.0):
+        self.address = parse_address(address)
+        # Yanlış yapılandırma ilk istekte değil, servis oluşturulurken görülür
+        self.authkey = sidecar_authkey(self.address)
+        self.timeout = timeout
+        self.model = None
+        self.decoder = None
+        self.cache = get_result_cache("ocr")
+        self.cache_variant = ""
+        self.warmed_up = False
+        self.warmup_seconds = None
+        self._local = threading.local()
+        try:
+            self._refresh_info()
+        except SidecarUnavailableError as e:
+            # Sidecar henüz ayağa kalkmamış olabilir; warmup() bekler
+            print(f"OCR sidecar not reachable yet: {e}")
+
+    def is_available(self) -> bool:
+        return True
+
+    def _connection(self) -> Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            try:
+                conn = Client(self.address, authkey=self.authkey)
+            except (OSError, EOFError) as e:
+                raise SidecarUnavailableError(f"{self.address}: {e}") from e
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _call(self, op: str, payload: Any = None) -> Any:
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.send((op, payload))
+                answered = conn.poll(self.timeout)
+                if answered:
+                    status, result = conn.recv()
+            except (EOFError, OSError):
+                self._drop_connection()
+                if attempt:
+                    raise SidecarUnavailableError(f"{self.address}: connection lost")
+                continue
+            if not answered:
+                # Geç gelecek cevap sonraki isteğe karışmasın
+                self._drop_connection()
+                raise TimeoutError(f"OCR sidecar did not answer in {self.timeout}s")
+            break
+        if status == "busy":
+            raise SidecarBusyError(result)
+        if status != "ok":
+            raise RuntimeError(f"OCR sidecar error: {result}")
+        return result
+
+    def _refresh_info(self) -> Dict[str, Any]:
+        info = self._call("info")
+        self.cache_variant = f"sidecar:{info['cache_variant']}"
+        self.warmed_up = info["ready"]
+        self.warmup_seconds = info["warmup_seconds"]
+        return info
+
+    def sidecar_info(self) -> Dict[str, Any]:
+        return self._refresh_info()
+
+    def warmup(self, batch_sizes: Tuple[int, ...] = (1, 8), rounds: int = 2, wait_seconds: float = 300.0) -> float:
+        """Sidecar'ın warm-up'ı bitirmesini bekle (model burada yüklenmez)"""
+        deadline = time.monotonic() + wait_seconds
+        while True:
+            try:
+                if self._refresh_info()["ready"]:
+                    return self.warmup_seconds or 0.0
+            except SidecarUnavailableError:
+                pass
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"OCR sidecar not ready after {wait_seconds:.0f}s")
+            time.sleep(1.0)
+
+    def predict_lines(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        ok, encoded = cv2.imencode(".png", image)
+        if not ok:
+            raise ValueError("Görsel encode edilemedi")
+        return self._lines_from_bytes(encoded.tobytes())
+
+    def _lines_from_bytes(self, image_data: BytesLike) -> List[Dict[str, Any]]:
+        return self._call("lines", bytes(image_data))
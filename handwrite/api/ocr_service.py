@@ -1,19 +1,23 @@
 """
 OCR Service - Mevcut CRNN modelini kullanarak OCR işlemleri
 """
-import base64
-import io
+import time
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import cv2
 import numpy as np
-from PIL import Image
+
+from api.image_io import NORMALIZE_CONTRAST, OCR_MAX_SIDE, BytesLike, load_ocr_image
+from api.inference_pool import InferencePool, default_pool_size
+from api.ocr_base import BaseOCRService, get_ocr_service  # noqa: F401 (eski import yolu)
+from api.result_cache import get_result_cache
+from scripts.ctc_decoder import CTCDecoder, load_lexicon
 
 try:
     import paddle
     from scripts.model_crnn import CRNNCTC
-    from scripts.data_pipeline import resize_keep_ratio, pad_to_width
+    from scripts.data_pipeline import TARGET_H, WIDTH_BUCKETS, bucket_for_width, resize_keep_ratio, pad_to_width
     PADDLE_AVAILABLE = True
 except ImportError as e:
     print(f"PaddlePaddle not available: {e}")
@@ -24,14 +28,31 @@ except ImportError as e:
     pad_to_width = None
 
 
-class OCRService:
-    def __init__(self, checkpoint_path: str = "checkpoints/crnn_ctc_best.pdparams"):
+class OCRService(BaseOCRService):
+    def __init__(
+        self,
+        checkpoint_path: str = "checkpoints/crnn_ctc_best.pdparams",
+        beam_width: int = 10,
+        lexicon_path: Optional[str] = "data/lexicon/drug_names.txt",
+        num_contexts: Optional[int] = None,
+    ):
         self.checkpoint_path = Path(checkpoint_path)
         self.charset_path = Path("checkpoints/charset.txt")
+        self.lexicon_path = Path(lexicon_path) if lexicon_path else None
+        self.beam_width = beam_width
+        self.num_contexts = num_contexts or default_pool_size()
         self.model = None
+        # Model kopyaları; her thread inference için bir kopya ödünç alır
+        self.pool: Optional[InferencePool] = None
         self.charset = ""
         self.char_to_idx = {}
         self.idx_to_char = {}
+        self.decoder = None
+        self.cache = get_result_cache("ocr")
+        # Sonucu etkileyen ayarlar cache anahtarına girer
+        self.cache_variant = ""
+        self.warmed_up = False
+        self.warmup_seconds = None
         self._load_model()
     
     def _load_model(self):
@@ -45,13 +66,25 @@ class OCRService:
         try:
             # Charset'i yükle
             with open(self.charset_path, 'r', encoding='utf-8') as f:
-                self.charset = f.read().strip()
+                self.charset = f.read().rstrip('\n')  # baştaki boşluk karakteri charset'in parçası
             
             # Karakter mapping'leri oluştur
             self.char_to_idx = {c: i + 1 for i, c in enumerate(self.charset)}  # +1 for CTC blank
             self.idx_to_char = {i + 1: c for i, c in enumerate(self.charset)}
             self.idx_to_char[0] = ''  # CTC blank
             
+            # Decoder (beam search + opsiyonel ilaç adı sözlüğü)
+            lexicon = load_lexicon(self.lexicon_path, self.charset) if self.lexicon_path else None
+            self.decoder = CTCDecoder(self.idx_to_char, beam_width=self.beam_width, lexicon=lexicon)
+            if lexicon is not None:
+                print(f"Lexicon loaded: {len(lexicon)} entries from {self.lexicon_path}")
+            
+            checkpoint_mtime = self.checkpoint_path.stat().st_mtime if self.checkpoint_path.exists() else 0
+            self.cache_variant = (
+                f"{self.checkpoint_path}:{checkpoint_mtime}:{WIDTH_BUCKETS}:{self.beam_width}:{self.lexicon_path}"
+                f":{OCR_MAX_SIDE}:{int(NORMALIZE_CONTRAST)}"
+            )
+            
             # Model'i yükle
             num_classes = len(self.charset) + 1  # +1 for CTC blank
             self.model = CRNNCTC(num_classes)
@@ -72,13 +105,16 @@ class OCRService:
                 print(f"Checkpoint not found: {self.checkpoint_path}")
                 # Model'i sıfır durumda bırak
                 self.model.eval()
+            
+            self.pool = InferencePool([self.model] + [self._replicate_model() for _ in range(self.num_contexts - 1)])
+            print(f"OCR inference contexts: {self.pool.size}")
         except Exception as e:
             print(f"Model initialization failed: {e}")
             self.model = None
             self.charset = ""
     
-    def preprocess_image(self, image: np.ndarray) -> np.ndarray:
-        """Görüntüyü model için hazırla"""
+    def preprocess_image(self, image: np.ndarray, width: Optional[int] = None) -> np.ndarray:
+        """Görüntüyü model için hazırla (genişlik verilmezse en küçük uygun bucket'a pad'lenir)"""
         if not PADDLE_AVAILABLE or resize_keep_ratio is None or pad_to_width is None:
             # Fallback preprocessing
             if len(image.shape) == 3 and image.shape[2] == 3:
@@ -94,9 +130,9 @@ class OCRService:
         if len(image.shape) == 3 and image.shape[2] == 3:
             image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
         
-        # Boyutlandır ve pad'le
-        image = resize_keep_ratio(image, target_h=48, max_w=512)
-        image = pad_to_width(image, width=512)
+        # Boyutlandır ve genişlik bucket'ına pad'le (kısa kelimeler 512 px'lik hesap ödemez)
+        image = resize_keep_ratio(image, target_h=TARGET_H, max_w=WIDTH_BUCKETS[-1])
+        image = pad_to_width(image, width=width or bucket_for_width(image.shape[1]))
         
         # Normalize et (0-1 arası)
         image = image.astype(np.float32) / 255.0
@@ -107,70 +143,125 @@ class OCRService:
         
         return image
     
-    def decode_ctc(self, logits: np.ndarray) -> str:
-        """CTC çıktısını metne çevir"""
-        # Greedy decoding
-        predictions = np.argmax(logits, axis=-1)  # (T,)
+    def preprocess_batches(self, images: List[np.ndarray]) -> List[Tuple[List[int], np.ndarray]]:
+        """Görüntüleri genişlik bucket'larına göre batch'le: [(orijinal indeksler, (N, C, H, W_bucket))]"""
+        groups: Dict[int, List[int]] = {}
+        processed = [self.preprocess_image(img) for img in images]
+        for i, arr in enumerate(processed):
+            groups.setdefault(arr.shape[-1], []).append(i)
+        return [
+            (indices, np.concatenate([processed[i] for i in indices], axis=0))
+            for _, indices in sorted(groups.items())
+        ]
+    
+    def is_available(self) -> bool:
+        """Inference yapılabiliyor mu (model yüklü)"""
+        return PADDLE_AVAILABLE and self.model is not None
+    
+    def _replicate_model(self):
+        """Ağırlıkları ana modelden kopyalanmış bağımsız bir model örneği"""
+        replica = CRNNCTC(len(self.charset) + 1)
+        replica.set_state_dict(self.model.state_dict())
+        replica.eval()
+        return replica
+    
+    def _infer(self, batch: np.ndarray, model=None) -> np.ndarray:
+        """(N, C, H, W) batch'i modelden geçir: (T, N, num_classes) logits"""
+        if model is None:
+            with self.pool.checkout() as model:
+                return self._infer(batch, model)
+        with paddle.no_grad():
+            return model(paddle.to_tensor(batch)).numpy()
+    
+    def warmup(self, batch_sizes: Tuple[int, ...] = (1, 8), rounds: int = 2) -> float:
+        """
+        Her genişlik bucket'ı ve batch boyutu için dummy inference çalıştır
         
-        # CTC decoding - blank'leri ve tekrarları kaldır
-        decoded = []
-        prev_char = -1
+        İlk çağrıların kernel seçimi/bellek ayırma maliyeti kullanıcı
+        isteğine değil başlangıca yansır. Süreyi (saniye) döndürür.
+        """
+        if not self.is_available():
+            return 0.0
         
-        for char_idx in predictions:
-            if char_idx != prev_char and char_idx != 0:  # 0 is blank
-                decoded.append(self.idx_to_char.get(char_idx, ''))
-            prev_char = char_idx
+        start = time.time()
+        with self.pool.checkout_all() as models:
+            for model in models:
+                for width in WIDTH_BUCKETS:
+                    for n in batch_sizes:
+                        dummy = np.ones((n, 3, TARGET_H, width), dtype=np.float32)
+                        for _ in range(rounds):
+                            self._infer(dummy, model)
+        # Segmentasyon + decoder yolunu da bir kez çalıştır
+        self.predict_lines(np.full((TARGET_H * 2, 256, 3), 255, dtype=np.uint8))
         
-        return ''.join(decoded)
+        self.warmup_seconds = time.time() - start
+        self.warmed_up = True
+        print(f"OCR warm-up done in {self.warmup_seconds:.1f}s")
+        return self.warmup_seconds
+    
+    def decode_ctc(self, logits: np.ndarray) -> str:
+        """CTC çıktısını metne çevir"""
+        return self.decode_ctc_with_confidence(logits)[0]
+    
+    def decode_ctc_with_confidence(self, logits: np.ndarray) -> Tuple[str, float]:
+        """CTC çıktısını metne çevir ve güven skorunu döndür (0-1)"""
+        if self.decoder is None:
+            self.decoder = CTCDecoder(self.idx_to_char, beam_width=1)
+        return self.decoder.decode(logits)
     
     def predict(self, image: np.ndarray) -> str:
         """Görüntüden metin çıkar"""
-        if not PADDLE_AVAILABLE or self.model is None:
-            return "OCR not available (PaddlePaddle not installed)"
+        return self.predict_with_confidence(image)[0]
+    
+    def predict_with_confidence(self, image: np.ndarray) -> Tuple[str, float]:
+        """Görüntüden metin ve güven skoru çıkar (çok satırlı sayfalarda satırlar '\\n' ile birleşir)"""
+        if not self.is_available():
+            return "OCR not available (PaddlePaddle not installed)", 0.0
         
         try:
-            # Preprocess
-            processed_image = self.preprocess_image(image)
-            
-            # Paddle tensor'a çevir
-            input_tensor = paddle.to_tensor(processed_image)
-            
-            # Inference
-            with paddle.no_grad():
-                logits = self.model(input_tensor)  # (T, 1, num_classes)
-                logits = logits.squeeze(1)  # (T, num_classes)
-                logits_np = logits.numpy()
-            
-            # Decode
-            text = self.decode_ctc(logits_np)
-            return text.strip()
+            lines = self.predict_lines(image)
+            text = self.lines_to_text(lines)
+            confidence = float(np.mean([line["confidence"] for line in lines])) if lines else 0.0
+            return text, confidence
         except Exception as e:
-            return f"OCR error: {str(e)}"
+            return f"OCR error: {str(e)}", 0.0
     
-    def predict_from_base64(self, base64_image: str) -> str:
-        """Base64 encoded görüntüden metin çıkar"""
-        # Base64'ü decode et
-        image_data = base64.b64decode(base64_image)
-        image = Image.open(io.BytesIO(image_data))
-        image_np = np.array(image)
+    def predict_lines(self, image: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Sayfayı metin satırlarına böl ve satırları genişlik bucket'ı başına tek batch'te tanı
         
-        return self.predict(image_np)
+        Returns:
+            Yukarıdan aşağıya sıralı satırlar: {"text", "confidence", "box": {x, y, w, h}}
+        """
+        if not self.is_available():
+            return []
+        
+        boxes = self.segment(image)
+        decoded = self.recognize_crops([box.crop(image) for box in boxes])
+        return [
+            {"text": text.strip(), "confidence": confidence, "box": box.to_dict()}
+            for box, (text, confidence) in zip(boxes, decoded)
+        ]
+    
+    def recognize_crops(self, crops: List[np.ndarray]) -> List[Tuple[str, float]]:
+        """Satır kırpıntılarını tanı; her genişlik bucket'ı için tek forward pass"""
+        decoded: List[Tuple[str, float]] = [("", 0.0)] * len(crops)
+        for indices, batch in self.preprocess_batches(crops):
+            for i, result in zip(indices, self.decoder.decode_batch(self._infer(batch))):
+                decoded[i] = result
+        return decoded
+    
+    def _lines_from_bytes(self, image_data: BytesLike) -> List[Dict[str, Any]]:
+        """Cache'siz satır tanıma (uzak servis bu adımı sidecar'a devreder)"""
+        return self.predict_lines(load_ocr_image(image_data))
     
     def predict_from_file(self, image_path: str) -> str:
         """Dosyadan görüntü okuyup metin çıkar"""
-        image = cv2.imread(image_path)
-        if image is None:
+        try:
+            with open(image_path, "rb") as f:
+                image = load_ocr_image(f.read())
+        except (OSError, ValueError):
             raise ValueError(f"Could not load image: {image_path}")
         
         return self.predict(image)
 
-
-# Global OCR service instance
-ocr_service = None
-
-def get_ocr_service() -> OCRService:
-    """Singleton OCR service instance"""
-    global ocr_service
-    if ocr_service is None:
-        ocr_service = OCRService()
-    return ocr_service
@@ -0,0 +1,221 @@
+"""
+OCR Sidecar - Host başına tek CRNN kopyası tutan inference süreci
+
+Gunicorn/uvicorn worker'ları modeli kendileri yüklemek yerine görsel
+byte'larını yerel socket üzerinden bu sürece gönderir. Sidecar farklı
+worker'lardan gelen satır kırpıntılarını kısa bir pencerede toplayıp
+genişlik bucket'ı başına tek forward pass'te tanır.
+
+Başlatma (handwrite/ dizininden):
+    python -m api.ocr_sidecar --address /tmp/handwrite-ocr.sock
+
+Worker'larda:
+    export OCR_SIDECAR_ADDRESS=/tmp/handwrite-ocr.sock
+"""
+import argparse
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import Connection, Listener
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from api.image_io import BytesLike, load_ocr_image
+from api.ocr_client import Address, SidecarBusyError, parse_address, sidecar_authkey
+from api.ocr_service import OCRService
+
+
+class _Job:
+    """Bir görselin satır kırpıntıları ve tanıma sonucu"""
+
+    __slots__ = ("crops", "results", "error", "done")
+
+    def __init__(self, crops: List[np.ndarray]):
+        self.crops = crops
+        self.results: Optional[List[Tuple[str, float]]] = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+
+class OCRSidecar:
+    """
+    Tek model kopyası üzerinde çapraz-istek batching yapan sunucu.
+
+    Her bağlantı kendi thread'inde decode + segmentasyon yapar (cv2 GIL'i
+    bırakır); inference batch thread'lerinde, kuyruktaki işler ``max_wait_ms``
+    boyunca ya da ``max_batch`` satıra ulaşana kadar toplanarak çalışır; her
+    inference context'i için bir batch thread'i vardır.
+    Kuyruk ``max_queue`` ile sınırlıdır; dolunca istemciye busy hatası döner.
+    """
+
+    def __init__(self, service: OCRService, max_batch: int = 32, max_wait_ms: float = 5.0, max_queue: int = 64):
+        self.service = service
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        # warm-up bitene (veya atlanana) kadar istemciler bekler
+        self.ready = False
+        self._queue: "queue.Queue[_Job]" = queue.Queue(maxsize=max_queue)
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "connections": 0,
+            "requests": 0,
+            "rejected": 0,
+            "batches": 0,
+            "images": 0,
+            "lines": 0,
+        }
+
+    def info(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        batches = stats["batches"]
+        stats["avg_images_per_batch"] = round(stats["images"] / batches, 2) if batches else None
+        stats["avg_lines_per_batch"] = round(stats["lines"] / batches, 2) if batches else None
+        stats["queue_depth"] = self._queue.qsize()
+        return {
+            "pid": os.getpid(),
+            "available": self.service.is_available(),
+            "cache_variant": self.service.cache_variant,
+            "ready": self.ready,
+            "warmed_up": self.service.warmed_up,
+            "warmup_seconds": self.service.warmup_seconds,
+            "stats": stats,
+            "inference_pool": self.service.pool.stats() if getattr(self.service, "pool", None) else None,
+        }
+
+    def serve_forever(self, address: Address) -> None:
+        authkey = sidecar_authkey(address)
+        if isinstance(address, str) and os.path.exists(address):
+            os.unlink(address)
+        listener = Listener(address, authkey=authkey)
+        # Her inference context'i için bir batch thread'i; batch'ler paralel koşar
+        pool = getattr(self.service, "pool", None)
+        for i in range(pool.size if pool else 1):
+            threading.Thread(target=self._batch_loop, name=f"ocr-batch-{i}", daemon=True).start()
+        print(f"OCR sidecar listening on {address} (pid {os.getpid()})")
+        try:
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:  # kimlik doğrulama hatası vb.
+                    print(f"OCR sidecar rejected connection: {e}")
+                    continue
+                with self._stats_lock:
+                    self._stats["connections"] += 1
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        finally:
+            listener.close()
+
+    def _handle(self, conn: Connection) -> None:
+        with conn:
+            while True:
+                try:
+                    op, payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if op == "lines":
+                        reply = ("ok", self.predict_lines_bytes(payload))
+                    elif op == "info":
+                        reply = ("ok", self.info())
+                    else:
+                        reply = ("error", f"ValueError: unknown op {op!r}")
+                except SidecarBusyError as e:
+                    reply = ("busy", str(e))
+                except Exception as e:
+                    reply = ("error", f"{type(e).__name__}: {e}")
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+
+    def predict_lines_bytes(self, image_data: BytesLike) -> List[Dict[str, Any]]:
+        if not self.service.is_available():
+            return []
+        image = load_ocr_image(image_data)
+        boxes = self.service.segment(image)
+        job = _Job([box.crop(image) for box in boxes])
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["rejected"] += 1
+            raise SidecarBusyError(f"OCR sidecar busy ({self._queue.qsize()} queued)")
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        with self._stats_lock:
+            self._stats["requests"] += 1
+        return [
+            {"text": text.strip(), "confidence": confidence, "box": box.to_dict()}
+            for box, (text, confidence) in zip(boxes, job.results)
+        ]
+
+    def _batch_loop(self) -> None:
+        while True:
+            jobs = [self._queue.get()]
+            n_lines = len(jobs[0].crops)
+            deadline = time.monotonic() + self.max_wait
+            while n_lines < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    job = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                jobs.append(job)
+                n_lines += len(job.crops)
+
+            try:
+                results = self.service.recognize_crops([crop for job in jobs for crop in job.crops])
+                offset = 0
+                for job in jobs:
+                    job.results = results[offset:offset + len(job.crops)]
+                    offset += len(job.crops)
+            except Exception as e:
+                for job in jobs:
+                    job.error = e
+            for job in jobs:
+                job.done.set()
+
+            with self._stats_lock:
+                self._stats["batches"] += 1
+                self._stats["images"] += len(jobs)
+                self._stats["lines"] += n_lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Host başına tek CRNN kopyası tutan OCR sidecar")
+    parser.add_argument("--address", default=os.getenv("OCR_SIDECAR_ADDRESS", "/tmp/handwrite-ocr.sock"),
+                        help="Unix socket yolu veya host:port")
+    parser.add_argument("--checkpoint", default="checkpoints/crnn_ctc_best.pdparams")
+    parser.add_argument("--max-batch", type=int, default=int(os.getenv("OCR_SIDECAR_MAX_BATCH", "32")),
+                        help="Bir forward pass'te en fazla satır sayısı")
+    parser.add_argument("--max-wait-ms", type=float, default=float(os.getenv("OCR_SIDECAR_MAX_WAIT_MS", "5")),
+                        help="Batch doldurmak için en fazla bekleme")
+    parser.add_argument("--max-queue", type=int, default=int(os.getenv("OCR_SIDECAR_MAX_QUEUE", "64")),
+                        help="Bekleyen görsel sınırı; aşılırsa busy döner")
+    parser.add_argument("--contexts", type=int, default=int(os.getenv("OCR_INFER_CONTEXTS", "1")),
+                        help="Model kopyası (ve batch döngüsü) sayısı; host başına bellek = kopya sayısı × model")
+    parser.add_argument("--no-warmup", action="store_true")
+    args = parser.parse_args()
+    address = parse_address(args.address)
+    try:
+        # Model yüklenmeden önce: açık anahtarsız dışa açık TCP adresinde başlama
+        sidecar_authkey(address)
+    except ValueError as e:
+        parser.error(str(e))
+
+    service = OCRService(checkpoint_path=args.checkpoint, num_contexts=args.contexts)
+    if not args.no_warmup:
+        service.warmup()
+    sidecar = OCRSidecar(service, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms, max_queue=args.max_queue)
+    sidecar.ready = True
+    sidecar.serve_forever(address)
+
+
+if __name__ == "__main__":
+    main()
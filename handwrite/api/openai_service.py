@@ -1,16 +1,44 @@
 """
 OpenAI Service - Reçete analizi için OpenAI API entegrasyonu
 """
-import json
 import base64
-from typing import Dict, Any, Optional
+import importlib.util
+import os
+import threading
+from typing import AsyncIterator, Dict, Any, Optional, Tuple
 try:
+    import httpx
     import openai
-    from openai import OpenAI
+    from openai import AsyncOpenAI, OpenAI
 except ImportError:
+    httpx = None
     openai = None
     OpenAI = None
-from pydantic import BaseModel
+    AsyncOpenAI = None
+from pydantic import BaseModel, ValidationError
+
+from api.image_io import ImagePayload
+from api.partial_json import IncrementalJSONParser, loads_tolerant
+from api.result_cache import get_result_cache
+from api.single_flight import AsyncSingleFlight, SingleFlight
+
+
+def _http_client(is_async: bool):
+    """
+    OpenAI istemcileri için paylaşılan keep-alive bağlantı havuzu
+    
+    `h2` kuruluysa HTTP/2 kullanılır; eş zamanlı istekler aynı bağlantı
+    üzerinde çoklanır ve her çağrıda TLS el sıkışması ödenmez.
+    """
+    if httpx is None:
+        return None
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("OPENAI_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("OPENAI_MAX_KEEPALIVE", "10")),
+    )
+    http2 = importlib.util.find_spec("h2") is not None
+    client_cls = httpx.AsyncClient if is_async else httpx.Client
+    return client_cls(http2=http2, limits=limits)
 
 
 class PrescriptionAnalysis(BaseModel):
@@ -27,40 +55,86 @@ class PrescriptionAnalysis(BaseModel):
     raw_text: str = ""
 
 
+def _nullable_string() -> Dict[str, Any]:
+    return {"type": ["string", "null"]}
+
+
+# PrescriptionAnalysis'in structured-output (strict) şeması. Alan sırası
+# modelin üretim sırasıdır: kısa alanlar önce gelir, stream'de erken dolar.
+PRESCRIPTION_JSON_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "patient_name": _nullable_string(),
+        "patient_id": _nullable_string(),
+        "doctor_name": _nullable_string(),
+        "date": _nullable_string(),
+        "medications": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "dosage": _nullable_string(),
+                    "usage": _nullable_string(),
+                },
+                "required": ["name", "dosage", "usage"],
+                "additionalProperties": False,
+            },
+        },
+        "dosage_instructions": _nullable_string(),
+        "special_notes": _nullable_string(),
+        "requested_info": _nullable_string(),
+        "confidence_score": {"type": "number"},
+        "raw_text": {"type": "string"},
+    },
+    "required": [
+        "patient_name", "patient_id", "doctor_name", "date", "medications",
+        "dosage_instructions", "special_notes", "requested_info", "confidence_score", "raw_text",
+    ],
+    "additionalProperties": False,
+}
+
+
+def _response_format() -> Optional[Dict[str, Any]]:
+    """
+    OPENAI_RESPONSE_FORMAT: json_schema (varsayılan, şemaya uyum garantili),
+    json_object (yalnızca geçerli JSON; eski modeller) veya none
+    """
+    mode = os.getenv("OPENAI_RESPONSE_FORMAT", "json_schema")
+    if mode == "json_schema":
+        return {
+            "type": "json_schema",
+            "json_schema": {"name": "prescription_analysis", "strict": True, "schema": PRESCRIPTION_JSON_SCHEMA},
+        }
+    if mode == "json_object":
+        return {"type": "json_object"}
+    return None
+
+
 class OpenAIService:
     def __init__(self, api_key: Optional[str] = None):
         """OpenAI servisini başlat"""
         if not openai or not OpenAI:
             raise ImportError("OpenAI library not available")
         
-        if api_key:
-            self.client = OpenAI(api_key=api_key)
-        else:
+        if not api_key:
             # Environment variable'dan al
-            import os
             api_key = os.getenv("OPENAI_API_KEY")
             if not api_key:
                 raise ValueError("OpenAI API key not provided. Set OPENAI_API_KEY environment variable.")
-            self.client = OpenAI(api_key=api_key)
+        self.client = OpenAI(api_key=api_key, http_client=_http_client(is_async=False))
+        # Event loop'u bloklamayan çağrılar için
+        self.async_client = AsyncOpenAI(api_key=api_key, http_client=_http_client(is_async=True))
+        # Aynı görsel + aynı parametreler için tekrar GPT-4o çağrısı yapma
+        # analiz hastaya özgü; yalnızca birebir aynı görsel cache'ten döner
+        self.cache = get_result_cache("openai", allow_phash=False)
+        # Cache'e henüz yazılmamış, süren aynı çağrıları birleştir (çift tıklama, retry)
+        self._flight = SingleFlight()
+        self._async_flight = AsyncSingleFlight()
+        self.response_format = _response_format()
     
-    def analyze_prescription(
-        self, 
-        image_base64: str, 
-        user_question: str = "",
-        model: str = "gpt-4o"
-    ) -> PrescriptionAnalysis:
-        """
-        Reçete görselini ve kullanıcı sorusunu analiz et
-        
-        Args:
-            image_base64: Base64 encoded reçete görseli
-            user_question: Kullanıcının sorusu (opsiyonel)
-            model: Kullanılacak OpenAI model
-            
-        Returns:
-            Yapılandırılmış reçete analizi
-        """
-        
+    def _prescription_messages(self, image_base64: str, user_question: str) -> list:
+        """Reçete analizi için chat mesajlarını hazırla"""
         # System prompt
         system_prompt = """Sen bir eczacı ve tıbbi doküman analiz uzmanısın. 
         Verilen reçete görselini analiz ederek yapılandırılmış bilgi çıkar.
@@ -93,51 +167,198 @@ class OpenAIService:
         Lütfen JSON formatında cevap ver. Sadece JSON döndür, başka açıklama ekleme.
         """
         
-        try:
-            # OpenAI API çağrısı
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
+        return [
+            {"role": "system", "content": system_prompt},
+            {
+                "role": "user", 
+                "content": [
+                    {"type": "text", "text": user_prompt},
                     {
-                        "role": "user", 
-                        "content": [
-                            {"type": "text", "text": user_prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
-                                }
-                            }
-                        ]
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:image/jpeg;base64,{image_base64}"
+                        }
                     }
-                ],
-                max_tokens=2000,
-                temperature=0.1
+                ]
+            }
+        ]
+    
+    def _completion_kwargs(self, model: str, image_base64: str, user_question: str) -> Dict[str, Any]:
+        """Reçete analizi chat completion parametreleri (structured output dahil)"""
+        kwargs = {
+            "model": model,
+            "messages": self._prescription_messages(image_base64, user_question),
+            "max_tokens": 2000,
+            "temperature": 0.1,
+        }
+        if self.response_format is not None:
+            kwargs["response_format"] = self.response_format
+        return kwargs
+    
+    @staticmethod
+    def _to_analysis(data: Dict[str, Any]) -> PrescriptionAnalysis:
+        """Şemaya uymayan alanları atarak PrescriptionAnalysis oluştur"""
+        data = {k: v for k, v in data.items() if k in PrescriptionAnalysis.model_fields}
+        for _ in range(len(data) + 1):
+            try:
+                return PrescriptionAnalysis(**data)
+            except ValidationError as e:
+                bad = {err["loc"][0] for err in e.errors() if err["loc"]}
+                if not bad & data.keys():
+                    break
+                for key in bad:
+                    data.pop(key, None)
+        return PrescriptionAnalysis()
+    
+    def _parse_analysis(self, content: str, image: ImagePayload, variant: str) -> PrescriptionAnalysis:
+        """
+        Model cevabını PrescriptionAnalysis'e çevir; eksiksiz sonuçları cache'le
+        
+        Kod bloğuna sarılmış ya da max_tokens'ta kesilmiş JSON'dan da alanlar
+        kurtarılır; yalnızca hiç JSON yoksa ham metin fallback'i döner.
+        """
+        content = content.strip()
+        analysis_data, complete = loads_tolerant(content)
+        if analysis_data is None:
+            # JSON bulunamazsa fallback (cache'lenmez)
+            return PrescriptionAnalysis(
+                raw_text=content,
+                confidence_score=0.5,
+                requested_info=content
             )
+        analysis = self._to_analysis(analysis_data)
+        if complete:
+            self._cache_set(image, variant, analysis.model_dump())
+        else:
+            print(f"OpenAI response truncated; recovered fields: {sorted(analysis_data)}")
+        return analysis
+    
+    def _cache_get(self, image: ImagePayload, variant: str) -> Optional[Any]:
+        if self.cache is None:
+            return None
+        return self.cache.get(image.sha256, variant)
+    
+    def _cache_set(self, image: ImagePayload, variant: str, value: Any) -> None:
+        if self.cache is not None:
+            self.cache.set(image.sha256, value, variant)
+    
+    @staticmethod
+    def _flight_key(image: ImagePayload, variant: str) -> str:
+        return f"{image.sha256}:{variant}"
+    
+    def coalescing_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Birleştirilen (upstream'e gitmeyen) eş zamanlı çağrı sayıları"""
+        return {"sync": self._flight.stats(), "async": self._async_flight.stats()}
+    
+    @staticmethod
+    def _error_analysis(e: Exception) -> PrescriptionAnalysis:
+        """Hata durumunda fallback response"""
+        return PrescriptionAnalysis(
+            raw_text=f"Analiz hatası: {str(e)}",
+            confidence_score=0.0,
+            requested_info=f"Reçete analizi sırasında hata oluştu: {str(e)}"
+        )
+    
+    def analyze_prescription(
+        self, 
+        image_base64: str, 
+        user_question: str = "",
+        model: str = "gpt-4o"
+    ) -> PrescriptionAnalysis:
+        """
+        Reçete görselini ve kullanıcı sorusunu analiz et
+        
+        Args:
+            image_base64: Base64 encoded reçete görseli
+            user_question: Kullanıcının sorusu (opsiyonel)
+            model: Kullanılacak OpenAI model
             
-            # Response'u parse et
-            content = response.choices[0].message.content.strip()
-            
-            # JSON'u parse et
+        Returns:
+            Yapılandırılmış reçete analizi
+        """
+        image = ImagePayload.from_base64(image_base64)
+        variant = f"analyze:{model}:{user_question}"
+        cached = self._cache_get(image, variant)
+        if cached is not None:
+            return PrescriptionAnalysis(**cached)
+        
+        def call() -> PrescriptionAnalysis:
             try:
-                analysis_data = json.loads(content)
-                return PrescriptionAnalysis(**analysis_data)
-            except json.JSONDecodeError:
-                # JSON parse edilemezse fallback
-                return PrescriptionAnalysis(
-                    raw_text=content,
-                    confidence_score=0.5,
-                    requested_info=content
+                # OpenAI API çağrısı
+                response = self.client.chat.completions.create(
+                    **self._completion_kwargs(model, image_base64, user_question)
                 )
-                
-        except Exception as e:
-            # Hata durumunda fallback response
-            return PrescriptionAnalysis(
-                raw_text=f"Analiz hatası: {str(e)}",
-                confidence_score=0.0,
-                requested_info=f"Reçete analizi sırasında hata oluştu: {str(e)}"
+                return self._parse_analysis(response.choices[0].message.content, image, variant)
+            except Exception as e:
+                return self._error_analysis(e)
+        
+        # Aynı görsel + soru için süren bir çağrı varsa onun sonucunu bekle
+        return self._flight.do(self._flight_key(image, variant), call)
+    
+    async def analyze_prescription_async(
+        self, 
+        image_base64: str, 
+        user_question: str = "",
+        model: str = "gpt-4o"
+    ) -> PrescriptionAnalysis:
+        """analyze_prescription'ın AsyncOpenAI ile çalışan, event loop'u bloklamayan sürümü"""
+        image = ImagePayload.from_base64(image_base64)
+        variant = f"analyze:{model}:{user_question}"
+        cached = self._cache_get(image, variant)
+        if cached is not None:
+            return PrescriptionAnalysis(**cached)
+        
+        async def call() -> PrescriptionAnalysis:
+            try:
+                response = await self.async_client.chat.completions.create(
+                    **self._completion_kwargs(model, image_base64, user_question)
+                )
+                return self._parse_analysis(response.choices[0].message.content, image, variant)
+            except Exception as e:
+                return self._error_analysis(e)
+        
+        return await self._async_flight.do(self._flight_key(image, variant), call)
+    
+    async def stream_prescription_analysis(
+        self,
+        image_base64: str,
+        user_question: str = "",
+        model: str = "gpt-4o"
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        analyze_prescription_async'in streaming sürümü
+        
+        Model çıktısı geldikçe ("token", metin), üst seviye bir alan
+        tamamlandıkça ("fields", {alan: değer}) ve en sonda ("analysis",
+        PrescriptionAnalysis) üretir. Sonuç cache'teyse yalnızca analysis döner.
+        Stream paylaşılamadığı için single-flight kullanılmaz.
+        """
+        image = ImagePayload.from_base64(image_base64)
+        variant = f"analyze:{model}:{user_question}"
+        cached = self._cache_get(image, variant)
+        if cached is not None:
+            yield "analysis", PrescriptionAnalysis(**cached)
+            return
+        
+        parser = IncrementalJSONParser()
+        try:
+            stream = await self.async_client.chat.completions.create(
+                **self._completion_kwargs(model, image_base64, user_question),
+                stream=True
             )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield "token", delta
+                    fields = parser.feed(delta)
+                    if fields:
+                        yield "fields", fields
+            analysis = self._parse_analysis(parser.buffer, image, variant)
+        except Exception as e:
+            analysis = self._error_analysis(e)
+        yield "analysis", analysis
     
     def extract_text_only(
         self, 
@@ -154,6 +375,11 @@ class OpenAIService:
         Returns:
             Çıkarılan metin
         """
+        image = ImagePayload.from_base64(image_base64)
+        variant = f"extract:{model}"
+        cached = self._cache_get(image, variant)
+        if cached is not None:
+            return cached
         
         prompt = """
         Bu görseldeki tüm metni oku ve düz metin olarak ver.
@@ -161,39 +387,47 @@ class OpenAIService:
         Metni olduğu gibi, boşlukları ve satır sonlarını koruyarak ver.
         """
         
-        try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
+        def call() -> str:
+            try:
+                response = self.client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "text", "text": prompt},
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": f"data:image/jpeg;base64,{image_base64}"
+                                    }
                                 }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000,
-                temperature=0.0
-            )
+                            ]
+                        }
+                    ],
+                    max_tokens=1000,
+                    temperature=0.0
+                )
             
-            return response.choices[0].message.content.strip()
+                text = response.choices[0].message.content.strip()
+                self._cache_set(image, variant, text)
+                return text
             
-        except Exception as e:
-            return f"Metin çıkarımı hatası: {str(e)}"
+            except Exception as e:
+                return f"Metin çıkarımı hatası: {str(e)}"
+        
+        return self._flight.do(self._flight_key(image, variant), call)
 
 
 # Global OpenAI service instance
 openai_service = None
+_openai_service_lock = threading.Lock()
 
 def get_openai_service() -> OpenAIService:
     """Singleton OpenAI service instance"""
     global openai_service
     if openai_service is None:
-        openai_service = OpenAIService()
+        with _openai_service_lock:
+            if openai_service is None:
+                openai_service = OpenAIService()
     return openai_service
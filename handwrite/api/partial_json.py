@@ -0,0 +1,164 @@
+"""
+Partial JSON - Yarım kalmış ya da metinle sarılmış model çıktısından JSON nesnesi çıkarır
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# Kırpma denemesi sayısı; son birkaç yapısal noktadan biri hemen her zaman yeterli
+_MAX_CUTS = 4
+
+
+def _scan(text: str) -> Tuple[Optional[int], List[Tuple[int, str]], str, bool, bool]:
+    """
+    İlk '{'dan itibaren tara.
+
+    Döndürür: (tamamlanmış nesnenin bitiş indeksi veya None, kesilebilir noktalar
+    [(indeks, o noktadaki kapanış dizisi)], sondaki kapanış dizisi, string içinde mi,
+    sonda yarım kaçış karakteri var mı)
+    """
+    stack: List[str] = []
+    cuts: List[Tuple[int, str]] = []
+    in_str = False
+    esc = False
+    for i, ch in enumerate(text):
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            cuts.append((i + 1, "".join(reversed(stack))))
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            if not stack:
+                return i, cuts, "", False, False
+        elif ch == ",":
+            cuts.append((i, "".join(reversed(stack))))
+    return None, cuts, "".join(reversed(stack)), in_str, esc
+
+
+def parse_partial_json(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Metindeki ilk JSON nesnesini döndür; kesilmişse tamamlanabilen kısmını.
+
+    Kod bloğu (```json) ya da önündeki/arkasındaki açıklama metni yok sayılır.
+    Yarım string değerleri kapatılır, yarım anahtar/sayı/literal içeren son
+    öğe atılır; metin bir rakamla bitiyorsa sayının devamı gelebileceğinden
+    (12 -> 125) o sayı da yarım sayılır. Hiç nesne yoksa None.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+    body = text[start:]
+    end, cuts, closers, in_str, esc = _scan(body)
+    if end is not None:
+        try:
+            value = json.loads(body[:end + 1])
+            return value if isinstance(value, dict) else None
+        except ValueError:
+            return None
+
+    candidates = []
+    if in_str:
+        candidates.append(body[:-1] + '"' + closers if esc else body + '"' + closers)
+    elif not body[-1].isdigit():
+        candidates.append(body.rstrip().rstrip(",") + closers)
+    candidates.extend(body[:pos].rstrip().rstrip(",") + tail for pos, tail in reversed(cuts[-_MAX_CUTS:]))
+    for candidate in candidates:
+        try:
+            value = json.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(value, dict):
+            return value
+    return None
+
+
+def loads_tolerant(text: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """(nesne, eksiksiz mi): önce json.loads, olmazsa parse_partial_json"""
+    try:
+        value = json.loads(text)
+        if isinstance(value, dict):
+            return value, True
+    except ValueError:
+        pass
+    start = text.find("{")
+    if start >= 0 and _scan(text[start:])[0] is not None:
+        return parse_partial_json(text), True
+    return parse_partial_json(text), False
+
+
+class IncrementalJSONParser:
+    """
+    Stream edilen JSON nesnesinin tamamlanan üst seviye alanlarını verir.
+
+    Her ``feed`` yalnızca yeni gelen karakterleri tarar; üst seviyede bir
+    alan bittiğinde (',' ya da kapanan '}') o ana kadarki kısım parse edilir
+    ve yeni tamamlanan alanlar döndürülür.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields: Dict[str, Any] = {}
+        self.complete = False
+        self._pos = 0
+        self._start: Optional[int] = None
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+
+    def feed(self, delta: str) -> Dict[str, Any]:
+        self.buffer += delta
+        boundary = None
+        text = self.buffer
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._start is None:
+                if ch == "{":
+                    self._start = i
+                    self._depth = 1
+                continue
+            if self.complete:
+                break
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                continue
+            if ch == '"':
+                self._in_str = True
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    boundary = i
+                    self.complete = True
+            elif ch == "," and self._depth == 1:
+                boundary = i
+        self._pos = len(text)
+
+        if boundary is None:
+            return {}
+        prefix = text[self._start:boundary] + "}"
+        try:
+            parsed = json.loads(prefix)
+        except ValueError:
+            return {}
+        new = {k: v for k, v in parsed.items() if k not in self.fields}
+        self.fields.update(new)
+        return new
+
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """Devam eden string alanlar dahil şu ana kadarki nesne"""
+        return parse_partial_json(self.buffer)
@@ -0,0 +1,198 @@
+"""
+Result Cache - Görsel hash'i ile anahtarlanan OCR/OpenAI sonuç önbelleği
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+# Algısal hash'te bu kadar bit farkına kadar aynı görsel sayılır
+PHASH_MAX_DISTANCE = 4
+
+# Perceptual hash doğrudan ya da yalnızca gerektiğinde hesaplayan bir fonksiyon olarak verilebilir
+PHashArg = Union[None, int, Callable[[], Optional[int]]]
+
+
+class ResultCache:
+    """
+    İki katmanlı (bellek LRU + disk) TTL'li sonuç önbelleği.
+
+    Anahtar, görselin birebir hash'i ile sonucu etkileyen parametrelerden
+    (``variant``: model, soru vb.) türetilir. Perceptual hash verilirse
+    birebir eşleşme olmadığında bellekteki yakın kopyalar da aranır.
+    Değerler JSON'a çevrilebilir olmalıdır.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        max_items: int = 256,
+        ttl_seconds: float = 24 * 3600,
+        disk_dir: Optional[str] = None,
+        use_phash: bool = False,
+    ):
+        self.namespace = namespace
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = Path(disk_dir) / namespace if disk_dir else None
+        self.use_phash = use_phash
+        # key -> (expires_at, variant, phash, value)
+        self._memory: "OrderedDict[str, Tuple[float, str, Optional[int], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "phash_hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "evictions": 0,
+            "expired": 0,
+        }
+
+    @staticmethod
+    def make_key(image_hash: str, variant: str = "") -> str:
+        return hashlib.sha256(f"{image_hash}\0{variant}".encode("utf-8")).hexdigest()
+
+    def get(self, image_hash: str, variant: str = "", phash: PHashArg = None) -> Optional[Any]:
+        key = self.make_key(image_hash, variant)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[3]
+                del self._memory[key]
+                self._stats["expired"] += 1
+
+        value = self._disk_get(key, now)
+        if value is not None:
+            expires_at, disk_phash, value = value
+            self._memory_set(key, expires_at, variant, disk_phash, value)
+            with self._lock:
+                self._stats["disk_hits"] += 1
+            return value
+
+        if self.use_phash and callable(phash):
+            phash = phash()
+        if self.use_phash and phash is not None:
+            with self._lock:
+                for other_key, (expires_at, other_variant, other_phash, other_value) in reversed(self._memory.items()):
+                    if (
+                        other_phash is not None
+                        and other_variant == variant
+                        and expires_at > now
+                        and bin(other_phash ^ phash).count("1") <= PHASH_MAX_DISTANCE
+                    ):
+                        self._memory.move_to_end(other_key)
+                        self._stats["phash_hits"] += 1
+                        return other_value
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, image_hash: str, value: Any, variant: str = "", phash: PHashArg = None) -> None:
+        key = self.make_key(image_hash, variant)
+        if callable(phash):
+            phash = phash() if self.use_phash else None
+        expires_at = time.time() + self.ttl_seconds
+        self._memory_set(key, expires_at, variant, phash, value)
+        self._disk_set(key, expires_at, phash, value)
+        with self._lock:
+            self._stats["sets"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_items"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"] + stats["phash_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 3) if lookups else None
+        return stats
+
+    def _memory_set(self, key: str, expires_at: float, variant: str, phash: Optional[int], value: Any) -> None:
+        with self._lock:
+            self._memory[key] = (expires_at, variant, phash, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, Optional[int], Any]]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if record.get("expires_at", 0) <= now:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            with self._lock:
+                self._stats["expired"] += 1
+            return None
+        return record["expires_at"], record.get("phash"), record["value"]
+
+    def _disk_set(self, key: str, expires_at: float, phash: Optional[int], value: Any) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"expires_at": expires_at, "phash": phash, "value": value}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except (OSError, TypeError) as e:
+            print(f"Result cache write failed ({self.namespace}): {e}")
+
+
+_caches: Dict[str, ResultCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_result_cache(namespace: str, allow_phash: bool = True) -> Optional[ResultCache]:
+    """
+    Namespace başına tekil cache; RESULT_CACHE_SIZE=0 ile kapatılır.
+
+    Ortam değişkenleri: RESULT_CACHE_SIZE, RESULT_CACHE_TTL (saniye),
+    RESULT_CACHE_DIR (boş ise disk katmanı yok), RESULT_CACHE_PHASH (1/0).
+    Yakın kopya eşleşmesi varsayılan olarak kapalıdır: aynı form şablonundaki
+    farklı reçeteler birkaç bit farkla eşleşebilir. ``allow_phash=False``
+    verilen namespace'ler (hasta verisi içeren analizler) onu hiç kullanmaz.
+    """
+    max_items = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+    if max_items <= 0:
+        return None
+    with _caches_lock:
+        cache = _caches.get(namespace)
+        if cache is None:
+            cache = ResultCache(
+                namespace,
+                max_items=max_items,
+                ttl_seconds=float(os.getenv("RESULT_CACHE_TTL", str(24 * 3600))),
+                disk_dir=os.getenv("RESULT_CACHE_DIR", "cache/results") or None,
+                use_phash=allow_phash and os.getenv("RESULT_CACHE_PHASH", "0") == "1",
+            )
+            _caches[namespace] = cache
+        return cache
+
+
+def all_cache_stats() -> Dict[str, Dict[str, Any]]:
+    with _caches_lock:
+        caches = list(_caches.values())
+    return {cache.namespace: cache.stats() for cache in caches}
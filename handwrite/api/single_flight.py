@@ -0,0 +1,97 @@
+"""
+Single Flight - Aynı anahtarlı eş zamanlı çağrıları tek upstream çağrısında birleştirir
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class AsyncSingleFlight:
+    """
+    Event loop içinde, aynı anahtar için süren bir çağrı varsa yenisini
+    başlatmak yerine onun sonucunu bekler.
+
+    Çağrı ``asyncio.shield`` ile korunur: bekleyenlerden biri (ör. deadline
+    aşımı) iptal edilse de upstream çağrı diğerleri için sürer ve sonucu
+    cache'e yazılır. Anahtar çağrı bitince silinir.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Tuple[int, str], "asyncio.Future[Any]"] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        slot = (id(loop), key)
+        task = self._inflight.get(slot)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[slot] = task
+            task.add_done_callback(lambda t: self._forget(slot, t))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, slot: Tuple[int, str], task: "asyncio.Future[Any]") -> None:
+        if self._inflight.get(slot) is task:
+            del self._inflight[slot]
+        if not task.cancelled():
+            # Bekleyen kalmadıysa "exception was never retrieved" uyarısını sustur
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """AsyncSingleFlight'ın thread'ler arası (senkron WSGI/executor) karşılığı"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, _Call] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
@@ -0,0 +1,164 @@
+"""Full training-state checkpoints, written off the training thread.
+
+``snapshot`` copies model/optimizer tensors to host NumPy arrays, which is the
+only part the training loop waits for. Serializing and writing happen in a
+``CheckpointWriter`` thread. Each file goes to a temporary name in the same
+directory, is fsynced and then renamed over the target, so a crash mid-write
+leaves the previous checkpoint intact.
+"""
+from __future__ import annotations
+
+import os
+import queue
+import random
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import paddle
+
+STATE_FILE = "train_state.pdstate"
+
+
+def to_host(obj: Any) -> Any:
+    """Copy every tensor in a (nested) state dict to a NumPy array."""
+    if isinstance(obj, paddle.Tensor):
+        return obj.numpy()  # a copy, so later optimizer steps do not touch it
+    if isinstance(obj, dict):
+        return {k: to_host(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_host(v) for v in obj)
+    return obj
+
+
+def set_rng_state(state: Dict[str, Any]) -> None:
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    paddle.seed(state["paddle_seed"])
+
+
+def snapshot(
+    model: paddle.nn.Layer,
+    optimizer: paddle.optimizer.Optimizer,
+    scaler: Optional[paddle.amp.GradScaler] = None,
+    paddle_seed: int = 0,
+    **extra: Any,
+) -> Dict[str, Any]:
+    """Everything needed to continue training bit-for-bit: weights, optimizer moments and
+    LR schedule, loss-scaler state, RNG states and the caller's ``extra`` (step, history, ...).
+
+    Paddle's generator state cannot be serialized (a pickled ``GeneratorState``
+    comes back without its engine state), so Paddle's generators are reseeded
+    with ``paddle_seed`` here and again by ``restore``; the original and the
+    resumed run then draw the same numbers from this point on. Use a different
+    seed per checkpoint, e.g. ``base_seed + step``.
+    """
+    state = {
+        "model": to_host(model.state_dict()),
+        "optimizer": to_host(optimizer.state_dict()),
+        "param_names": [p.name for p in model.parameters()],
+        "rng": {"python": random.getstate(), "numpy": np.random.get_state(), "paddle_seed": paddle_seed},
+        **extra,
+    }
+    if scaler is not None:
+        state["scaler"] = to_host(scaler.state_dict())
+    paddle.seed(paddle_seed)
+    return state
+
+
+def _rename_optimizer_state(opt_state: Dict[str, Any], old: List[str], new: List[str]) -> Dict[str, Any]:
+    """Optimizer accumulators are keyed ``<parameter name>_<accumulator>``, and parameter
+    names are generated per process (linear_0.w_0, ...); map them onto ``new`` by position."""
+    mapping = dict(zip(old, new))
+    prefixes = sorted(mapping, key=len, reverse=True)
+    renamed = {}
+    for key, value in opt_state.items():
+        name = next((n for n in prefixes if key.startswith(n + "_")), None)
+        renamed[mapping[name] + key[len(name):] if name else key] = value
+    return renamed
+
+
+def restore(
+    state: Dict[str, Any],
+    model: paddle.nn.Layer,
+    optimizer: paddle.optimizer.Optimizer,
+    scaler: Optional[paddle.amp.GradScaler] = None,
+) -> None:
+    model.set_state_dict(state["model"])
+    names = [p.name for p in model.parameters()]
+    if len(names) != len(state["param_names"]):
+        raise ValueError(f"checkpoint has {len(state['param_names'])} parameters, model has {len(names)}")
+    optimizer.set_state_dict(_rename_optimizer_state(state["optimizer"], state["param_names"], names))
+    if scaler is not None and "scaler" in state:
+        scaler.load_state_dict(state["scaler"])
+    set_rng_state(state["rng"])
+
+
+def save_atomic(obj: Any, path: Path) -> None:
+    tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+    try:
+        paddle.save(obj, str(tmp))
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    # the rename itself is only durable once the directory entry is on disk
+    dir_fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def load_state(path: Path) -> Dict[str, Any]:
+    return paddle.load(str(path), return_numpy=True)
+
+
+class CheckpointWriter:
+    """One background thread writing ``(object, path)`` jobs in order.
+
+    ``save`` only blocks when ``max_pending`` writes are already queued. A failed
+    write is re-raised from the next ``save``/``close`` rather than lost in the thread.
+    """
+
+    def __init__(self, max_pending: int = 2) -> None:
+        self._jobs: "queue.Queue[Optional[Tuple[Any, Path]]]" = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> "CheckpointWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            try:
+                save_atomic(*job)
+            except BaseException as e:  # surfaced on the training thread
+                self._error = e
+
+    def _raise(self) -> None:
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("checkpoint write failed") from error
+
+    def save(self, obj: Any, path: Path) -> None:
+        """Queue ``obj`` (host data only, e.g. from ``snapshot``) to be written to ``path``."""
+        self._raise()
+        self._jobs.put((obj, Path(path)))
+
+    def close(self) -> None:
+        """Wait for queued writes to finish."""
+        if self._thread.is_alive():
+            self._jobs.put(None)
+            self._thread.join()
+        self._raise()
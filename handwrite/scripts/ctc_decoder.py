@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import math
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:  # fuzzy snap is optional
+    fuzz = None
+    process = None
+
+NEG_INF = -float("inf")
+WORD_SEP = " "
+# tokens made only of these chars (doses, dates, counts) bypass the lexicon
+FREE_CHARS = frozenset("0123456789.")
+
+
+def log_softmax(logits: np.ndarray) -> np.ndarray:
+    x = logits.astype(np.float32, copy=False)
+    x = x - x.max(axis=-1, keepdims=True)
+    return x - np.log(np.exp(x).sum(axis=-1, keepdims=True))
+
+
+def _logsumexp(a: float, b: float) -> float:
+    if a == NEG_INF:
+        return b
+    if b == NEG_INF:
+        return a
+    if a > b:
+        return a + math.log1p(math.exp(b - a))
+    return b + math.log1p(math.exp(a - b))
+
+
+def _match_case(word: str, like: str) -> str:
+    """``word`` (lowercase lexicon entry) cased like the decoded token ``like``."""
+    if like.isupper() and len(like) > 1:
+        return word.upper()
+    if like[:1].isupper():
+        return word[:1].upper() + word[1:]
+    return word
+
+
+class LexiconTrie:
+    """Character trie over lowercase lexicon words (e.g. drug names); lookups ignore case."""
+
+    _FREE = -1  # node id for free-form (numeric) tokens
+
+    def __init__(self, words: Iterable[str] = ()) -> None:
+        self._children: List[Dict[str, int]] = [{}]
+        self._terminal: List[bool] = [False]
+        self.words: List[str] = []
+        self._word_set: set = set()
+        for w in words:
+            self.insert(w)
+
+    def insert(self, word: str) -> None:
+        word = word.strip().lower()
+        if not word or word in self._word_set:
+            return
+        node = 0
+        for ch in word:
+            nxt = self._children[node].get(ch)
+            if nxt is None:
+                nxt = len(self._children)
+                self._children[node][ch] = nxt
+                self._children.append({})
+                self._terminal.append(False)
+            node = nxt
+        self._terminal[node] = True
+        self.words.append(word)
+        self._word_set.add(word)
+
+    def __contains__(self, word: str) -> bool:
+        return word.lower() in self._word_set
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def step(self, node: int, ch: str) -> Optional[int]:
+        """Next word state after emitting ``ch``; None if the path is not allowed."""
+        if ch == WORD_SEP:
+            return 0 if node == 0 or node == self._FREE or self._terminal[node] else None
+        if node == self._FREE:
+            return self._FREE if ch in FREE_CHARS else None
+        nxt = self._children[node].get(ch.lower())
+        if nxt is not None:
+            return nxt
+        if node == 0 and ch in FREE_CHARS:
+            return self._FREE
+        return None
+
+    def is_complete(self, node: int) -> bool:
+        return node == 0 or node == self._FREE or self._terminal[node]
+
+    @classmethod
+    def from_file(cls, path: Path, charset: Optional[str] = None) -> "LexiconTrie":
+        """One word per line (``#`` starts a comment); entries with chars outside ``charset`` are skipped."""
+        # a word is usable if the model can emit each of its letters in some case
+        allowed = set(charset.lower()) if charset else None
+        words = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                w = line.split("#", 1)[0].strip().lower()
+                if not w:
+                    continue
+                if allowed is not None and not set(w) <= allowed:
+                    continue
+                words.append(w)
+        return cls(words)
+
+
+def greedy_decode(log_probs: np.ndarray, idx_to_char: Dict[int, str], blank: int = 0) -> Tuple[str, float]:
+    best = log_probs.argmax(axis=-1)
+    score = float(log_probs[np.arange(len(best)), best].sum())
+    out = []
+    prev = -1
+    for idx in best.tolist():
+        if idx != prev and idx != blank:
+            out.append(idx_to_char.get(idx, ""))
+        prev = idx
+    return "".join(out), score
+
+
+def prefix_beam_search(
+    log_probs: np.ndarray,
+    idx_to_char: Dict[int, str],
+    beam_width: int = 10,
+    blank: int = 0,
+    lexicon: Optional[LexiconTrie] = None,
+    prune_logp: float = math.log(1e-4),
+) -> Tuple[str, float]:
+    """CTC prefix beam search over ``(T, C)`` log-probabilities.
+
+    When ``lexicon`` is given, every word of the output must be a lexicon
+    entry (or a purely numeric token). Returns ``(text, log_prob)``; the
+    text is empty with ``-inf`` score if no constrained path survives.
+    """
+    T, C = log_probs.shape
+    # beams: prefix -> [p_blank, p_non_blank, word_state]
+    beams: Dict[Tuple[int, ...], list] = {(): [0.0, NEG_INF, 0]}
+    k = min(C, max(beam_width, 1) + 1)
+
+    for t in range(T):
+        row = log_probs[t]
+        cand = np.argpartition(-row, k - 1)[:k] if k < C else np.arange(C)
+        cand = [int(c) for c in cand if row[c] >= prune_logp or c == blank]
+        next_beams: Dict[Tuple[int, ...], list] = {}
+
+        def entry(prefix: Tuple[int, ...], state: int) -> list:
+            e = next_beams.get(prefix)
+            if e is None:
+                e = [NEG_INF, NEG_INF, state]
+                next_beams[prefix] = e
+            return e
+
+        for prefix, (pb, pnb, state) in beams.items():
+            p_total = _logsumexp(pb, pnb)
+            last = prefix[-1] if prefix else None
+            for c in cand:
+                lp = float(row[c])
+                if c == blank:
+                    e = entry(prefix, state)
+                    e[0] = _logsumexp(e[0], p_total + lp)
+                    continue
+                if c == last:
+                    # repeated char without blank collapses into the same prefix
+                    e = entry(prefix, state)
+                    e[1] = _logsumexp(e[1], pnb + lp)
+                    if pb == NEG_INF:
+                        continue
+                    src = pb
+                else:
+                    src = p_total
+                new_state = state
+                if lexicon is not None:
+                    nxt = lexicon.step(state, idx_to_char.get(c, ""))
+                    if nxt is None:
+                        continue
+                    new_state = nxt
+                e = entry(prefix + (c,), new_state)
+                e[1] = _logsumexp(e[1], src + lp)
+
+        ranked = sorted(next_beams.items(), key=lambda kv: _logsumexp(kv[1][0], kv[1][1]), reverse=True)
+        beams = dict(ranked[:beam_width])
+
+    best_text, best_score = "", NEG_INF
+    for prefix, (pb, pnb, state) in beams.items():
+        score = _logsumexp(pb, pnb)
+        if lexicon is not None and not lexicon.is_complete(state):
+            continue
+        if score > best_score:
+            best_score = score
+            best_text = "".join(idx_to_char.get(i, "") for i in prefix)
+    return best_text, best_score
+
+
+def snap_to_lexicon(text: str, lexicon: LexiconTrie, score_cutoff: float = 85.0) -> Tuple[str, int]:
+    """Replace each alphabetic token by its closest lexicon entry above ``score_cutoff``.
+
+    Matching ignores case; a replaced token keeps the casing of the decoded one
+    ("Paroll" -> "Parol"). Returns the snapped text and how many tokens were
+    resolved from the lexicon.
+    """
+    if process is None or not lexicon.words:
+        return text, 0
+    tokens = text.split(WORD_SEP)
+    resolved = 0
+    for i, tok in enumerate(tokens):
+        if not tok or set(tok) <= FREE_CHARS:
+            continue
+        if tok in lexicon:
+            resolved += 1
+            continue
+        match = process.extractOne(tok.lower(), lexicon.words, scorer=fuzz.ratio, score_cutoff=score_cutoff)
+        if match is not None:
+            tokens[i] = _match_case(match[0], tok)
+            resolved += 1
+    return WORD_SEP.join(tokens), resolved
+
+
+def lexicon_coverage(text: str, lexicon: Optional[LexiconTrie]) -> float:
+    """Fraction of alphabetic tokens in ``text`` that are lexicon entries."""
+    if lexicon is None:
+        return 0.0
+    words = [t for t in text.split(WORD_SEP) if t and not set(t) <= FREE_CHARS]
+    if not words:
+        return 0.0
+    return sum(1 for w in words if w in lexicon) / len(words)
+
+
+class CTCDecoder:
+    """Greedy / prefix beam search CTC decoder with an optional lexicon."""
+
+    def __init__(
+        self,
+        idx_to_char: Dict[int, str],
+        beam_width: int = 10,
+        blank: int = 0,
+        lexicon: Optional[LexiconTrie] = None,
+        lexicon_margin: float = 5.0,
+        fuzzy_cutoff: float = 85.0,
+    ) -> None:
+        self.idx_to_char = idx_to_char
+        self.beam_width = beam_width
+        self.blank = blank
+        self.lexicon = lexicon
+        # constrained result wins if it is at most this many nats less likely
+        self.lexicon_margin = lexicon_margin
+        self.fuzzy_cutoff = fuzzy_cutoff
+
+    def decode(self, logits: np.ndarray) -> Tuple[str, float]:
+        """Decode ``(T, C)`` logits. Returns ``(text, confidence)``; confidence is the per-frame geometric mean probability."""
+        log_probs = log_softmax(logits)
+        T = max(1, log_probs.shape[0])
+        if self.beam_width <= 1:
+            text, score = greedy_decode(log_probs, self.idx_to_char, self.blank)
+        else:
+            text, score = prefix_beam_search(log_probs, self.idx_to_char, self.beam_width, self.blank)
+
+        if self.lexicon is not None and len(self.lexicon):
+            if self.beam_width > 1:
+                lex_text, lex_score = prefix_beam_search(
+                    log_probs, self.idx_to_char, self.beam_width, self.blank, lexicon=self.lexicon
+                )
+                if lex_text and lex_score >= score - self.lexicon_margin:
+                    text, score = lex_text, lex_score
+            text, _ = snap_to_lexicon(text.strip(), self.lexicon, self.fuzzy_cutoff)
+
+        confidence = math.exp(score / T) if score != NEG_INF else 0.0
+        return text, confidence
+
+    def decode_batch(self, logits: np.ndarray) -> List[Tuple[str, float]]:
+        """Decode ``(T, N, C)`` logits, as produced by ``CRNNCTC``."""
+        return [self.decode(logits[:, i, :]) for i in range(logits.shape[1])]
+
+
+def load_lexicon(path: Path, charset: Optional[str] = None) -> Optional[LexiconTrie]:
+    if not path.exists():
+        return None
+    trie = LexiconTrie.from_file(path, charset)
+    return trie if len(trie) else None
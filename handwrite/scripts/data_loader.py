@@ -0,0 +1,344 @@
+"""Multi-process batch loader for CRNN training.
+
+Worker processes decode, augment, resize and pad batches ahead of the training
+step and write them, already as float32 NCHW model input, into shared-memory
+slots. The training loop only wraps the slot in a tensor.
+
+Benchmark (from handwrite/):
+    python -m scripts.data_loader --workers 0 1 2 4 --batches 40
+    python -m scripts.data_loader --synthetic-ratio 0.5
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from multiprocessing import get_all_start_methods, get_context
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from scripts.batch_augment import SYNTHETIC_AUGMENT, augment_batch, set_threads
+from scripts.data_pipeline import TARGET_H, WIDTH_BUCKETS, JsonlDataset, load_batch, to_model_input
+
+
+@dataclass(frozen=True)
+class BatchSpec:
+    """Which samples go into a batch and the seed for their augmentation.
+
+    ``synthetic`` extra samples are rendered on the fly from ``seed``.
+    """
+
+    indices: Tuple[int, ...]
+    seed: int
+    augment: bool = True
+    synthetic: int = 0
+
+
+class BucketBatchSampler:
+    """Epoch-based batch plan over width buckets.
+
+    Each epoch uses every sample once: indices are reshuffled within their
+    width bucket, cut into batches, and the batches of all buckets are
+    shuffled together, so buckets come up in proportion to their size and no
+    batch mixes widths. The plan is a pure function of (seed, epoch), so
+    ``specs(start_step)`` can resume from any step without replaying earlier ones.
+    """
+
+    def __init__(
+        self,
+        dataset: JsonlDataset,
+        batch_size: int,
+        shuffle: bool = True,
+        drop_last: bool = False,
+        seed: int = 123,
+        buckets: Sequence[int] = WIDTH_BUCKETS,
+    ) -> None:
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.bucket_indices = dataset.bucket_index(buckets)
+        self._plan: Tuple[int, List[Tuple[int, ...]]] = (-1, [])
+        if len(self) == 0:
+            raise ValueError(f"{dataset.jsonl_path}: no batches of {batch_size} (empty dataset, or drop_last with small buckets)")
+
+    def __len__(self) -> int:
+        """Batches per epoch."""
+        sizes = [len(idx) for idx in self.bucket_indices.values()]
+        if self.drop_last:
+            return sum(n // self.batch_size for n in sizes)
+        return sum(-(-n // self.batch_size) for n in sizes)
+
+    def epoch_batches(self, epoch: int) -> List[Tuple[int, ...]]:
+        if self._plan[0] == epoch:
+            return self._plan[1]
+        rng = random.Random(f"{self.seed}:{epoch}")
+        batches: List[Tuple[int, ...]] = []
+        for bucket in sorted(self.bucket_indices):
+            idx = list(self.bucket_indices[bucket])
+            if self.shuffle:
+                rng.shuffle(idx)
+            for start in range(0, len(idx), self.batch_size):
+                chunk = tuple(idx[start:start + self.batch_size])
+                if self.drop_last and len(chunk) < self.batch_size:
+                    continue
+                batches.append(chunk)
+        if self.shuffle:
+            rng.shuffle(batches)
+        self._plan = (epoch, batches)
+        return batches
+
+    def position(self, step: int) -> Tuple[int, int]:
+        """(epoch, batch cursor within the epoch) of a global step."""
+        return divmod(step, len(self))
+
+    def specs(
+        self, start_step: int = 0, steps: Optional[int] = None, augment: bool = True
+    ) -> Iterator[BatchSpec]:
+        """Batch specs from global step ``start_step`` on; endless unless ``steps`` is given."""
+        step = start_step
+        end = None if steps is None else start_step + steps
+        epoch, cursor = self.position(start_step)
+        while True:
+            for indices in self.epoch_batches(epoch)[cursor:]:
+                if end is not None and step >= end:
+                    return
+                yield BatchSpec(indices, seed=self.seed + step, augment=augment)
+                step += 1
+            epoch += 1
+            cursor = 0
+
+
+def mix_synthetic(specs: Iterable[BatchSpec], per_batch: int) -> Iterator[BatchSpec]:
+    """Add ``per_batch`` on-the-fly synthetic samples to every spec."""
+    for spec in specs:
+        yield replace(spec, synthetic=per_batch)
+
+
+def synthetic_specs(
+    batch_size: int, start_step: int = 0, steps: Optional[int] = None, seed: int = 123
+) -> Iterator[BatchSpec]:
+    """Purely synthetic batches; endless unless ``steps`` is given."""
+    step = start_step
+    while steps is None or step < start_step + steps:
+        yield BatchSpec((), seed=seed + step, synthetic=batch_size)
+        step += 1
+
+
+def synthetic_per_batch(batch_size: int, ratio: float) -> int:
+    """Synthetic samples per batch for a synthetic:real mix ``ratio`` in [0, 1]."""
+    if not 0.0 <= ratio <= 1.0:
+        raise ValueError(f"synthetic ratio must be in [0, 1], got {ratio}")
+    return int(round(batch_size * ratio))
+
+
+def render_synthetic(count: int, seed: int) -> List[Tuple[np.ndarray, str]]:
+    """``count`` (BGR image, label) samples from generate_synthetic, seeded by ``seed``.
+
+    Texts are rendered one by one; all renders share one size, so they are
+    augmented as a single batch with generate_synthetic.augment's settings.
+    """
+    if not count:
+        return []
+    from scripts.generate_synthetic import random_text, render_text_image, shard_rngs, to_cv
+
+    rng, np_rng = shard_rngs(seed, 0)
+    texts = [random_text(rng) for _ in range(count)]
+    clean = np.stack([to_cv(render_text_image(text, rng=rng)) for text in texts])
+    return list(zip(augment_batch(clean, np_rng, SYNTHETIC_AUGMENT), texts))
+
+
+def load_spec(dataset: JsonlDataset, spec: BatchSpec, buckets: Sequence[int]) -> Tuple[np.ndarray, List[str]]:
+    extra = render_synthetic(spec.synthetic, spec.seed)
+    return load_batch(dataset, spec.indices, spec.augment, spec.seed, buckets, extra=extra)
+
+
+def eval_specs(dataset: JsonlDataset, batch_size: int, buckets: Sequence[int] = WIDTH_BUCKETS) -> List[BatchSpec]:
+    """Every sample exactly once, unaugmented, in width-bucketed batches."""
+    sampler = BucketBatchSampler(dataset, batch_size, shuffle=False, buckets=buckets)
+    return list(sampler.specs(steps=len(sampler), augment=False))
+
+
+# per-process state, set by _init_worker
+_WORKER: Dict[str, object] = {}
+
+
+def _init_worker(dataset: JsonlDataset, buckets: Tuple[int, ...], slot_names: List[str], threads: int) -> None:
+    # one worker = one core; keep OpenCV and the augment pool from spawning threads in each
+    import cv2  # type: ignore
+
+    cv2.setNumThreads(threads)
+    set_threads(threads)
+    _WORKER["dataset"] = dataset
+    _WORKER["buckets"] = buckets
+    _WORKER["slots"] = [SharedMemory(name=name) for name in slot_names]
+
+
+def _slot_array(shm: SharedMemory, shape: Tuple[int, ...]) -> np.ndarray:
+    return np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+
+
+def _load_into_slot(spec: BatchSpec, slot: int) -> Tuple[Tuple[int, ...], List[str]]:
+    batch, labels = load_spec(_WORKER["dataset"], spec, _WORKER["buckets"])
+    n, h, w, c = batch.shape
+    shape = (n, c, h, w)
+    to_model_input(batch, out=_slot_array(_WORKER["slots"][slot], shape))
+    return shape, labels
+
+
+class BatchLoader:
+    """Iterate ``specs`` as (float32 NCHW batch, labels), loaded by ``num_workers`` processes.
+
+    At most ``prefetch`` batches are in flight. Each batch is seeded from its
+    spec, so the output does not depend on the number of workers or on which
+    worker loaded it. With ``num_workers=0`` batches are loaded inline.
+
+    Yielded arrays are views of a shared-memory slot that is reused once the
+    next batch is requested; copy (``paddle.to_tensor`` does) before advancing.
+    """
+
+    def __init__(
+        self,
+        dataset: JsonlDataset,
+        specs: Iterable[BatchSpec],
+        batch_size: int,
+        num_workers: int = 2,
+        prefetch: int = 4,
+        buckets: Sequence[int] = WIDTH_BUCKETS,
+        target_h: int = TARGET_H,
+    ) -> None:
+        self.dataset = dataset
+        self.specs = specs
+        self.batch_size = batch_size
+        self.num_workers = max(0, num_workers)
+        self.prefetch = max(1, prefetch)
+        self.buckets = tuple(buckets)
+        self.slot_bytes = batch_size * 3 * target_h * self.buckets[-1] * np.dtype(np.float32).itemsize
+        self.batches = 0
+        self.wait_seconds = 0.0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: List[SharedMemory] = []
+
+    def __enter__(self) -> "BatchLoader":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _start(self) -> None:
+        # one slot per in-flight batch plus the one the training step is reading
+        self._slots = [SharedMemory(create=True, size=self.slot_bytes) for _ in range(self.prefetch + 1)]
+        # fork like paddle.io.DataLoader: workers never touch paddle, and spawn would re-import it
+        method = "fork" if "fork" in get_all_start_methods() else None
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.num_workers,
+            mp_context=get_context(method),
+            initializer=_init_worker,
+            initargs=(self.dataset, self.buckets, [s.name for s in self._slots], 1),
+        )
+
+    def __iter__(self) -> Iterator[Tuple[np.ndarray, List[str]]]:
+        if self.num_workers == 0:
+            for spec in self.specs:
+                start = time.perf_counter()
+                batch, labels = load_spec(self.dataset, spec, self.buckets)
+                x = to_model_input(batch)
+                self.wait_seconds += time.perf_counter() - start
+                self.batches += 1
+                yield x, labels
+            return
+
+        if self._pool is None:
+            self._start()
+        specs = iter(self.specs)
+        free = list(range(len(self._slots)))
+        pending: Deque[Tuple[Future, int]] = deque()
+        held: Optional[int] = None
+
+        def fill() -> None:
+            while len(pending) < self.prefetch and free:
+                spec = next(specs, None)
+                if spec is None:
+                    return
+                if len(spec.indices) + spec.synthetic > self.batch_size:
+                    raise ValueError(
+                        f"batch of {len(spec.indices) + spec.synthetic} exceeds loader batch_size {self.batch_size}"
+                    )
+                slot = free.pop()
+                pending.append((self._pool.submit(_load_into_slot, spec, slot), slot))
+
+        fill()
+        while pending:
+            future, slot = pending.popleft()
+            start = time.perf_counter()
+            shape, labels = future.result()
+            self.wait_seconds += time.perf_counter() - start
+            # the previous batch has been consumed by now
+            if held is not None:
+                free.append(held)
+            held = slot
+            fill()
+            self.batches += 1
+            yield _slot_array(self._slots[slot], shape), labels
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "avg_wait_ms": round(1000 * self.wait_seconds / self.batches, 2) if self.batches else 0.0,
+        }
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+        self._slots = []
+
+
+def _bench(args: argparse.Namespace) -> None:
+    dataset = JsonlDataset(Path(args.jsonl), shuffle=True)
+    n_synth = synthetic_per_batch(args.batch_size, args.synthetic_ratio)
+    if n_synth == args.batch_size:
+        specs = list(synthetic_specs(args.batch_size, steps=args.batches))
+    else:
+        real = BucketBatchSampler(dataset, args.batch_size - n_synth).specs(steps=args.batches)
+        specs = list(mix_synthetic(real, n_synth))
+    print(
+        f"{len(dataset)} samples, {args.batches} batches of {args.batch_size}, "
+        f"simulated step {args.step_ms} ms, {os.cpu_count()} cpus"
+    )
+    for workers in args.workers:
+        with BatchLoader(dataset, specs, args.batch_size, num_workers=workers, prefetch=args.prefetch) as loader:
+            start = time.perf_counter()
+            for _x, _labels in loader:
+                if args.step_ms:
+                    time.sleep(args.step_ms / 1000.0)
+            elapsed = time.perf_counter() - start
+        stats = loader.stats()
+        print(f"workers={workers}: {args.batches / elapsed:.1f} steps/s, waited on data {stats['avg_wait_ms']} ms/step")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the CRNN batch loader")
+    parser.add_argument("--jsonl", default="data/labels/train.jsonl")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--batches", type=int, default=40)
+    parser.add_argument("--prefetch", type=int, default=4)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--synthetic-ratio", type=float, default=0.0, help="share of each batch rendered on the fly")
+    parser.add_argument("--step-ms", type=float, default=0.0, help="sleep per batch to stand in for the model step")
+    _bench(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
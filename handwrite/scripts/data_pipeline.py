@@ -1,16 +1,46 @@
 from __future__ import annotations
 
 import json
+import os
 import random
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterator, List, Tuple
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 
 import cv2  # type: ignore
 import numpy as np
+from PIL import Image
+
+from scripts.batch_augment import (
+    TRAIN_AUGMENT,
+    AugmentConfig,
+    draw_params,
+    geometric,
+    photometric,
+    thread_map,
+    tone,
+)
 
 RNG_SEED = 1234
 
+TARGET_H = 48
+# padded input widths; CRNNCTC downsamples width by 8, so T = width // 8
+WIDTH_BUCKETS: Tuple[int, ...] = (128, 256, 512, 1024)
+# training keeps T >= 2 * len(label) so CTC always has room for blanks between repeats
+MIN_PX_PER_CHAR = 16
+
+
+def bucket_for_width(w: int, buckets: Sequence[int] = WIDTH_BUCKETS) -> int:
+    """Smallest bucket that fits ``w``; the largest bucket if none does."""
+    for b in buckets:
+        if w <= b:
+            return b
+    return buckets[-1]
+
+
+def resized_width(h: int, w: int, target_h: int = TARGET_H, max_w: int = WIDTH_BUCKETS[-1]) -> int:
+    return max(1, min(int(w * target_h / float(h)), max_w))
+
 
 def _set_seed(seed: int) -> None:
     random.seed(seed)
@@ -29,6 +59,8 @@ class JsonlDataset:
         self.shuffle = shuffle
         self.seed = seed
         self.samples: List[Sample] = []
+        self._buckets: Optional[Dict[int, List[int]]] = None
+        self._bucket_key: Optional[tuple] = None
         self._load()
 
     def _load(self) -> None:
@@ -48,6 +80,97 @@ class JsonlDataset:
     def __iter__(self) -> Iterator[Sample]:
         return iter(self.samples)
 
+    def __getitem__(self, idx: int) -> Sample:
+        return self.samples[idx]
+
+    def bucket_index(self, buckets: Sequence[int] = WIDTH_BUCKETS, target_h: int = TARGET_H) -> Dict[int, List[int]]:
+        """Sample indices grouped by width bucket (image headers only, no decode)."""
+        if self._buckets is None or self._bucket_key != (tuple(buckets), target_h):
+            groups: Dict[int, List[int]] = {b: [] for b in buckets}
+            for i, s in enumerate(self.samples):
+                w, h = self.image_size(i)
+                need_w = max(resized_width(h, w, target_h, buckets[-1]), MIN_PX_PER_CHAR * len(s.label))
+                groups[bucket_for_width(need_w, buckets)].append(i)
+            self._buckets = {b: idx for b, idx in groups.items() if idx}
+            self._bucket_key = (tuple(buckets), target_h)
+        return self._buckets
+
+    def image_size(self, idx: int) -> Tuple[int, int]:
+        """(width, height) from the image header."""
+        with Image.open(self.samples[idx].image_path) as im:
+            return im.size
+
+    def read_image(self, idx: int) -> np.ndarray:
+        return read_image_bgr(self.samples[idx].image_path)
+
+
+# key of the JSON index written by scripts.pack_lmdb
+LMDB_INDEX_KEY = b"__index__"
+
+
+class LmdbDataset(JsonlDataset):
+    """Samples packed by ``scripts.pack_lmdb``: encoded images, labels and sizes in one LMDB file.
+
+    Images are decoded straight from the memory-mapped page (``buffers=True``),
+    with no file open or copy per sample. The environment is opened lazily per
+    process, so the dataset can be handed to forked loader workers.
+    """
+
+    def __init__(self, lmdb_path: Path, shuffle: bool = False, seed: int = RNG_SEED) -> None:
+        self._keys: List[bytes] = []
+        self._sizes: List[Tuple[int, int]] = []
+        self._env = None
+        self._txn = None
+        self._pid: Optional[int] = None
+        super().__init__(Path(lmdb_path), shuffle, seed)
+
+    def _begin(self):
+        if self._pid != os.getpid():
+            import lmdb
+
+            # lock=False: nothing writes to a packed store while it is read
+            self._env = lmdb.open(str(self.jsonl_path), readonly=True, lock=False, readahead=False, meminit=False)
+            self._txn = self._env.begin(buffers=True)
+            self._pid = os.getpid()
+        return self._txn
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state.update(_env=None, _txn=None, _pid=None)
+        return state
+
+    def _load(self) -> None:
+        raw = self._begin().get(LMDB_INDEX_KEY)
+        if raw is None:
+            raise FileNotFoundError(f"{self.jsonl_path}: not a packed dataset (no {LMDB_INDEX_KEY.decode()})")
+        records = json.loads(bytes(raw))["samples"]
+        # same permutation JsonlDataset applies, so a packed split keeps its sample order
+        order = list(range(len(records)))
+        if self.shuffle:
+            random.Random(self.seed).shuffle(order)
+        for i in order:
+            rec = records[i]
+            self.samples.append(Sample(rec["image_path"], rec["label"]))
+            self._keys.append(rec["key"].encode("ascii"))
+            self._sizes.append(tuple(rec["size"]))
+
+    def image_size(self, idx: int) -> Tuple[int, int]:
+        return self._sizes[idx]
+
+    def read_image(self, idx: int) -> np.ndarray:
+        buf = self._begin().get(self._keys[idx])
+        img = cv2.imdecode(np.frombuffer(buf, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError(f"{self.jsonl_path}: cannot decode {self.samples[idx].image_path}")
+        return img
+
+
+def open_dataset(path: Path, shuffle: bool = False, seed: int = RNG_SEED) -> JsonlDataset:
+    """LmdbDataset for a packed directory, JsonlDataset for a .jsonl file."""
+    if Path(path).is_dir():
+        return LmdbDataset(path, shuffle=shuffle, seed=seed)
+    return JsonlDataset(path, shuffle=shuffle, seed=seed)
+
 
 def read_image_bgr(path: str) -> np.ndarray:
     img = cv2.imread(path, cv2.IMREAD_COLOR)
@@ -56,10 +179,9 @@ def read_image_bgr(path: str) -> np.ndarray:
     return img
 
 
-def resize_keep_ratio(img: np.ndarray, target_h: int = 48, max_w: int = 512) -> np.ndarray:
+def resize_keep_ratio(img: np.ndarray, target_h: int = TARGET_H, max_w: int = WIDTH_BUCKETS[-1]) -> np.ndarray:
     h, w = img.shape[:2]
-    scale = target_h / float(h)
-    new_w = min(int(w * scale), max_w)
+    new_w = resized_width(h, w, target_h, max_w)
     out = cv2.resize(img, (new_w, target_h), interpolation=cv2.INTER_AREA)
     return out
 
@@ -85,25 +207,95 @@ def basic_augment(img: np.ndarray, rng: random.Random) -> np.ndarray:
     return img
 
 
-def make_batch(dataset: JsonlDataset, batch_size: int = 16, augment: bool = True, seed: int = RNG_SEED) -> Tuple[np.ndarray, List[str]]:
+def load_batch(
+    dataset: JsonlDataset,
+    indices: Sequence[int],
+    augment: bool = True,
+    seed: int = RNG_SEED,
+    buckets: Sequence[int] = WIDTH_BUCKETS,
+    extra: Sequence[Tuple[np.ndarray, str]] = (),
+) -> Tuple[np.ndarray, List[str]]:
+    """Decode, augment and resize the given samples; pad to the bucket of the widest one.
+
+    Augmentation is batched (``scripts.batch_augment``) with ``basic_augment``'s settings.
+
+    ``extra`` holds already-decoded (BGR image, label) pairs, e.g. synthetic
+    samples, that go through the same augment/resize after the dataset ones.
+    The result depends only on the arguments, not on which process runs it.
+    """
     _set_seed(seed)
-    rng = random.Random(seed)
     imgs: List[np.ndarray] = []
     labels: List[str] = []
-
-    for i, s in enumerate(dataset):
-        if i >= batch_size:
-            break
-        img = read_image_bgr(s.image_path)
-        if augment:
-            img = basic_augment(img, rng)
-        img = resize_keep_ratio(img, target_h=48, max_w=512)
-        img = pad_to_width(img, width=512)
+    for i in indices:
+        imgs.append(dataset.read_image(i))
+        labels.append(dataset[i].label)
+    for img, label in extra:
         imgs.append(img)
-        labels.append(s.label)
+        labels.append(label)
+
+    min_w = MIN_PX_PER_CHAR * max(len(label) for label in labels)
+    rng = np.random.default_rng(seed) if augment else None
+    return augment_resize_pad(imgs, rng, min_w, buckets), labels
+
+
+def augment_resize_pad(
+    imgs: Sequence[np.ndarray],
+    rng: Optional[np.random.Generator],
+    min_w: int = 0,
+    buckets: Sequence[int] = WIDTH_BUCKETS,
+    cfg: AugmentConfig = TRAIN_AUGMENT,
+) -> np.ndarray:
+    """Geometric ops, resize and contrast per image in the augment thread pool, then noise
+    over the padded (N, TARGET_H, W, C) batch. ``rng=None`` skips augmentation.
+
+    Contrast/brightness runs after the resize, on far fewer pixels than the source image.
+    """
+    params = draw_params(len(imgs), rng, cfg) if rng is not None else None
+
+    def prepare(i: int) -> np.ndarray:
+        if params is None:
+            return resize_keep_ratio(imgs[i], target_h=TARGET_H, max_w=buckets[-1])
+        img = resize_keep_ratio(geometric(imgs[i], params, i), target_h=TARGET_H, max_w=buckets[-1])
+        return tone(img, params, i)
+
+    resized = thread_map(prepare, range(len(imgs)))
+    batch = pad_batch(resized, buckets, min_w)
+    if params is not None:
+        photometric(batch, params, rng, widths=[img.shape[1] for img in resized])
+    return batch
+
+
+def make_batch(
+    dataset: JsonlDataset,
+    batch_size: int = 16,
+    augment: bool = True,
+    seed: int = RNG_SEED,
+    bucket: Optional[int] = None,
+    buckets: Sequence[int] = WIDTH_BUCKETS,
+) -> Tuple[np.ndarray, List[str]]:
+    """Batch of ``batch_size`` samples drawn by ``seed``, padded to the smallest width bucket that fits.
+
+    With ``bucket`` set, only samples from that width bucket are used. For
+    training use ``scripts.data_loader.BucketBatchSampler``, which covers every
+    sample once per epoch.
+    """
+    indices = dataset.bucket_index(buckets)[bucket] if bucket is not None else range(len(dataset))
+    picked = random.Random(seed).sample(list(indices), min(batch_size, len(indices)))
+    return load_batch(dataset, picked, augment, seed, buckets)
+
+
+def to_model_input(batch_bgr: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """(N, H, W, C) uint8 -> (N, C, H, W) float32 in [0, 1], optionally written into ``out``."""
+    if out is None:
+        out = np.empty((batch_bgr.shape[0], batch_bgr.shape[3]) + batch_bgr.shape[1:3], dtype=np.float32)
+    np.multiply(batch_bgr.transpose(0, 3, 1, 2), np.float32(1.0 / 255.0), out=out, casting="unsafe")
+    return out
+
 
-    batch = np.stack(imgs, axis=0)  # (N, H, W, C)
-    return batch, labels
+def pad_batch(imgs: List[np.ndarray], buckets: Sequence[int] = WIDTH_BUCKETS, min_w: int = 0) -> np.ndarray:
+    """Stack resized images into (N, H, W, C), W = bucket of the widest image (at least ``min_w``)."""
+    width = bucket_for_width(max(min_w, max(img.shape[1] for img in imgs)), buckets)
+    return np.stack([pad_to_width(img, width=width) for img in imgs], axis=0)
 
 
 def save_grid(batch_bgr: np.ndarray, labels: List[str], out_path: Path, cols: int = 4) -> None:
@@ -0,0 +1,100 @@
+"""Pre-decoded, memory-mapped cache of an un-augmented evaluation set.
+
+The first evaluation resizes and pads every sample once and writes one
+(N, TARGET_H, W, 3) uint8 .npy per width bucket plus a meta.json with the
+labels. Later evaluations memory-map those files and slice batches with no
+decode, resize or pad. The cache directory name is a hash of the dataset
+contents and the preprocessing parameters, so a changed split or changed
+parameters simply build a new cache.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from scripts.data_pipeline import MIN_PX_PER_CHAR, TARGET_H, WIDTH_BUCKETS, JsonlDataset, load_batch
+
+CACHE_DIR = Path("data/processed/eval_cache")
+# bump when load_batch's un-augmented output changes
+CACHE_VERSION = 1
+BUILD_CHUNK = 64
+
+
+def cache_key(dataset: JsonlDataset, buckets: Sequence[int] = WIDTH_BUCKETS, target_h: int = TARGET_H) -> str:
+    h = hashlib.sha1()
+    h.update(json.dumps([CACHE_VERSION, list(buckets), target_h, MIN_PX_PER_CHAR]).encode("utf-8"))
+    source = Path(dataset.jsonl_path)
+    for i, s in enumerate(dataset):
+        path = Path(s.image_path)
+        stamp = (path.stat().st_size, path.stat().st_mtime_ns) if path.is_file() else ()
+        h.update(json.dumps([s.image_path, s.label, list(dataset.image_size(i)), list(stamp)]).encode("utf-8"))
+    if source.is_dir():
+        # packed store: its data file changes whenever the samples do
+        data = source / "data.mdb"
+        h.update(str(data.stat().st_mtime_ns if data.exists() else 0).encode("ascii"))
+    return h.hexdigest()[:16]
+
+
+class EvalTensorCache:
+    """Read side of a built cache; tensors are opened with ``mmap_mode="r"``."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with open(path / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.labels: Dict[int, List[str]] = {int(b): labels for b, labels in meta["labels"].items()}
+        self.tensors: Dict[int, np.ndarray] = {
+            b: np.load(path / f"bucket_{b}.npy", mmap_mode="r") for b in self.labels
+        }
+
+    def __len__(self) -> int:
+        return sum(len(labels) for labels in self.labels.values())
+
+    def batches(self, batch_size: int) -> Iterator[Tuple[np.ndarray, List[str]]]:
+        """(N, H, W, 3) uint8 memmap slices and their labels, one width bucket at a time."""
+        for b in sorted(self.tensors):
+            tensor, labels = self.tensors[b], self.labels[b]
+            for start in range(0, len(labels), batch_size):
+                yield tensor[start:start + batch_size], labels[start:start + batch_size]
+
+
+def build(dataset: JsonlDataset, path: Path, buckets: Sequence[int] = WIDTH_BUCKETS) -> None:
+    tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    labels: Dict[int, List[str]] = {}
+    for b, indices in sorted(dataset.bucket_index(buckets).items()):
+        out = np.lib.format.open_memmap(tmp / f"bucket_{b}.npy", mode="w+", dtype=np.uint8,
+                                        shape=(len(indices), TARGET_H, b, 3))
+        labels[b] = []
+        for start in range(0, len(indices), BUILD_CHUNK):
+            batch, batch_labels = load_batch(dataset, indices[start:start + BUILD_CHUNK], augment=False,
+                                             buckets=buckets)
+            out[start:start + len(batch)] = batch
+            labels[b].extend(batch_labels)
+        out.flush()
+        del out
+    with open(tmp / "meta.json", "w", encoding="utf-8") as f:
+        json.dump({"source": str(dataset.jsonl_path), "labels": {str(b): v for b, v in labels.items()}},
+                  f, ensure_ascii=False)
+    try:
+        tmp.rename(path)
+    except OSError:
+        # another process built it first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load_or_build(
+    dataset: JsonlDataset, cache_dir: Path = CACHE_DIR, buckets: Sequence[int] = WIDTH_BUCKETS
+) -> EvalTensorCache:
+    path = cache_dir / f"{Path(dataset.jsonl_path).stem}-{cache_key(dataset, buckets)}"
+    if not (path / "meta.json").exists():
+        build(dataset, path, buckets)
+    return EvalTensorCache(path)
+
@@ -0,0 +1,101 @@
+"""Offline evaluation: CER/WER, line accuracy and character confusions of a CRNN checkpoint.
+
+From handwrite/:
+    python -m scripts.evaluate_crnn --data data/labels/test.jsonl
+    python -m scripts.evaluate_crnn --data data/lmdb/test --beam-width 10 --lexicon data/lexicon/drug_names.txt
+    python -m scripts.evaluate_crnn --predictions preds.jsonl   # score {"label", "prediction"} lines, no model
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from scripts.metrics import CharConfusion, ErrorRates
+
+
+def predict(args: argparse.Namespace) -> Tuple[List[str], List[str]]:
+    import paddle
+
+    from scripts.ctc_decoder import CTCDecoder, load_lexicon
+    from scripts.data_pipeline import open_dataset, to_model_input
+    from scripts.eval_cache import load_or_build
+    from scripts.model_crnn import CRNNCTC
+
+    charset = args.charset.read_text(encoding="utf-8").rstrip("\n")
+    idx_to_char = {i + 1: c for i, c in enumerate(charset)}
+    lexicon = load_lexicon(args.lexicon, charset) if args.lexicon else None
+    decoder = CTCDecoder(idx_to_char, beam_width=args.beam_width, lexicon=lexicon)
+
+    model = CRNNCTC(len(charset) + 1)
+    model.set_state_dict(paddle.load(str(args.checkpoint)))
+    model.eval()
+
+    cache = load_or_build(open_dataset(args.data))
+    refs: List[str] = []
+    hyps: List[str] = []
+    start = time.perf_counter()
+    with paddle.no_grad():
+        for batch, labels in cache.batches(args.batch_size):
+            logits = model(paddle.to_tensor(to_model_input(batch))).numpy()
+            refs.extend(labels)
+            hyps.extend(text for text, _ in decoder.decode_batch(logits))
+    elapsed = time.perf_counter() - start
+    print(f"{len(refs)} lines from {args.data} in {elapsed:.2f}s ({len(refs) / elapsed:.0f} lines/s)")
+    return refs, hyps
+
+
+def read_predictions(path: Path) -> Tuple[List[str], List[str]]:
+    refs: List[str] = []
+    hyps: List[str] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            refs.append(rec["label"])
+            hyps.append(rec["prediction"])
+    return refs, hyps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", type=Path, default=Path("data/labels/test.jsonl"),
+                        help="label .jsonl or packed LMDB dir")
+    parser.add_argument("--checkpoint", type=Path, default=Path("checkpoints/crnn_ctc_best.pdparams"))
+    parser.add_argument("--charset", type=Path, default=Path("checkpoints/charset.txt"))
+    parser.add_argument("--beam-width", type=int, default=1, help="1 = greedy, as in training")
+    parser.add_argument("--lexicon", type=Path, default=None)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--predictions", type=Path, default=None, help="score this JSONL instead of running the model")
+    parser.add_argument("--save-predictions", type=Path, default=None)
+    parser.add_argument("--report", type=Path, default=None, help="write metrics and confusions as JSON")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    refs, hyps = read_predictions(args.predictions) if args.predictions else predict(args)
+    rates = ErrorRates().update(refs, hyps)
+    confusion = CharConfusion().update(refs, hyps)
+
+    print(
+        f"CER {rates.cer:.4f} (mean per line {rates.mean_cer:.4f}), WER {rates.wer:.4f}, "
+        f"line accuracy {rates.line_accuracy:.3f} over {rates.lines} lines"
+    )
+    summary = confusion.to_dict(args.top)
+    print("top substitutions (ref -> hyp):", ", ".join(f"{r!r}->{h!r} x{n}" for r, h, n in summary["substitutions"]))
+    print("top deletions:", ", ".join(f"{c!r} x{n}" for c, n in summary["deletions"]))
+    print("top insertions:", ", ".join(f"{c!r} x{n}" for c, n in summary["insertions"]))
+
+    if args.save_predictions:
+        with open(args.save_predictions, "w", encoding="utf-8") as f:
+            for ref, hyp in zip(refs, hyps):
+                f.write(json.dumps({"label": ref, "prediction": hyp}, ensure_ascii=False) + "\n")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"metrics": rates.to_dict(), "confusion": summary}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
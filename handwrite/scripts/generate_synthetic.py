@@ -1,8 +1,14 @@
 import os
 import json
 import random
+import re
+import shutil
 import string
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from typing import Tuple
 
 import cv2  # type: ignore
 import numpy as np
@@ -13,6 +19,11 @@ RAW_DIR = DATA_ROOT / "raw"
 LABELS_DIR = DATA_ROOT / "labels"
 LABELS_FILE = LABELS_DIR / "label.jsonl"
 
+BASE_SEED = 2025
+# samples per shard; fixed so the output does not depend on the worker count
+SHARD_SIZE = 1000
+SHARD_DIR_RE = re.compile(r"shard_(\d+)$")
+
 # A small pool of Turkish phrases and words
 TURKISH_PHRASES = [
     "merhaba dunya",
@@ -32,6 +43,8 @@ TURKISH_PHRASES = [
     "optik karakter tanima",
 ]
 
+TOKEN_ALPHABET = string.ascii_lowercase + string.digits
+
 # Fallback font (PIL default). Optionally try some common system fonts on macOS.
 CANDIDATE_FONTS = [
     "/System/Library/Fonts/Supplemental/Arial Unicode.ttf",
@@ -42,6 +55,7 @@ CANDIDATE_FONTS = [
 ]
 
 
+@lru_cache(maxsize=None)
 def pick_font(size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
     for path in CANDIDATE_FONTS:
         if os.path.exists(path):
@@ -52,29 +66,33 @@ def pick_font(size: int) -> ImageFont.FreeTypeFont | ImageFont.ImageFont:
     return ImageFont.load_default()
 
 
-def random_text() -> str:
+def random_text(rng=random) -> str:
     # 70% phrases, 30% random word/numeric mix
-    if random.random() < 0.7:
-        return random.choice(TURKISH_PHRASES)
+    if rng.random() < 0.7:
+        return rng.choice(TURKISH_PHRASES)
     # random short token
-    token_len = random.randint(4, 10)
-    alphabet = string.ascii_lowercase + string.digits
-    return "".join(random.choice(alphabet) for _ in range(token_len))
+    token_len = rng.randint(4, 10)
+    return "".join(rng.choice(TOKEN_ALPHABET) for _ in range(token_len))
+
 
+def synthetic_charset() -> str:
+    """Every character random_text can produce."""
+    return "".join(sorted(set("".join(TURKISH_PHRASES)) | set(TOKEN_ALPHABET)))
 
-def render_text_image(text: str, img_w: int = 512, img_h: int = 128) -> Image.Image:
+
+def render_text_image(text: str, img_w: int = 512, img_h: int = 128, rng=random) -> Image.Image:
     bg = Image.new("RGB", (img_w, img_h), (255, 255, 255))
     draw = ImageDraw.Draw(bg)
 
     # random font size, position, color
-    font_size = random.randint(28, 44)
+    font_size = rng.randint(28, 44)
     font = pick_font(font_size)
     text_color = (0, 0, 0)
 
     # compute text size and center-left alignment with some padding
     tw, th = draw.textbbox((0, 0), text, font=font)[2:]
-    pad_x = random.randint(10, 30)
-    pad_y = max(0, (img_h - th) // 2 + random.randint(-10, 10))
+    pad_x = rng.randint(10, 30)
+    pad_y = max(0, (img_h - th) // 2 + rng.randint(-10, 10))
     draw.text((pad_x, pad_y), text, fill=text_color, font=font)
 
     return bg
@@ -84,42 +102,42 @@ def to_cv(image: Image.Image) -> np.ndarray:
     return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
 
 
-def augment(img: np.ndarray) -> np.ndarray:
+def augment(img: np.ndarray, rng=random, np_rng=np.random) -> np.ndarray:
     # random small rotation, perspective, blur, noise, brightness/contrast
     h, w = img.shape[:2]
 
     # rotation
-    if random.random() < 0.7:
-        angle = random.uniform(-5, 5)
+    if rng.random() < 0.7:
+        angle = rng.uniform(-5, 5)
         M = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0)
         img = cv2.warpAffine(img, M, (w, h), flags=cv2.INTER_LINEAR, borderValue=(255, 255, 255))
 
     # blur
-    if random.random() < 0.4:
-        k = random.choice([3, 5])
+    if rng.random() < 0.4:
+        k = rng.choice([3, 5])
         img = cv2.GaussianBlur(img, (k, k), 0)
 
     # brightness/contrast
-    if random.random() < 0.5:
-        alpha = random.uniform(0.9, 1.1)  # contrast
-        beta = random.uniform(-15, 15)    # brightness
+    if rng.random() < 0.5:
+        alpha = rng.uniform(0.9, 1.1)  # contrast
+        beta = rng.uniform(-15, 15)    # brightness
         img = cv2.convertScaleAbs(img, alpha=alpha, beta=beta)
 
     # noise
-    if random.random() < 0.4:
-        noise = np.random.normal(0, random.uniform(3, 8), img.shape).astype(np.float32)
+    if rng.random() < 0.4:
+        noise = np_rng.normal(0, rng.uniform(3, 8), img.shape).astype(np.float32)
         img = np.clip(img.astype(np.float32) + noise, 0, 255).astype(np.uint8)
 
     # slight perspective warp
-    if random.random() < 0.3:
+    if rng.random() < 0.3:
         margin = 10
         src = np.float32([[0, 0], [w - 1, 0], [0, h - 1], [w - 1, h - 1]])
         dst = src.copy()
         dst += np.float32([
-            [random.uniform(-margin, margin), random.uniform(-margin, margin)],
-            [random.uniform(-margin, margin), random.uniform(-margin, margin)],
-            [random.uniform(-margin, margin), random.uniform(-margin, margin)],
-            [random.uniform(-margin, margin), random.uniform(-margin, margin)],
+            [rng.uniform(-margin, margin), rng.uniform(-margin, margin)],
+            [rng.uniform(-margin, margin), rng.uniform(-margin, margin)],
+            [rng.uniform(-margin, margin), rng.uniform(-margin, margin)],
+            [rng.uniform(-margin, margin), rng.uniform(-margin, margin)],
         ])
         M = cv2.getPerspectiveTransform(src, dst)
         img = cv2.warpPerspective(img, M, (w, h), borderValue=(255, 255, 255))
@@ -127,18 +145,35 @@ def augment(img: np.ndarray) -> np.ndarray:
     return img
 
 
-def main(num_samples: int = 200) -> None:
-    RAW_DIR.mkdir(parents=True, exist_ok=True)
-    LABELS_DIR.mkdir(parents=True, exist_ok=True)
+def render_sample(rng=random, np_rng=np.random) -> Tuple[np.ndarray, str]:
+    """One augmented BGR sample and its label."""
+    text = random_text(rng)
+    return augment(to_cv(render_text_image(text, rng=rng)), rng, np_rng), text
+
+
+def shard_rngs(base_seed: int, shard: int) -> Tuple[random.Random, np.random.Generator]:
+    """Independent Python and NumPy RNG streams for one shard."""
+    py_seq, np_seq = np.random.SeedSequence([base_seed, shard]).spawn(2)
+    return random.Random(int(py_seq.generate_state(1, np.uint64)[0])), np.random.default_rng(np_seq)
 
-    with open(LABELS_FILE, "w", encoding="utf-8") as f:
-        for idx in range(num_samples):
-            text = random_text()
-            pil_img = render_text_image(text)
-            img = augment(to_cv(pil_img))
 
-            img_name = f"synth_{idx:04d}.jpg"
-            img_path = RAW_DIR / img_name
+def shard_dir(out_dir: Path, shard: int) -> Path:
+    return out_dir / f"shard_{shard:05d}"
+
+
+def render_shard(shard: int, count: int, base_seed: int, out_dir: Path) -> int:
+    """Render ``count`` samples of one shard into its own directory and labels.jsonl."""
+    rng, np_rng = shard_rngs(base_seed, shard)
+    path = shard_dir(out_dir, shard)
+    shutil.rmtree(path, ignore_errors=True)
+    path.mkdir(parents=True)
+    first = shard * SHARD_SIZE
+    tmp_labels = path / "labels.jsonl.tmp"
+    with open(tmp_labels, "w", encoding="utf-8") as f:
+        for idx in range(first, first + count):
+            img, text = render_sample(rng, np_rng)
+
+            img_path = path / f"synth_{idx:07d}.jpg"
             cv2.imwrite(str(img_path), img, [int(cv2.IMWRITE_JPEG_QUALITY), 95])
 
             record = {
@@ -146,10 +181,55 @@ def main(num_samples: int = 200) -> None:
                 "label": text,
             }
             f.write(json.dumps(record, ensure_ascii=False) + "\n")
-
-    print(f"Generated {num_samples} samples.")
-    print(f"Images in: {RAW_DIR}")
-    print(f"Labels at: {LABELS_FILE}")
+    # labels.jsonl only appears once the shard is complete
+    tmp_labels.rename(path / "labels.jsonl")
+    return count
+
+
+def merge_shards(out_dir: Path, num_shards: int, labels_file: Path) -> int:
+    """Concatenate shard label files, in shard order, into the final manifest."""
+    labels_file.parent.mkdir(parents=True, exist_ok=True)
+    n = 0
+    with open(labels_file, "w", encoding="utf-8") as out:
+        for shard in range(num_shards):
+            with open(shard_dir(out_dir, shard) / "labels.jsonl", "r", encoding="utf-8") as f:
+                for line in f:
+                    out.write(line)
+                    n += 1
+    return n
+
+
+def main(
+    num_samples: int = 200,
+    workers: int = 1,
+    seed: int = BASE_SEED,
+    out_dir: Path = RAW_DIR,
+    labels_file: Path = LABELS_FILE,
+) -> None:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    num_shards = -(-num_samples // SHARD_SIZE)
+    counts = [min(SHARD_SIZE, num_samples - shard * SHARD_SIZE) for shard in range(num_shards)]
+    # shards left over from a larger earlier run would not be merged, but still take space
+    for stale in out_dir.glob("shard_*"):
+        m = SHARD_DIR_RE.match(stale.name)
+        if m and stale.is_dir() and int(m.group(1)) >= num_shards:
+            shutil.rmtree(stale)
+
+    start = time.perf_counter()
+    if workers <= 1:
+        for shard, count in enumerate(counts):
+            render_shard(shard, count, seed, out_dir)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_shard, shard, count, seed, out_dir) for shard, count in enumerate(counts)]
+            for future in futures:
+                future.result()
+    n = merge_shards(out_dir, num_shards, labels_file)
+    elapsed = time.perf_counter() - start
+
+    print(f"Generated {n} samples in {num_shards} shards with {workers} workers ({n / elapsed:.0f} samples/s).")
+    print(f"Images in: {out_dir}")
+    print(f"Labels at: {labels_file}")
 
 
 if __name__ == "__main__":
@@ -157,6 +237,9 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--num", type=int, default=200, help="Number of samples to generate")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Rendering processes")
+    parser.add_argument("--seed", type=int, default=BASE_SEED, help="Base seed; output is identical for any --workers")
+    parser.add_argument("--out-dir", type=Path, default=RAW_DIR)
+    parser.add_argument("--labels", type=Path, default=LABELS_FILE)
     args = parser.parse_args()
-    main(args.num)
-
+    main(args.num, args.workers, args.seed, args.out_dir, args.labels)
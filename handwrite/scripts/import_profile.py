@@ -0,0 +1,104 @@
+"""Import-time profile of web worker cold starts (``python -X importtime``).
+
+Run from the repository root:
+
+    python handwrite/scripts/import_profile.py
+    python handwrite/scripts/import_profile.py --target views --top 30 --json import_profile.json
+
+Each target is imported in a fresh interpreter; the report lists total
+import time and the top-level packages with the largest cumulative cost.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+_SETUP = "import django; django.setup(); "
+TARGETS: Dict[str, str] = {
+    # what a gunicorn worker pays before serving its first request
+    "urls": _SETUP + "from django.urls import get_resolver; get_resolver().url_patterns",
+    # handwrite views module alone (should stay light)
+    "views": _SETUP + "import handwrite_app.views",
+    # first handwrite request: heavy ML stack is imported here
+    "handwrite-ml": _SETUP + "import handwrite_app.views as v; v.handwrite_available()",
+}
+
+_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)")
+
+
+def profile(code: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self_us, cumulative_us, depth) rows for one fresh interpreter."""
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "webapp.settings")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=REPO_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            depth = (len(m.group(3)) - 1) // 2
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), depth))
+    return rows
+
+
+def summarize(rows: List[Tuple[str, int, int, int]], top: int) -> Dict[str, object]:
+    # a package's cost is the cumulative time of its depth-0 imports
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, _, cumulative, depth in rows:
+        if depth == 0:
+            by_package[name.split(".")[0]] += cumulative
+    total = sum(c for _, _, c, d in rows if d == 0)
+    ranked = sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return {
+        "total_ms": round(total / 1000.0, 1),
+        "modules": len(rows),
+        "top_packages_ms": {name: round(us / 1000.0, 1) for name, us in ranked},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", action="append", choices=sorted(TARGETS), help="Target(s) to profile (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per target; the fastest run is reported")
+    parser.add_argument("--top", type=int, default=15, help="Number of packages to list")
+    parser.add_argument("--json", type=Path, default=None, help="Also write the report to this file")
+    args = parser.parse_args()
+
+    report = {}
+    for name in args.target or list(TARGETS):
+        try:
+            runs = [summarize(profile(TARGETS[name]), args.top) for _ in range(max(1, args.repeat))]
+        except RuntimeError as e:
+            print(f"[{name}] failed: {e}")
+            report[name] = {"error": str(e)}
+            continue
+        best = min(runs, key=lambda r: r["total_ms"])
+        report[name] = best
+        print(f"[{name}] {best['total_ms']:.1f} ms total, {best['modules']} modules")
+        for pkg, ms in best["top_packages_ms"].items():
+            print(f"    {ms:9.1f} ms  {pkg}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Report written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List
+
+import cv2  # type: ignore
+import numpy as np
+
+# pages are analysed at this height at most; boxes are mapped back to full size
+ANALYSIS_MAX_H = 1600
+
+
+@dataclass
+class LineBox:
+    x: int
+    y: int
+    w: int
+    h: int
+
+    def crop(self, img: np.ndarray) -> np.ndarray:
+        return img[self.y:self.y + self.h, self.x:self.x + self.w]
+
+    def to_dict(self) -> dict:
+        return {"x": self.x, "y": self.y, "w": self.w, "h": self.h}
+
+
+def binarize(img: np.ndarray) -> np.ndarray:
+    """Ink = 255, background = 0."""
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    gray = cv2.GaussianBlur(gray, (3, 3), 0)
+    block = max(15, (min(gray.shape[:2]) // 40) | 1)
+    return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, block, 15)
+
+
+def _runs(mask: np.ndarray) -> List[tuple]:
+    """Start/end (exclusive) indices of consecutive True runs."""
+    padded = np.concatenate([[False], mask, [False]])
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(edges[0::2], edges[1::2]))
+
+
+def segment_lines(
+    img: np.ndarray,
+    min_line_h: int = 8,
+    min_gap: int = 3,
+    row_threshold: float = 0.02,
+    pad: int = 4,
+) -> List[LineBox]:
+    """Split a page into text-line boxes, top to bottom, using projection profiles.
+
+    Ink is smeared horizontally so words on a line merge, the row profile
+    is thresholded into bands, and each band is trimmed to its column extent.
+    Thresholds are in analysis-scale pixels.
+    """
+    full_h, full_w = img.shape[:2]
+    scale = min(1.0, ANALYSIS_MAX_H / float(full_h))
+    small = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else img
+    h, w = small.shape[:2]
+
+    ink = binarize(small)
+    # drop specks and join characters along the line
+    ink = cv2.morphologyEx(ink, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+    smear = cv2.dilate(ink, np.ones((1, max(9, w // 40)), np.uint8))
+
+    rows = smear.mean(axis=1) / 255.0
+    bands = _runs(rows > row_threshold)
+
+    # merge bands separated by tiny gaps (dots, descenders)
+    merged: List[list] = []
+    for y0, y1 in bands:
+        if merged and y0 - merged[-1][1] < min_gap:
+            merged[-1][1] = y1
+        else:
+            merged.append([y0, y1])
+
+    boxes: List[LineBox] = []
+    inv = 1.0 / scale
+    for y0, y1 in merged:
+        if y1 - y0 < min_line_h:
+            continue
+        cols = np.flatnonzero(ink[y0:y1].any(axis=0))
+        if cols.size == 0:
+            continue
+        x0, x1 = cols[0], cols[-1] + 1
+        bx0 = max(0, int((x0 - pad) * inv))
+        by0 = max(0, int((y0 - pad) * inv))
+        bx1 = min(full_w, int(np.ceil((x1 + pad) * inv)))
+        by1 = min(full_h, int(np.ceil((y1 + pad) * inv)))
+        boxes.append(LineBox(bx0, by0, bx1 - bx0, by1 - by0))
+    return boxes
@@ -0,0 +1,190 @@
+"""Character/word error rates and per-character confusion statistics.
+
+Edit distances come from rapidfuzz (C++) when it is installed and from a
+row-vectorized NumPy DP otherwise; both give identical numbers.
+"""
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from rapidfuzz.distance import Levenshtein
+except ImportError:  # NumPy fallback below
+    Levenshtein = None
+
+
+def _encode(seq: Sequence[Hashable], vocab: Dict[Hashable, int]) -> np.ndarray:
+    return np.fromiter((vocab.setdefault(x, len(vocab)) for x in seq), dtype=np.int32, count=len(seq))
+
+
+def _dp_rows(a: np.ndarray, b: np.ndarray) -> List[np.ndarray]:
+    """Levenshtein DP rows (len(a) + 1 of them), each computed with whole-row NumPy ops.
+
+    Within a row, ``cur[j] = min(prev[j] + 1, prev[j-1] + cost, cur[j-1] + 1)``; the last
+    term is a running minimum, i.e. ``minimum.accumulate(t - j) + j``.
+    """
+    n = len(b)
+    cols = np.arange(n + 1, dtype=np.int32)
+    rows = [cols.copy()]
+    for i, ch in enumerate(a, start=1):
+        prev = rows[-1]
+        t = np.empty(n + 1, dtype=np.int32)
+        t[0] = i
+        np.minimum(prev[1:] + 1, prev[:-1] + (b != ch), out=t[1:])
+        rows.append(np.minimum.accumulate(t - cols) + cols)
+    return rows
+
+
+def edit_distance(ref: Sequence[Hashable], hyp: Sequence[Hashable]) -> int:
+    """Levenshtein distance between two strings or two token lists."""
+    if Levenshtein is not None:
+        return Levenshtein.distance(ref, hyp)
+    if not ref or not hyp:
+        return max(len(ref), len(hyp))
+    vocab: Dict[Hashable, int] = {}
+    a, b = _encode(ref, vocab), _encode(hyp, vocab)
+    prev = np.arange(len(b) + 1, dtype=np.int32)
+    # same recurrence as _dp_rows, keeping one row
+    cols = np.arange(len(b) + 1, dtype=np.int32)
+    t = np.empty_like(prev)
+    for i, ch in enumerate(a, start=1):
+        t[0] = i
+        np.minimum(prev[1:] + 1, prev[:-1] + (b != ch), out=t[1:])
+        prev = np.minimum.accumulate(t - cols) + cols
+    return int(prev[-1])
+
+
+def editops(ref: str, hyp: str) -> List[Tuple[str, int, int]]:
+    """("replace" | "delete" | "insert", ref position, hyp position) turning ref into hyp."""
+    if Levenshtein is not None:
+        return [(op.tag, op.src_pos, op.dest_pos) for op in Levenshtein.editops(ref, hyp)]
+    vocab: Dict[Hashable, int] = {}
+    a, b = _encode(ref, vocab), _encode(hyp, vocab)
+    rows = _dp_rows(a, b)
+    ops: List[Tuple[str, int, int]] = []
+    i, j = len(a), len(b)
+    while i or j:
+        d = rows[i][j]
+        if i and j and d == rows[i - 1][j - 1] + (a[i - 1] != b[j - 1]):
+            i, j = i - 1, j - 1
+            if a[i] != b[j]:
+                ops.append(("replace", i, j))
+        elif i and d == rows[i - 1][j] + 1:
+            i -= 1
+            ops.append(("delete", i, j))
+        else:
+            j -= 1
+            ops.append(("insert", i, j))
+    ops.reverse()
+    return ops
+
+
+def cer(ref: str, hyp: str) -> float:
+    """Edit distance / len(ref)."""
+    return edit_distance(ref, hyp) / max(1, len(ref))
+
+
+def wer(ref: str, hyp: str) -> float:
+    words = ref.split()
+    return edit_distance(words, hyp.split()) / max(1, len(words))
+
+
+@dataclass
+class ErrorRates:
+    lines: int = 0
+    chars: int = 0
+    char_errors: int = 0
+    words: int = 0
+    word_errors: int = 0
+    exact: int = 0
+    # sum of per-line CERs, for the mean over lines that train_crnn has always reported
+    cer_sum: float = 0.0
+
+    @property
+    def cer(self) -> float:
+        """Corpus CER: all character edits over all reference characters."""
+        return self.char_errors / max(1, self.chars)
+
+    @property
+    def wer(self) -> float:
+        return self.word_errors / max(1, self.words)
+
+    @property
+    def mean_cer(self) -> float:
+        return self.cer_sum / max(1, self.lines)
+
+    @property
+    def line_accuracy(self) -> float:
+        return self.exact / max(1, self.lines)
+
+    def update(self, refs: Sequence[str], hyps: Sequence[str]) -> "ErrorRates":
+        for ref, hyp in zip(refs, hyps):
+            d = edit_distance(ref, hyp)
+            ref_words = ref.split()
+            self.lines += 1
+            self.chars += len(ref)
+            self.char_errors += d
+            self.cer_sum += d / max(1, len(ref))
+            self.words += len(ref_words)
+            self.word_errors += edit_distance(ref_words, hyp.split())
+            self.exact += ref == hyp
+        return self
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "lines": self.lines,
+            "cer": round(self.cer, 6),
+            "mean_cer": round(self.mean_cer, 6),
+            "wer": round(self.wer, 6),
+            "line_accuracy": round(self.line_accuracy, 6),
+            "chars": self.chars,
+            "char_errors": self.char_errors,
+            "words": self.words,
+            "word_errors": self.word_errors,
+        }
+
+
+def error_rates(refs: Sequence[str], hyps: Sequence[str]) -> ErrorRates:
+    return ErrorRates().update(refs, hyps)
+
+
+@dataclass
+class CharConfusion:
+    """Per-character error counts from the edit alignment of each (ref, hyp) pair."""
+
+    ref_counts: Counter = field(default_factory=Counter)
+    substitutions: Counter = field(default_factory=Counter)  # (ref char, hyp char)
+    deletions: Counter = field(default_factory=Counter)  # ref char missing from hyp
+    insertions: Counter = field(default_factory=Counter)  # hyp char not in ref
+
+    def update(self, refs: Sequence[str], hyps: Sequence[str]) -> "CharConfusion":
+        for ref, hyp in zip(refs, hyps):
+            self.ref_counts.update(ref)
+            for tag, i, j in editops(ref, hyp):
+                if tag == "replace":
+                    self.substitutions[(ref[i], hyp[j])] += 1
+                elif tag == "delete":
+                    self.deletions[ref[i]] += 1
+                else:
+                    self.insertions[hyp[j]] += 1
+        return self
+
+    def char_error_rates(self, min_count: int = 1) -> Dict[str, float]:
+        """Substitution + deletion rate per reference character, worst first."""
+        errors: Counter = Counter(self.deletions)
+        for (ch, _), n in self.substitutions.items():
+            errors[ch] += n
+        rates = {ch: errors[ch] / n for ch, n in self.ref_counts.items() if n >= min_count}
+        return dict(sorted(rates.items(), key=lambda kv: (-kv[1], kv[0])))
+
+    def to_dict(self, top: int = 20) -> Dict[str, object]:
+        return {
+            "substitutions": [[r, h, n] for (r, h), n in self.substitutions.most_common(top)],
+            "deletions": self.deletions.most_common(top),
+            "insertions": self.insertions.most_common(top),
+            "char_error_rates": dict(list(self.char_error_rates().items())[:top]),
+        }
@@ -6,7 +6,7 @@ import paddle.nn.functional as F
 class CRNNCTC(nn.Layer):
     def __init__(self, num_classes: int):
         super().__init__()
-        # simple conv backbone for 48x512 input
+        # simple conv backbone for 48xW input; W must be a multiple of 8 (T = W/8)
         self.conv = nn.Sequential(
             nn.Conv2D(3, 32, 3, padding=1), nn.ReLU(), nn.MaxPool2D((2, 2)),  # 24x256
             nn.Conv2D(32, 64, 3, padding=1), nn.ReLU(), nn.MaxPool2D((2, 2)), # 12x128
@@ -18,12 +18,12 @@ class CRNNCTC(nn.Layer):
         self.fc = nn.Linear(512, num_classes)  # bidirectional hidden size*2
 
     def forward(self, x):
-        # x: (N, C, H=48, W=512)
-        x = self.conv(x)  # (N, 256, 6, 64)
-        x = self.proj(x)  # (N, 256, 6, 64)
+        # x: (N, C, H=48, W), e.g. W=512
+        x = self.conv(x)  # (N, 256, 6, W/8)
+        x = self.proj(x)  # (N, 256, 6, W/8)
         n, c, h, w = x.shape
         x = x.transpose([0, 3, 1, 2])  # (N, W, C, H)
-        x = x.reshape([n, w, c*h])     # (N, T=W, D)
+        x = x.reshape([n, w, c*h])     # (N, T=W/8, D)
         x, _ = self.bi_lstm(x)         # (N, T, 512)
         x = self.fc(x)                 # (N, T, num_classes)
         x = x.transpose([1, 0, 2])     # (T, N, num_classes) for CTC
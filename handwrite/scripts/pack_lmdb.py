@@ -0,0 +1,112 @@
+"""Pack label splits and their images into LMDB stores for scripts.data_pipeline.LmdbDataset.
+
+Each split (train.jsonl, val.jsonl, ...) becomes data/lmdb/<split>/ holding the
+original encoded image bytes (no re-encode), plus a JSON index with labels and
+image sizes, so bucketing needs no image reads at all.
+
+From handwrite/:
+    python -m scripts.pack_lmdb                # pack train/val/test
+    python -m scripts.pack_lmdb --bench        # and compare read+decode throughput
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import List
+
+from PIL import Image
+
+from scripts.data_pipeline import LMDB_INDEX_KEY, JsonlDataset, LmdbDataset
+
+LABELS_DIR = Path("data/labels")
+OUT_DIR = Path("data/lmdb")
+SPLITS = ("train", "val", "test")
+COMMIT_EVERY = 1000
+
+
+def pack(jsonl_path: Path, out_path: Path) -> int:
+    import lmdb
+
+    ds = JsonlDataset(jsonl_path, shuffle=False)
+    total = sum(Path(s.image_path).stat().st_size for s in ds)
+    out_path.mkdir(parents=True, exist_ok=True)
+    # the map is sparse on Linux; leave room for LMDB page overhead
+    env = lmdb.open(str(out_path), map_size=2 * total + (64 << 20), subdir=True, meminit=False, map_async=True)
+    records: List[dict] = []
+    txn = env.begin(write=True)
+    try:
+        for i, s in enumerate(ds):
+            data = Path(s.image_path).read_bytes()
+            with Image.open(s.image_path) as im:
+                size = im.size
+            key = f"{i:09d}"
+            txn.put(key.encode("ascii"), data)
+            records.append({"key": key, "image_path": s.image_path, "label": s.label, "size": list(size)})
+            if (i + 1) % COMMIT_EVERY == 0:
+                txn.commit()
+                txn = env.begin(write=True)
+        txn.put(LMDB_INDEX_KEY, json.dumps({"version": 1, "samples": records}, ensure_ascii=False).encode("utf-8"))
+        txn.commit()
+    except BaseException:
+        txn.abort()
+        raise
+    finally:
+        env.sync()
+        env.close()
+    return len(records)
+
+
+def _read_all(ds: JsonlDataset, rounds: int) -> float:
+    """Samples/sec for read + decode of every sample, ``rounds`` times."""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for i in range(len(ds)):
+            ds.read_image(i)
+    return rounds * len(ds) / (time.perf_counter() - start)
+
+
+def bench(jsonl_path: Path, lmdb_path: Path, rounds: int) -> None:
+    timings = []
+    for cls, path in ((JsonlDataset, jsonl_path), (LmdbDataset, lmdb_path)):
+        start = time.perf_counter()
+        ds = cls(path)
+        ds.bucket_index()
+        timings.append(1000 * (time.perf_counter() - start))
+    loose = JsonlDataset(jsonl_path)
+    packed = LmdbDataset(lmdb_path)
+    # warm both once so the comparison is not about who went first
+    _read_all(loose, 1)
+    _read_all(packed, 1)
+    loose_rate = _read_all(loose, rounds)
+    packed_rate = _read_all(packed, rounds)
+    print(
+        f"{jsonl_path.name}: loose JPEG {loose_rate:.0f} samples/s, "
+        f"LMDB {packed_rate:.0f} samples/s ({packed_rate / loose_rate:.2f}x); "
+        f"open + bucket index {timings[0]:.1f} ms vs {timings[1]:.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jsonl", type=Path, nargs="+",
+                        default=[LABELS_DIR / f"{split}.jsonl" for split in SPLITS])
+    parser.add_argument("--out-dir", type=Path, default=OUT_DIR)
+    parser.add_argument("--bench", action="store_true", help="compare read+decode throughput with loose files")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    for jsonl_path in args.jsonl:
+        if not jsonl_path.exists():
+            print(f"skip {jsonl_path}: missing")
+            continue
+        out_path = args.out_dir / jsonl_path.stem
+        n = pack(jsonl_path, out_path)
+        print(f"packed {n} samples from {jsonl_path} into {out_path}")
+        if args.bench:
+            bench(jsonl_path, out_path, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""CRNN training configuration: dataclass defaults < YAML file (--config) < command-line flags.
+
+    python -m scripts.train_crnn --config configs/train_crnn.yaml --batch-size 32 --accum-steps 2
+    python -m scripts.train_crnn --config configs/train_crnn.yaml --resume checkpoints/train_state.pdstate
+"""
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+AMP_MODES = ("off", "bf16", "fp16")
+LR_SCHEDULES = ("constant", "cosine", "step")
+# these fix the order and content of the training batches, so a resumed run must keep them
+DATA_STREAM_KEYS = ("train_data", "batch_size", "accum_steps", "seed", "synthetic_ratio")
+
+
+def _default_train_data() -> str:
+    # built by scripts.pack_lmdb; used instead of loose images when present
+    return "data/lmdb/train" if Path("data/lmdb/train").is_dir() else "data/labels/train.jsonl"
+
+
+def _default_val_data() -> str:
+    return "data/lmdb/val" if Path("data/lmdb/val").is_dir() else "data/labels/val.jsonl"
+
+
+@dataclass
+class TrainConfig:
+    # data: label .jsonl files or packed LMDB dirs
+    train_data: str = dataclasses.field(default_factory=_default_train_data)
+    val_data: str = dataclasses.field(default_factory=_default_val_data)
+    checkpoint_dir: str = "checkpoints"
+
+    # optimization; ``steps`` counts optimizer steps, each over accum_steps micro-batches
+    batch_size: int = 8
+    accum_steps: int = 1
+    steps: int = 80
+    lr: float = 1e-3
+    lr_schedule: str = "constant"
+    warmup_steps: int = 0
+    min_lr: float = 0.0
+    lr_step_size: int = 1000
+    lr_gamma: float = 0.5
+    seed: int = 123
+
+    # evaluation / early stopping
+    val_every: int = 10
+    patience: int = 3
+    eval_batch_size: int = 16
+
+    # input pipeline; 0 workers loads inline
+    num_workers: int = min(4, os.cpu_count() or 1)
+    prefetch: int = 0  # 0 = 2 * num_workers
+    # share of each batch rendered on the fly (0 = real data only, 1 = synthetic only)
+    synthetic_ratio: float = 0.0
+
+    # compute
+    cpu_threads: int = 0  # 0 = Paddle's default
+    amp: str = "off"  # off | bf16 (CPU with oneDNN bf16, or GPU) | fp16 (GPU)
+    log_every: int = 10
+
+    # full training state (scripts.checkpoint), written in the background
+    checkpoint_every: int = 0  # optimizer steps; 0 = after every validation
+    resume: str = ""  # train_state file to continue from
+
+    def __post_init__(self) -> None:
+        if self.amp not in AMP_MODES:
+            raise ValueError(f"amp must be one of {AMP_MODES}, got {self.amp!r}")
+        if self.lr_schedule not in LR_SCHEDULES:
+            raise ValueError(f"lr_schedule must be one of {LR_SCHEDULES}, got {self.lr_schedule!r}")
+        if self.accum_steps < 1 or self.batch_size < 1 or self.steps < 1:
+            raise ValueError("batch_size, accum_steps and steps must be >= 1")
+        if self.prefetch <= 0:
+            self.prefetch = 2 * max(1, self.num_workers)
+
+    def check_data(self) -> None:
+        """Fail before any model setup when a data path is missing, not later as an LMDB open error."""
+        for name in ("train_data", "val_data"):
+            path = Path(getattr(self, name))
+            if not path.exists():
+                hint = "" if path.suffix == ".jsonl" else "; LMDB dirs are built with: python -m scripts.pack_lmdb"
+                raise FileNotFoundError(f"{name} {path} does not exist{hint}")
+
+    @property
+    def effective_batch_size(self) -> int:
+        return self.batch_size * self.accum_steps
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dataclasses.asdict(self)
+
+
+def _field_types() -> Dict[str, type]:
+    return {
+        f.name: type(f.default if f.default is not dataclasses.MISSING else f.default_factory())
+        for f in dataclasses.fields(TrainConfig)
+    }
+
+
+def load_yaml(path: Path) -> Dict[str, Any]:
+    try:
+        import yaml
+    except ImportError as e:
+        raise RuntimeError("YAML configs need PyYAML (pip install pyyaml)") from e
+    with open(path, "r", encoding="utf-8") as f:
+        data = yaml.safe_load(f) or {}
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: expected a mapping of config keys")
+    types = _field_types()
+    unknown = sorted(set(data) - set(types))
+    if unknown:
+        raise ValueError(f"{path}: unknown config keys {unknown}")
+    # YAML 1.1 reads e.g. 1e-3 as a string
+    return {k: types[k](v) for k, v in data.items()}
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> TrainConfig:
+    parser = argparse.ArgumentParser(description="Train the CRNN-CTC line recognizer")
+    parser.add_argument("--config", type=Path, default=None, help="YAML file with TrainConfig keys")
+    defaults = TrainConfig()
+    for name, kind in _field_types().items():
+        choices: Optional[List[str]] = {"amp": list(AMP_MODES), "lr_schedule": list(LR_SCHEDULES)}.get(name)
+        # None = not given, so YAML values are only overridden by explicit flags
+        parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=kind, default=None,
+                            choices=choices, help=f"default: {getattr(defaults, name)}")
+    args = vars(parser.parse_args(argv))
+
+    values: Dict[str, Any] = load_yaml(args.pop("config")) if args.get("config") else {}
+    args.pop("config", None)
+    values.update({k: v for k, v in args.items() if v is not None})
+    cfg = TrainConfig(**values)
+    try:
+        cfg.check_data()
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    return cfg
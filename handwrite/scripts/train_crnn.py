@@ -1,42 +1,41 @@
 from __future__ import annotations
 
+import contextlib
 import json
+import time
 from pathlib import Path
-from typing import List, Tuple
+from typing import ContextManager, Iterable, List, Optional, Sequence, Tuple, Union
 
 import numpy as np
 import paddle
 import paddle.nn as nn
 import paddle.optimizer as optim
 
-from scripts.data_pipeline import JsonlDataset, make_batch
+from scripts.checkpoint import STATE_FILE, CheckpointWriter, load_state, restore, snapshot, to_host
+from scripts.data_loader import BatchLoader, BucketBatchSampler, mix_synthetic, synthetic_per_batch, synthetic_specs
+from scripts.data_pipeline import JsonlDataset, open_dataset, to_model_input
+from scripts.eval_cache import EvalTensorCache, load_or_build
+from scripts.generate_synthetic import synthetic_charset
+from scripts.metrics import ErrorRates
 from scripts.model_crnn import CRNNCTC
+from scripts.train_config import DATA_STREAM_KEYS, TrainConfig, parse_args
 
-TRAIN_JSONL = Path("data/labels/train.jsonl")
-VAL_JSONL = Path("data/labels/val.jsonl")
-CHECKPOINT_DIR = Path("checkpoints")
-CHECKPOINT_DIR.mkdir(parents=True, exist_ok=True)
-METRICS_FILE = CHECKPOINT_DIR / "metrics.json"
-
-H = 48
-W = 512
-BATCH_SIZE = 8
-STEPS = 80
-LR = 1e-3
-VAL_EVERY = 10
-PATIENCE = 3
-
-
-def build_charset(paths: List[Path]) -> str:
-    charset = set()
-    for p in paths:
-        with open(p, "r", encoding="utf-8") as f:
-            for line in f:
-                if not line.strip():
-                    continue
-                rec = json.loads(line)
-                for ch in rec.get("label", ""):
-                    charset.add(ch)
+# page-locked host buffers let the host->GPU copy run asynchronously
+PIN_MEMORY = paddle.is_compiled_with_cuda() and paddle.device.cuda.device_count() > 0
+
+
+def to_device(batch: np.ndarray) -> paddle.Tensor:
+    """Copy a loader batch (float32 NCHW) into a tensor; the loader reuses its buffer afterwards."""
+    if PIN_MEMORY:
+        return paddle.to_tensor(batch, place=paddle.CUDAPinnedPlace()).cuda(blocking=False)
+    return paddle.to_tensor(batch)
+
+
+def build_charset(datasets: Iterable[JsonlDataset], extra: str = "") -> str:
+    charset = set(extra)
+    for ds in datasets:
+        for s in ds:
+            charset.update(s.label)
     # sort for determinism; index 0 is CTC blank
     chars = sorted(list(charset))
     return "".join(chars)
@@ -76,94 +75,224 @@ def greedy_decode(logits: paddle.Tensor, charset: str) -> List[str]:
     return results
 
 
-def cer(ref: str, hyp: str) -> float:
-    # Levenshtein distance / len(ref)
-    m, n = len(ref), len(hyp)
-    dp = [[0] * (n + 1) for _ in range(m + 1)]
-    for i in range(m + 1):
-        dp[i][0] = i
-    for j in range(n + 1):
-        dp[0][j] = j
-    for i in range(1, m + 1):
-        for j in range(1, n + 1):
-            cost = 0 if ref[i - 1] == hyp[j - 1] else 1
-            dp[i][j] = min(dp[i - 1][j] + 1, dp[i][j - 1] + 1, dp[i - 1][j - 1] + cost)
-    return dp[m][n] / max(1, m)
+def set_cpu_threads(threads: int) -> None:
+    """Intra-op threads of Paddle's CPU kernels (OpenMP/MKL/oneDNN)."""
+    base = getattr(paddle, "base", None) or getattr(paddle, "fluid", None)
+    setter = getattr(getattr(base, "core", None), "set_num_threads", None)
+    if setter is None:
+        print(f"cpu_threads={threads} ignored: this Paddle build cannot set threads at runtime, use OMP_NUM_THREADS")
+        return
+    setter(threads)
+
+
+def amp_dtype(mode: str) -> Optional[str]:
+    """Autocast dtype for ``mode``, or None (FP32) when it is off or this device cannot run it."""
+    if mode == "off":
+        return None
+    dtype, check = {"bf16": ("bfloat16", "is_bfloat16_supported"), "fp16": ("float16", "is_float16_supported")}[mode]
+    supported = getattr(paddle.amp, check, None)
+    if supported is not None and not supported():
+        print(f"amp={mode} is not supported on {paddle.device.get_device()}, training in float32")
+        return None
+    if dtype == "bfloat16" and paddle.device.get_device() == "cpu":
+        # CPU bf16 kernels come from oneDNN
+        paddle.set_flags({"FLAGS_use_mkldnn": True})
+    return dtype
+
+
+def autocast(dtype: Optional[str]) -> ContextManager:
+    if dtype is None:
+        return contextlib.nullcontext()
+    return paddle.amp.auto_cast(enable=True, level="O1", dtype=dtype)
+
+
+def build_lr(cfg: TrainConfig) -> Union[float, optim.lr.LRScheduler]:
+    """Learning rate or per-optimizer-step scheduler, with optional linear warmup."""
+    lr: Union[float, optim.lr.LRScheduler] = cfg.lr
+    if cfg.lr_schedule == "cosine":
+        lr = optim.lr.CosineAnnealingDecay(cfg.lr, T_max=max(1, cfg.steps - cfg.warmup_steps), eta_min=cfg.min_lr)
+    elif cfg.lr_schedule == "step":
+        lr = optim.lr.StepDecay(cfg.lr, step_size=cfg.lr_step_size, gamma=cfg.lr_gamma)
+    if cfg.warmup_steps:
+        lr = optim.lr.LinearWarmup(lr, warmup_steps=cfg.warmup_steps, start_lr=cfg.min_lr, end_lr=cfg.lr)
+    return lr
 
 
-def eval_cer(model: nn.Layer, charset: str, val_ds: JsonlDataset) -> float:
+def eval_cer(model: nn.Layer, charset: str, val_cache: EvalTensorCache, batch_size: int = 16) -> float:
+    """Mean per-line CER over the whole validation set."""
     model.eval()
+    rates = ErrorRates()
     with paddle.no_grad():
-        val_batch, val_labels = make_batch(val_ds, batch_size=16, augment=False, seed=999)
-        x = paddle.to_tensor(val_batch.transpose(0, 3, 1, 2).astype("float32") / 255.0)
-        logits = model(x)
-        preds = greedy_decode(logits, charset)
-        cers = [cer(r, h) for r, h in zip(val_labels, preds)]
-        return float(np.mean(cers))
+        for batch, labels in val_cache.batches(batch_size):
+            rates.update(labels, greedy_decode(model(to_device(to_model_input(batch))), charset))
+    print(f"  val CER {rates.cer:.4f} (corpus), WER {rates.wer:.4f}, line accuracy {rates.line_accuracy:.3f}")
+    return rates.mean_cer
 
 
-def main() -> None:
-    paddle.seed(123)
-    train_ds = JsonlDataset(TRAIN_JSONL, shuffle=True)
-    val_ds = JsonlDataset(VAL_JSONL, shuffle=False)
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    cfg = parse_args(argv)
+    print("config:", json.dumps(cfg.to_dict()))
+    checkpoint_dir = Path(cfg.checkpoint_dir)
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+    if cfg.cpu_threads:
+        set_cpu_threads(cfg.cpu_threads)
+    dtype = amp_dtype(cfg.amp)
+    paddle.seed(cfg.seed)
 
-    charset = build_charset([TRAIN_JSONL, VAL_JSONL])
+    state = None
+    if cfg.resume:
+        state = load_state(Path(cfg.resume))
+        changed = [k for k in DATA_STREAM_KEYS if state["config"][k] != getattr(cfg, k)]
+        if changed:
+            raise ValueError(f"{cfg.resume}: cannot resume with different {changed}; the batch stream would not match")
+        print(f"resuming from {cfg.resume} at step {state['step']}")
+
+    train_ds = open_dataset(cfg.train_data, shuffle=True)
+    val_ds = open_dataset(cfg.val_data, shuffle=False)
+    val_cache = load_or_build(val_ds)
+    print(f"train data: {train_ds.jsonl_path}, val data: {val_ds.jsonl_path} (cached in {val_cache.path})")
+
+    n_synth = synthetic_per_batch(cfg.batch_size, cfg.synthetic_ratio)
+    if state is not None:
+        charset = state["charset"]  # sizes the output layer of the saved weights
+    else:
+        charset = build_charset([train_ds, val_ds], extra=synthetic_charset() if n_synth else "")
     num_classes = len(charset) + 1  # +blank
 
     model = CRNNCTC(num_classes)
     criterion = nn.CTCLoss(blank=0)
-    optimizer = optim.Adam(learning_rate=LR, parameters=model.parameters())
+    lr = build_lr(cfg)
+    optimizer = optim.Adam(learning_rate=lr, parameters=model.parameters())
+    # fp16 needs loss scaling to keep small gradients from flushing to zero; bf16 has float32's range
+    scaler = paddle.amp.GradScaler(init_loss_scaling=2.0 ** 15) if dtype == "float16" else None
 
     best_cer = 1e9
     bad_epochs = 0
     history = {"train_loss": [], "val_cer": []}
+    done = 0  # optimizer steps taken
+    if state is not None:
+        restore(state, model, optimizer, scaler)
+        best_cer, bad_epochs, history, done = state["best_cer"], state["bad_epochs"], state["history"], state["step"]
+        del state
+
+    # the loader yields micro-batches; every accum_steps of them make one optimizer step.
+    # Batch specs are a pure function of the step, so a resumed run continues the same stream.
+    first_micro = done * cfg.accum_steps
+    micro_steps = max(0, cfg.steps - done) * cfg.accum_steps
+    sampler = None
+    if n_synth < cfg.batch_size:
+        sampler = BucketBatchSampler(train_ds, cfg.batch_size - n_synth, seed=cfg.seed)
+        buckets = sampler.bucket_indices
+        print("train width buckets:", {b: len(buckets[b]) for b in sorted(buckets)}, f"{len(sampler)} batches/epoch")
+        specs = sampler.specs(start_step=first_micro, steps=micro_steps)
+        specs = mix_synthetic(specs, n_synth) if n_synth else specs
+    else:
+        specs = synthetic_specs(cfg.batch_size, start_step=first_micro, steps=micro_steps, seed=cfg.seed)
+    if n_synth:
+        print(f"{n_synth} of {cfg.batch_size} samples per batch rendered on the fly")
+    print(
+        f"batch {cfg.batch_size} x {cfg.accum_steps} accumulation = {cfg.effective_batch_size} samples/step, "
+        f"{cfg.steps} steps, lr {cfg.lr} ({cfg.lr_schedule}, warmup {cfg.warmup_steps}), precision {dtype or 'float32'}"
+    )
 
     model.train()
-    step = 0
-    while step < STEPS:
-        batch_np, labels = make_batch(train_ds, batch_size=BATCH_SIZE, augment=True, seed=123 + step)
-        # HWC->CHW and to tensor
-        x = paddle.to_tensor(batch_np.transpose(0, 3, 1, 2).astype("float32") / 255.0)
-        logits = model(x)  # (T, N, C)
-        T, N, C = logits.shape
-        input_lengths = paddle.to_tensor(np.full((N,), T, dtype=np.int64))
-        labels_padded, label_lengths = encode_labels(labels, charset)
-        loss = criterion(logits, labels_padded, input_lengths, label_lengths)
-        loss = loss.mean()
-
-        loss.backward()
-        optimizer.step()
-        optimizer.clear_grad()
-
-        if step % 10 == 0:
-            print(f"step {step} loss {float(loss.numpy()):.4f}")
-        history["train_loss"].append(float(loss.numpy()))
-
-        if (step + 1) % VAL_EVERY == 0:
-            val_mean_cer = eval_cer(model, charset, val_ds)
-            history["val_cer"].append(val_mean_cer)
-            print(f"val CER @ step {step+1}: {val_mean_cer:.4f}")
-            # early stopping + best checkpoint
-            if val_mean_cer + 1e-6 < best_cer:
-                best_cer = val_mean_cer
-                bad_epochs = 0
-                paddle.save(model.state_dict(), str(CHECKPOINT_DIR / "crnn_ctc_best.pdparams"))
-                with open(CHECKPOINT_DIR / "charset.txt", "w", encoding="utf-8") as f:
-                    f.write(charset)
+    loader = BatchLoader(train_ds, specs, cfg.batch_size, num_workers=cfg.num_workers, prefetch=cfg.prefetch)
+    print(f"loader: {cfg.num_workers} workers, prefetch {cfg.prefetch}, pinned memory {PIN_MEMORY}")
+    writer = CheckpointWriter()
+    state_path = checkpoint_dir / STATE_FILE
+    checkpoint_every = cfg.checkpoint_every or cfg.val_every
+    saved_at = done
+
+    def save_state() -> None:
+        nonlocal saved_at
+        # host copies are taken here; serializing and writing happen on the writer thread
+        writer.save(
+            snapshot(model, optimizer, scaler, paddle_seed=cfg.seed + done, step=done, best_cer=best_cer, bad_epochs=bad_epochs,
+                     history={k: list(v) for k, v in history.items()}, charset=charset, config=cfg.to_dict()),
+            state_path,
+        )
+        saved_at = done
+
+    step_loss = 0.0
+    samples = 0
+    last, last_samples = time.perf_counter(), 0
+    start = last
+    with writer, loader:
+        for i, (batch, labels) in enumerate(loader, start=first_micro):
+            if sampler is not None and sampler.position(i)[1] == 0:
+                print(f"epoch {sampler.position(i)[0]}")
+            x = to_device(batch)
+            with autocast(dtype):
+                logits = model(x)  # (T, N, C)
+            T, N, C = logits.shape
+            input_lengths = paddle.to_tensor(np.full((N,), T, dtype=np.int64))
+            labels_padded, label_lengths = encode_labels(labels, charset)
+            # CTC in float32 whatever the autocast dtype
+            loss = criterion(logits.astype("float32"), labels_padded, input_lengths, label_lengths)
+            loss = loss.mean()
+            # mean over the accumulated micro-batches, so the lr means the same at any accum_steps
+            scaled = loss / cfg.accum_steps
+            (scaler.scale(scaled) if scaler is not None else scaled).backward()
+            step_loss += float(loss.numpy()) / cfg.accum_steps
+            samples += N
+            if (i + 1) % cfg.accum_steps:
+                continue
+
+            if scaler is not None:
+                scaler.step(optimizer)
+                scaler.update()
             else:
-                bad_epochs += 1
-                if bad_epochs >= PATIENCE:
-                    print("Early stopping triggered.")
-                    break
-            model.train()
-        step += 1
-
-    # save last checkpoint and metrics
-    paddle.save(model.state_dict(), str(CHECKPOINT_DIR / "crnn_ctc_last.pdparams"))
-    with open(CHECKPOINT_DIR / "charset.txt", "w", encoding="utf-8") as f:
+                optimizer.step()
+            optimizer.clear_grad()
+            if isinstance(lr, optim.lr.LRScheduler):
+                lr.step()
+            step = i // cfg.accum_steps
+            done = step + 1
+
+            if step % cfg.log_every == 0:
+                print(f"step {step} loss {step_loss:.4f} lr {optimizer.get_lr():.2e}")
+            history["train_loss"].append(step_loss)
+            step_loss = 0.0
+            if step % cfg.log_every == cfg.log_every - 1:
+                now = time.perf_counter()
+                print(
+                    f"  {cfg.log_every / (now - last):.2f} steps/s, {(samples - last_samples) / (now - last):.1f} samples/s, "
+                    f"avg data wait {loader.stats()['avg_wait_ms']} ms/batch"
+                )
+                last, last_samples = now, samples
+
+            if (step + 1) % cfg.val_every == 0:
+                val_mean_cer = eval_cer(model, charset, val_cache, cfg.eval_batch_size)
+                history["val_cer"].append(val_mean_cer)
+                print(f"val CER @ step {step+1}: {val_mean_cer:.4f}")
+                # early stopping + best checkpoint
+                if val_mean_cer + 1e-6 < best_cer:
+                    best_cer = val_mean_cer
+                    bad_epochs = 0
+                    writer.save(to_host(model.state_dict()), checkpoint_dir / "crnn_ctc_best.pdparams")
+                    with open(checkpoint_dir / "charset.txt", "w", encoding="utf-8") as f:
+                        f.write(charset)
+                else:
+                    bad_epochs += 1
+                    if bad_epochs >= cfg.patience:
+                        print("Early stopping triggered.")
+                        break
+                model.train()
+                last, last_samples = time.perf_counter(), samples
+            if done % checkpoint_every == 0:
+                save_state()
+        # last checkpoint; the with block waits for all writes
+        if saved_at != done:
+            save_state()
+        writer.save(to_host(model.state_dict()), checkpoint_dir / "crnn_ctc_last.pdparams")
+    elapsed = time.perf_counter() - start
+    print(f"trained on {samples} samples in {elapsed:.1f}s ({samples / max(elapsed, 1e-9):.1f} samples/s incl. validation)")
+    print("loader:", loader.stats())
+
+    with open(checkpoint_dir / "charset.txt", "w", encoding="utf-8") as f:
         f.write(charset)
-    with open(METRICS_FILE, "w", encoding="utf-8") as f:
-        json.dump({"best_val_cer": best_cer, **history}, f, ensure_ascii=False, indent=2)
+    with open(checkpoint_dir / "metrics.json", "w", encoding="utf-8") as f:
+        json.dump({"best_val_cer": best_cer, "config": cfg.to_dict(), **history}, f, ensure_ascii=False, indent=2)
 
 
 if __name__ == "__main__":
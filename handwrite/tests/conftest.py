@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# tests import the ``scripts`` / ``api`` packages the way the CLIs do, from handwrite/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
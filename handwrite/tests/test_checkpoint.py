@@ -0,0 +1,76 @@
+import random
+
+import numpy as np
+import pytest
+
+paddle = pytest.importorskip("paddle")
+
+from scripts import checkpoint  # noqa: E402
+from scripts.checkpoint import CheckpointWriter, load_state, restore, snapshot  # noqa: E402
+
+
+def make_run(seed: int = 0):
+    paddle.seed(seed)
+    model = paddle.nn.Sequential(paddle.nn.Linear(8, 16), paddle.nn.Dropout(0.3), paddle.nn.Linear(16, 4))
+    lr = paddle.optimizer.lr.LinearWarmup(
+        paddle.optimizer.lr.CosineAnnealingDecay(0.05, T_max=20), warmup_steps=3, start_lr=0.0, end_lr=0.05
+    )
+    optimizer = paddle.optimizer.Adam(learning_rate=lr, parameters=model.parameters())
+    return model, optimizer, lr
+
+
+def train(model, optimizer, lr, steps: int):
+    """Steps whose data and dropout masks come from the global Python/NumPy/Paddle RNGs."""
+    losses = []
+    for _ in range(steps):
+        x = paddle.to_tensor(np.random.rand(4, 8).astype("float32") * random.random())
+        loss = (model(x) ** 2).mean()
+        loss.backward()
+        optimizer.step()
+        optimizer.clear_grad()
+        lr.step()
+        losses.append(float(loss.numpy()))
+    return losses
+
+
+def test_resume_continues_bit_for_bit(tmp_path):
+    random.seed(1)
+    np.random.seed(1)
+    model, optimizer, lr = make_run()
+    train(model, optimizer, lr, 5)
+    path = tmp_path / checkpoint.STATE_FILE
+    with CheckpointWriter() as writer:
+        writer.save(snapshot(model, optimizer, paddle_seed=5, step=5, history={"train_loss": [0.5]}), path)
+    expected = train(model, optimizer, lr, 5)
+    expected_params = {k: v.numpy() for k, v in model.state_dict().items()}
+
+    # a fresh process-like start: different seeds everywhere, then restore
+    random.seed(99)
+    np.random.seed(99)
+    model, optimizer, lr = make_run(seed=99)
+    state = load_state(path)
+    restore(state, model, optimizer)
+    assert state["step"] == 5 and state["history"] == {"train_loss": [0.5]}
+    assert train(model, optimizer, lr, 5) == expected
+    for k, v in model.state_dict().items():
+        np.testing.assert_array_equal(v.numpy(), expected_params[k])
+    assert sorted(p.name for p in tmp_path.iterdir()) == [checkpoint.STATE_FILE]
+
+
+def test_failed_write_leaves_no_temp_file_and_keeps_previous(tmp_path, monkeypatch):
+    path = tmp_path / "state.pdstate"
+    checkpoint.save_atomic({"step": 1}, path)
+
+    def broken_save(obj, target):
+        with open(target, "wb") as f:
+            f.write(b"partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(checkpoint.paddle, "save", broken_save)
+    writer = CheckpointWriter()
+    writer.save({"step": 2}, path)
+    with pytest.raises(RuntimeError, match="checkpoint write failed"):
+        writer.close()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["state.pdstate"]
+    monkeypatch.undo()
+    assert load_state(path) == {"step": 1}
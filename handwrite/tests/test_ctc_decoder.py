@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from scripts import ctc_decoder
+from scripts.ctc_decoder import CTCDecoder, LexiconTrie, log_softmax, prefix_beam_search, snap_to_lexicon
+
+CHARSET = " .0123456789CPaloprsin"
+IDX_TO_CHAR = {i + 1: c for i, c in enumerate(CHARSET)}
+
+
+def spell(text: str) -> np.ndarray:
+    """(T, C) logits that peak on ``text`` with a blank between characters."""
+    char_to_idx = {c: i for i, c in IDX_TO_CHAR.items()}
+    frames = []
+    for ch in text:
+        frames += [char_to_idx[ch], 0]
+    logits = np.zeros((len(frames), len(CHARSET) + 1), dtype=np.float32)
+    logits[np.arange(len(frames)), frames] = 10.0
+    return logits
+
+
+def test_trie_steps_ignore_case():
+    trie = LexiconTrie(["parol"])
+    node = 0
+    for ch in "Parol":
+        node = trie.step(node, ch)
+        assert node is not None
+    assert trie.is_complete(node)
+    assert "PAROL" in trie
+
+
+def test_constrained_beam_follows_capitalized_drug_name():
+    log_probs = log_softmax(spell("Parol 500"))
+    text, score = prefix_beam_search(log_probs, IDX_TO_CHAR, beam_width=5, lexicon=LexiconTrie(["parol"]))
+    assert text == "Parol 500"
+    assert score > -1.0
+
+
+@pytest.mark.skipif(ctc_decoder.process is None, reason="rapidfuzz not installed")
+def test_snap_matches_case_insensitively_and_keeps_casing():
+    lexicon = LexiconTrie(["parol", "aspirin"])
+    assert snap_to_lexicon("Paroll 500", lexicon) == ("Parol 500", 1)
+    assert snap_to_lexicon("ASPIRN", lexicon) == ("ASPIRIN", 1)
+    assert snap_to_lexicon("Parol", lexicon) == ("Parol", 1)
+
+
+def test_decoder_keeps_capitalized_lexicon_word():
+    decoder = CTCDecoder(IDX_TO_CHAR, beam_width=5, lexicon=LexiconTrie(["parol", "aspirin"]))
+    text, confidence = decoder.decode(spell("Parol"))
+    assert text == "Parol"
+    assert confidence > 0.9
@@ -0,0 +1,35 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from api.executors import BoundedExecutor, ExecutorBusyError
+
+
+def test_timed_out_job_stays_in_flight_until_it_finishes():
+    release = threading.Event()
+
+    async def scenario():
+        executor = BoundedExecutor("test", ThreadPoolExecutor(max_workers=1), max_workers=1, max_pending=1)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(executor.run(release.wait), timeout=0.05)
+            # the job still occupies the only worker, so backpressure must hold
+            assert executor.in_flight == 1
+            with pytest.raises(ExecutorBusyError):
+                await executor.run(lambda: None)
+
+            release.set()
+            for _ in range(100):
+                if executor.in_flight == 0:
+                    break
+                await asyncio.sleep(0.01)
+            assert executor.in_flight == 0
+            assert executor.stats()["completed"] == 1
+            assert await executor.run(lambda: 42) == 42
+        finally:
+            release.set()
+            executor.shutdown()
+
+    asyncio.run(scenario())
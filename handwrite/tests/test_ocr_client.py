@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+HANDWRITE = Path(__file__).resolve().parents[1]
+
+
+def test_sidecar_client_does_not_import_paddle(tmp_path):
+    # a fresh interpreter: other tests in this session may already have imported paddle
+    code = (
+        "import sys\n"
+        "import api.executors\n"
+        "from api.ocr_base import get_ocr_service\n"
+        "from api.ocr_client import RemoteOCRService\n"
+        "service = get_ocr_service()\n"
+        "assert isinstance(service, RemoteOCRService), type(service)\n"
+        "assert 'paddle' not in sys.modules\n"
+    )
+    env = dict(os.environ, OCR_SIDECAR_ADDRESS=str(tmp_path / "missing.sock"))
+    result = subprocess.run([sys.executable, "-c", code], cwd=HANDWRITE, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_default_authkey_only_on_local_addresses(monkeypatch):
+    from api.ocr_client import DEFAULT_AUTHKEY, parse_address, sidecar_authkey
+
+    monkeypatch.delenv("OCR_SIDECAR_AUTHKEY", raising=False)
+    for local in ("/tmp/handwrite-ocr.sock", "127.0.0.1:7000", "localhost:7000"):
+        assert sidecar_authkey(parse_address(local)) == DEFAULT_AUTHKEY.encode()
+    with pytest.raises(ValueError, match="OCR_SIDECAR_AUTHKEY"):
+        sidecar_authkey(parse_address("0.0.0.0:7000"))
+
+    monkeypatch.setenv("OCR_SIDECAR_AUTHKEY", "s3cret")
+    assert sidecar_authkey(parse_address("10.0.0.5:7000")) == b"s3cret"
@@ -0,0 +1,37 @@
+from api.partial_json import IncrementalJSONParser, loads_tolerant, parse_partial_json
+
+
+def test_complete_object_in_surrounding_text():
+    assert parse_partial_json('```json\n{"a": 1, "b": [2, 3]}\n```') == {"a": 1, "b": [2, 3]}
+
+
+def test_truncated_string_is_closed():
+    assert parse_partial_json('{"a": 1, "b": "Parol 50') == {"a": 1, "b": "Parol 50"}
+
+
+def test_trailing_number_may_continue_and_is_dropped():
+    assert parse_partial_json('{"a": 1, "b": 12') == {"a": 1}
+    assert parse_partial_json('{"confidence_score": 0.8') == {}
+    assert parse_partial_json('{"a": "x", "doses": [1, 2') == {"a": "x", "doses": [1]}
+
+
+def test_terminated_trailing_number_is_kept():
+    assert parse_partial_json('{"a": 1, "b": 12 ') == {"a": 1, "b": 12}
+    assert parse_partial_json('{"a": [1, 2]') == {"a": [1, 2]}
+
+
+def test_truncated_literal_is_dropped():
+    assert parse_partial_json('{"a": 1, "b": tr') == {"a": 1}
+
+
+def test_loads_tolerant_reports_completeness():
+    assert loads_tolerant('{"a": 1}') == ({"a": 1}, True)
+    assert loads_tolerant('{"a": 1, "b": 12') == ({"a": 1}, False)
+
+
+def test_incremental_parser_snapshot_drops_partial_number():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"drug": "Parol", ') == {"drug": "Parol"}
+    assert parser.feed('"confidence_score": 0.') == {}
+    assert parser.snapshot() == {"drug": "Parol"}
+    assert parser.feed('85}') == {"confidence_score": 0.85}
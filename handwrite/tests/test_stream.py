@@ -0,0 +1,50 @@
+import json
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")  # fastapi.testclient
+
+from fastapi.testclient import TestClient
+
+HANDWRITE = Path(__file__).resolve().parents[1]
+
+
+class _UnreachableOpenAI:
+    async def stream_prescription_analysis(self, image_base64, user_question=""):
+        raise AssertionError("an undecodable image must not reach OpenAI")
+        yield  # pragma: no cover
+
+
+def _events(body: str):
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        yield event[len("event: "):], json.loads(data[len("data: "):])
+
+
+def test_stream_reports_openai_error_for_undecodable_image(monkeypatch):
+    monkeypatch.chdir(HANDWRITE)  # api.main mounts api/static relative to the working directory
+    from api import main
+    from api.executors import create_llm_executor
+
+    executor = create_llm_executor(workers=1)
+    monkeypatch.setattr(main, "openai_service", _UnreachableOpenAI())
+    monkeypatch.setattr(main, "llm_executor", executor)
+    monkeypatch.setattr(main, "ocr_service", None)
+    try:
+        # no `with`: the startup hook would load the real services
+        response = TestClient(main.app).post(
+            "/analyze-prescription/stream",
+            files={"file": ("garbage.png", b"not an image", "image/png")},
+            data={"use_ocr_fallback": "false"},
+        )
+    finally:
+        executor.shutdown()
+
+    assert response.status_code == 200
+    events = list(_events(response.text))
+    errors = [data for event, data in events if event == "error"]
+    assert [e["branch"] for e in errors] == ["openai"]
+    assert "decode" in errors[0]["message"]
+    assert events[-1][0] == "done"
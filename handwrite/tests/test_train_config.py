@@ -0,0 +1,14 @@
+import pytest
+
+from scripts.train_config import parse_args
+
+
+def test_missing_data_path_fails_at_parse_time(tmp_path, capsys):
+    val = tmp_path / "val.jsonl"
+    val.write_text("")
+    with pytest.raises(SystemExit):
+        parse_args(["--train-data", str(tmp_path / "lmdb" / "train"), "--val-data", str(val)])
+    assert "scripts.pack_lmdb" in capsys.readouterr().err
+
+    cfg = parse_args(["--train-data", str(val), "--val-data", str(val)])
+    assert cfg.train_data == str(val)
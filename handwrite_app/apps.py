@@ -1,6 +1,16 @@
+import os
+import threading
+
 from django.apps import AppConfig
 
 
 class HandwriteAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'handwrite_app'
+
+    def ready(self):
+        # OCR modelini arka planda yükle ve ısıt; /handwrite/ready/ bitene kadar 503 döner.
+        # manage.py komutlarında model yüklenmesin diye HANDWRITE_WARMUP=1 ile açılır.
+        if os.getenv('HANDWRITE_WARMUP', '0') == '1':
+            from . import views
+            threading.Thread(target=views.warm_up, name='handwrite-warmup', daemon=True).start()
@@ -8,4 +8,5 @@ urlpatterns = [
     path('analyze/', views.analyze_prescription, name='analyze_prescription'),
     path('extract-text/', views.extract_text, name='extract_text'),
     path('health/', views.health_check, name='health_check'),
+    path('ready/', views.readiness_check, name='readiness_check'),
 ]
@@ -5,7 +5,6 @@ from django.conf import settings
 import os
 import sys
 import json
-import base64
 import time
 from pathlib import Path
 
@@ -13,16 +12,67 @@ from pathlib import Path
 handwrite_path = Path(__file__).parent.parent / 'handwrite'
 sys.path.insert(0, str(handwrite_path))
 
-try:
-    from handwrite.api.ocr_service import get_ocr_service
-    from handwrite.api.openai_service import get_openai_service, PrescriptionAnalysis
-    OCR_AVAILABLE = True
-except ImportError as e:
-    print(f"Handwrite modules not available: {e}")
-    OCR_AVAILABLE = False
-except Exception as e:
-    print(f"Handwrite modules failed to load: {e}")
-    OCR_AVAILABLE = False
+# Ağır ML yığını (paddle, cv2, numpy, PIL) modül import'unda değil, ilk handwrite
+# isteğinde yüklenir; yalnızca apps.frontend rotalarına hizmet eden worker'lar bu
+# maliyeti hiç ödemez. Import sonucu (başarılı/başarısız) bir kez belirlenir.
+_handwrite_import_error = None
+_handwrite_imported = False
+
+
+def handwrite_available() -> bool:
+    """Handwrite modüllerini ilk çağrıda import et; kullanılabilir mi döndür"""
+    global _handwrite_import_error, _handwrite_imported
+    if not _handwrite_imported:
+        try:
+            import handwrite.api.ocr_base  # noqa: F401
+            import handwrite.api.openai_service  # noqa: F401
+        except ImportError as e:
+            print(f"Handwrite modules not available: {e}")
+            _handwrite_import_error = e
+        except Exception as e:
+            print(f"Handwrite modules failed to load: {e}")
+            _handwrite_import_error = e
+        _handwrite_imported = True
+    return _handwrite_import_error is None
+
+
+def get_ocr_service():
+    from handwrite.api.ocr_base import get_ocr_service as _get_ocr_service
+    return _get_ocr_service()
+
+
+def get_openai_service():
+    from handwrite.api.openai_service import get_openai_service as _get_openai_service
+    return _get_openai_service()
+
+
+def image_payload(data: bytes):
+    from handwrite.api.image_io import ImagePayload
+    return ImagePayload(data)
+
+
+# Warm-up durumu: disabled | warming | ready | failed
+WARMUP_STATE = {
+    'status': 'disabled',
+    'seconds': None,
+    'error': None,
+}
+
+
+def warm_up():
+    """OCR modelini yükle ve her genişlik bucket'ı için dummy inference çalıştır"""
+    WARMUP_STATE['status'] = 'warming'
+    start_time = time.time()
+    try:
+        if not handwrite_available():
+            raise RuntimeError('Handwrite modülleri yüklenemedi')
+        get_ocr_service().warmup()
+        WARMUP_STATE['status'] = 'ready'
+    except Exception as e:
+        print(f"Handwrite warm-up failed: {e}")
+        WARMUP_STATE['status'] = 'failed'
+        WARMUP_STATE['error'] = str(e)
+    WARMUP_STATE['seconds'] = time.time() - start_time
 
 
 def index(request: HttpRequest):
@@ -36,7 +86,7 @@ def analyze_prescription(request: HttpRequest):
     if request.method != 'POST':
         return JsonResponse({'error': 'Only POST allowed'}, status=405)
     
-    if not OCR_AVAILABLE:
+    if not handwrite_available():
         return JsonResponse({
             'success': False,
             'error': 'OCR servisi kullanılamıyor. Handwrite modülleri yüklenemedi.'
@@ -61,11 +111,8 @@ def analyze_prescription(request: HttpRequest):
                 'error': 'Sadece görsel dosyaları kabul edilir'
             }, status=400)
         
-        # Dosyayı oku
-        file_content = uploaded_file.read()
-        
-        # Base64'e çevir
-        image_base64 = base64.b64encode(file_content).decode('utf-8')
+        # Dosyayı oku (base64 yalnızca OpenAI çağrısında üretilir)
+        image = image_payload(uploaded_file.read())
         
         # Kullanıcı sorusu
         user_question = request.POST.get('user_question', 'Bu reçeteyi analiz et')
@@ -89,7 +136,7 @@ def analyze_prescription(request: HttpRequest):
         if openai_service:
             try:
                 analysis = openai_service.analyze_prescription(
-                    image_base64=image_base64,
+                    image_base64=image.llm_base64,
                     user_question=user_question
                 )
             except Exception as e:
@@ -99,7 +146,7 @@ def analyze_prescription(request: HttpRequest):
         # OCR fallback
         if (not analysis or use_ocr_fallback) and ocr_service:
             try:
-                ocr_text = ocr_service.predict_from_base64(image_base64)
+                ocr_text = ocr_service.predict_from_bytes(image.data)
                 print(f"OCR result: {ocr_text}")
             except Exception as e:
                 print(f"OCR failed: {e}")
@@ -136,7 +183,7 @@ def extract_text(request: HttpRequest):
     if request.method != 'POST':
         return JsonResponse({'error': 'Only POST allowed'}, status=405)
     
-    if not OCR_AVAILABLE:
+    if not handwrite_available():
         return JsonResponse({
             'success': False,
             'error': 'OCR servisi kullanılamıyor'
@@ -160,19 +207,20 @@ def extract_text(request: HttpRequest):
             }, status=400)
         
         # Dosyayı oku
-        file_content = uploaded_file.read()
-        image_base64 = base64.b64encode(file_content).decode('utf-8')
+        image = image_payload(uploaded_file.read())
         
         # OCR kullan
         use_ocr = request.POST.get('use_ocr', 'true').lower() == 'true'
         
         text = ""
         method = ""
+        lines = []
         
         if use_ocr:
             try:
                 ocr_service = get_ocr_service()
-                text = ocr_service.predict_from_base64(image_base64)
+                lines = ocr_service.predict_lines_from_bytes(image.data)
+                text = ocr_service.lines_to_text(lines)
                 method = "OCR"
             except Exception as e:
                 print(f"OCR failed: {e}")
@@ -182,7 +230,7 @@ def extract_text(request: HttpRequest):
             # OpenAI fallback
             try:
                 openai_service = get_openai_service()
-                text = openai_service.extract_text_only(image_base64)
+                text = openai_service.extract_text_only(image.llm_base64)
                 method = "OpenAI"
             except Exception as e:
                 print(f"OpenAI text extraction failed: {e}")
@@ -197,7 +245,8 @@ def extract_text(request: HttpRequest):
         return JsonResponse({
             'success': True,
             'text': text,
-            'method': method
+            'method': method,
+            'lines': lines
         })
         
     except Exception as e:
@@ -207,12 +256,25 @@ def extract_text(request: HttpRequest):
         }, status=500)
 
 
+def readiness_check(request: HttpRequest):
+    """Load balancer readiness kontrolü: warm-up bitene kadar 503"""
+    status = WARMUP_STATE['status']
+    # Warm-up kapalıysa probe ağır import'u tetiklemez
+    ready = status in ('ready', 'disabled')
+    return JsonResponse({
+        'ready': ready,
+        'warmup': status,
+        'warmup_seconds': WARMUP_STATE['seconds'],
+        'error': WARMUP_STATE['error'],
+    }, status=200 if ready else 503)
+
+
 def health_check(request: HttpRequest):
     """Sistem durumu kontrolü"""
     ocr_loaded = False
     openai_configured = False
     
-    if OCR_AVAILABLE:
+    if handwrite_available():
         try:
             ocr_service = get_ocr_service()
             ocr_loaded = ocr_service is not None
@@ -233,5 +295,5 @@ def health_check(request: HttpRequest):
         'status': status,
         'ocr_model_loaded': ocr_loaded,
         'openai_configured': openai_configured,
-        'handwrite_available': OCR_AVAILABLE
+        'handwrite_available': handwrite_available()
     })
\ No newline at end of file
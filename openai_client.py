@@ -1,6 +1,6 @@
 import json
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, Optional
 from openai import OpenAI
 from models import MedicalReport
 from dotenv import load_dotenv
@@ -8,6 +8,16 @@ from dotenv import load_dotenv
 # .env dosyasını yükle
 load_dotenv()
 
+# Run'ın bittiğini (başarılı ya da değil) bildiren stream event'leri
+TERMINAL_RUN_EVENTS = {
+    "thread.run.completed",
+    "thread.run.failed",
+    "thread.run.cancelled",
+    "thread.run.expired",
+    "thread.run.incomplete",
+    "thread.run.requires_action",
+}
+
 class MedicalReportAssistantClient:
     """OpenAI Assistant API ile rapor değerlendirme client'ı"""
     
@@ -121,6 +131,80 @@ class MedicalReportAssistantClient:
                 "message": f"Değerlendirme sırasında hata oluştu: {str(e)}"
             }
     
+    def stream_evaluation(self, medical_report: MedicalReport) -> Iterator[Dict[str, Any]]:
+        """
+        Tıbbi raporu assistant run streaming API'si ile değerlendirir
+        
+        Args:
+            medical_report: Değerlendirilecek tıbbi rapor
+            
+        Yields:
+            Gelen her metin parçası için {"type": "delta", "text": ...}; en sonda
+            evaluate_report ile aynı sonucu taşıyan {"type": "result", "result": {...}}
+        """
+        thread_id = None
+        try:
+            message_content = self._prepare_message_content(medical_report.to_dict())
+            
+            thread = self.client.beta.threads.create()
+            thread_id = thread.id
+            self.client.beta.threads.messages.create(
+                thread_id=thread.id,
+                role="user",
+                content=message_content
+            )
+            
+            # Run'ı polling yerine event stream olarak başlat
+            stream = self.client.beta.threads.runs.create(
+                thread_id=thread.id,
+                assistant_id=self.assistant_id,
+                stream=True
+            )
+            
+            parts = []
+            run_status = None
+            last_error = None
+            for event in stream:
+                if event.event == "thread.message.delta":
+                    for c in event.data.delta.content or []:
+                        if getattr(c, 'type', '') == 'text' and c.text and c.text.value:
+                            parts.append(c.text.value)
+                            yield {"type": "delta", "text": c.text.value}
+                elif event.event in TERMINAL_RUN_EVENTS:
+                    run_status = event.data.status
+                    last_error = event.data.last_error
+                elif event.event == "error":
+                    run_status = "failed"
+                    last_error = event.data
+            
+            assistant_text = "".join(parts).strip()
+            if run_status == 'completed' and assistant_text:
+                result = {
+                    "status": "success",
+                    "evaluation": assistant_text,
+                    "thread_id": thread_id
+                }
+            elif run_status == 'completed':
+                result = {
+                    "status": "error",
+                    "message": "Assistant yanıtı bulunamadı (assistant rolü).",
+                    "thread_id": thread_id
+                }
+            else:
+                result = {
+                    "status": "error",
+                    "message": f"Assistant çalıştırılamadı: {run_status}",
+                    "error": str(last_error) if last_error else None,
+                    "thread_id": thread_id
+                }
+        except Exception as e:
+            result = {
+                "status": "error",
+                "message": f"Değerlendirme sırasında hata oluştu: {str(e)}",
+                "thread_id": thread_id
+            }
+        yield {"type": "result", "result": result}
+    
     def _prepare_message_content(self, report_data: Dict[str, Any]) -> str:
         """
         Rapor verilerini assistant'a düz metin (insan okunur) formatta gönderir.